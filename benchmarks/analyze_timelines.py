@@ -0,0 +1,331 @@
+"""Analyze the per-token timelines written with ``--capture-timelines``.
+
+Usage:
+    python benchmarks/analyze_timelines.py \
+        results/<run>.requests.timeline.arrow [more files of the same run] \
+        [--stall-factor 5] [--plot timeline.png]
+
+The files of all client processes or MPI ranks of a run can be given
+together. The analyzer rebuilds the timeline of every request and reports:
+
+* Decode stalls: gaps between consecutive chunks of a request longer than
+  ``--stall-ms``, or by default ``--stall-factor`` times the median gap of the
+  run, with the number of requests in flight when each stall began. Stalls
+  that coincide with a concurrency peak point at batching or preemption on
+  the server rather than at the request itself.
+* Chunk bundling: how many streamed chunks carried more than one token, which
+  hides ITLs (requires token counts from the server).
+* Concurrency over time: requests in flight, i.e. started but not finished,
+  printed every ``--interval`` seconds with ``--print-concurrency`` and
+  plotted with ``--plot`` (requires matplotlib).
+"""
+
+import argparse
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+DEFAULT_STALL_FACTOR = 5.0
+DEFAULT_INTERVAL = 1.0
+DEFAULT_TOP_STALLS = 10
+
+
+class Timelines:
+    """The timelines of all requests of one or more timeline files.
+
+    Times are absolute, in seconds since the start of the run. Chunk arrays
+    are flat; the chunks of request ``i`` are ``chunk_offsets[i]`` to
+    ``chunk_offsets[i + 1]``.
+
+    Args:
+        paths: Timeline files written by ``request_records.TimelineWriter``.
+    """
+
+    def __init__(self, paths: list[str]) -> None:
+        if pa is None:
+            raise ImportError(
+                "pyarrow is required to read timelines. Install it with "
+                "`pip install pyarrow`."
+            )
+        table = pa.concat_tables(pa.ipc.open_stream(path).read_all() for path in paths)
+        self.request_idx = table["request_idx"].to_numpy()
+        self.success = table["success"].to_numpy()
+        self.start_time = table["start_time"].to_numpy()
+        self.first_byte = self.start_time + table["first_byte"].to_numpy()
+        chunk_times = table["chunk_times"].combine_chunks()
+        self.chunk_offsets = chunk_times.offsets.to_numpy().astype(np.int64)
+        self.chunk_request = np.repeat(
+            np.arange(len(table)), np.diff(self.chunk_offsets)
+        )
+        self.chunk_times = self.start_time[
+            self.chunk_request
+        ] + chunk_times.flatten().to_numpy().astype(np.float64)
+        chunk_tokens = table["chunk_tokens"].combine_chunks()
+        # Token counts are per request all or nothing, see TimelineWriter.
+        has_tokens = np.diff(chunk_tokens.offsets.to_numpy()) > 0
+        self.chunk_tokens = np.zeros(len(self.chunk_times), dtype=np.int64)
+        self.chunk_tokens_known = has_tokens[self.chunk_request]
+        self.chunk_tokens[self.chunk_tokens_known] = chunk_tokens.flatten().to_numpy()
+        # A request ends with its last chunk, or at its response headers if
+        # it streamed none.
+        num_chunks = np.diff(self.chunk_offsets)
+        self.end_time = self.first_byte.copy()
+        streamed = num_chunks > 0
+        self.end_time[streamed] = self.chunk_times[self.chunk_offsets[1:][streamed] - 1]
+
+    def __len__(self) -> int:
+        return len(self.start_time)
+
+    def gaps(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(request, start, length)`` of every gap between two consecutive
+        chunks of a request, i.e. the ITLs on an absolute time axis."""
+        same_request = self.chunk_request[1:] == self.chunk_request[:-1]
+        lengths = np.diff(self.chunk_times)[same_request]
+        starts = self.chunk_times[:-1][same_request]
+        return self.chunk_request[:-1][same_request], starts, lengths
+
+    def in_flight(self, times: np.ndarray) -> np.ndarray:
+        """The number of requests started but not finished at ``times``."""
+        started = np.searchsorted(np.sort(self.start_time), times, side="right")
+        finished = np.searchsorted(np.sort(self.end_time), times, side="right")
+        return started - finished
+
+    def concurrency(self) -> tuple[np.ndarray, np.ndarray]:
+        """The requests in flight as a step function: the times at which a
+        request started or finished, and the requests in flight from then on."""
+        times = np.sort(np.concatenate([self.start_time, self.end_time]))
+        return times, self.in_flight(times)
+
+
+def find_stalls(
+    timelines: Timelines,
+    stall_ms: float | None = None,
+    stall_factor: float = DEFAULT_STALL_FACTOR,
+) -> tuple[float, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the stall threshold in seconds and ``(request, start, length)``
+    of the gaps longer than it, longest first."""
+    requests, starts, lengths = timelines.gaps()
+    if stall_ms is not None:
+        threshold = stall_ms / 1000
+    else:
+        threshold = stall_factor * float(np.median(lengths)) if len(lengths) else 0.0
+    stalled = lengths > threshold
+    order = np.argsort(lengths[stalled])[::-1]
+    return (
+        threshold,
+        requests[stalled][order],
+        starts[stalled][order],
+        lengths[stalled][order],
+    )
+
+
+def bundling(timelines: Timelines) -> dict[str, float] | None:
+    """Statistics of the tokens per chunk, None without token counts."""
+    tokens = timelines.chunk_tokens[timelines.chunk_tokens_known]
+    # Chunks without new tokens, e.g. a final chunk with the finish reason,
+    # are not counted.
+    tokens = tokens[tokens > 0]
+    if not len(tokens):
+        return None
+    return {
+        "chunks": int(len(tokens)),
+        "mean_tokens_per_chunk": float(tokens.mean()),
+        "max_tokens_per_chunk": int(tokens.max()),
+        "bundled_chunk_percent": float((tokens > 1).mean() * 100),
+        "bundled_token_percent": float(tokens[tokens > 1].sum() / tokens.sum() * 100),
+    }
+
+
+def plot(
+    timelines: Timelines,
+    stall_starts: np.ndarray,
+    stall_lengths: np.ndarray,
+    path: str,
+) -> None:
+    """Plot the concurrency and the stalls over time to ``path``."""
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError(
+            "matplotlib is required for --plot. Install it with "
+            "`pip install matplotlib`."
+        ) from None
+    _, starts, lengths = timelines.gaps()
+    fig, (ax_concurrency, ax_itl) = plt.subplots(2, 1, sharex=True, figsize=(12, 7))
+    ax_concurrency.step(*timelines.concurrency(), where="post")
+    ax_concurrency.set_ylabel("Requests in flight")
+    ax_itl.scatter(starts, lengths * 1000, s=1, alpha=0.3, label="ITL")
+    ax_itl.scatter(stall_starts, stall_lengths * 1000, s=8, color="red", label="Stall")
+    ax_itl.set_yscale("log")
+    ax_itl.set_ylabel("Gap between chunks (ms)")
+    ax_itl.set_xlabel("Time since start of run (s)")
+    ax_itl.legend(loc="upper right")
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+
+
+def main(args: argparse.Namespace) -> None:
+    timelines = Timelines(args.paths)
+    print("{s:{c}^{n}}".format(s=" Timeline Analysis ", n=50, c="="))
+    print("{:<40} {:<10}".format("Requests:", len(timelines)))
+    print("{:<40} {:<10}".format("Successful requests:", int(timelines.success.sum())))
+    print("{:<40} {:<10}".format("Streamed chunks:", len(timelines.chunk_times)))
+
+    threshold, stall_requests, stall_starts, stall_lengths = find_stalls(
+        timelines, args.stall_ms, args.stall_factor
+    )
+    _, _, gaps = timelines.gaps()
+    stall_in_flight = timelines.in_flight(stall_starts)
+    print("{s:{c}^{n}}".format(s="Decode Stalls", n=50, c="-"))
+    print("{:<40} {:<10.2f}".format("Stall threshold (ms):", threshold * 1000))
+    print("{:<40} {:<10}".format("Stalls:", len(stall_lengths)))
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Requests with a stall (%):",
+            len(np.unique(stall_requests)) / max(len(timelines), 1) * 100,
+        )
+    )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Time stalled / decode time (%):",
+            stall_lengths.sum() / max(gaps.sum(), 1e-9) * 100,
+        )
+    )
+    if len(stall_lengths):
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Mean in flight at stalls:", stall_in_flight.mean()
+            )
+        )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Mean in flight at other chunks:",
+            timelines.in_flight(timelines.chunk_times).mean()
+            if len(timelines.chunk_times)
+            else 0.0,
+        )
+    )
+    if len(stall_lengths):
+        print(f"Longest {min(args.top, len(stall_lengths))} stalls:")
+        print(f"  {'request':>8} {'start (s)':>10} {'gap (ms)':>10} {'in flight':>10}")
+        for request, start, length, in_flight in list(
+            zip(stall_requests, stall_starts, stall_lengths, stall_in_flight)
+        )[: args.top]:
+            print(
+                f"  {timelines.request_idx[request]:>8} {start:>10.3f} "
+                f"{length * 1000:>10.2f} {in_flight:>10}"
+            )
+
+    print("{s:{c}^{n}}".format(s="Chunk Bundling", n=50, c="-"))
+    stats = bundling(timelines)
+    if stats is None:
+        print("No token counts, the server did not report continuous usage.")
+    else:
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Mean tokens per chunk:", stats["mean_tokens_per_chunk"]
+            )
+        )
+        print(
+            "{:<40} {:<10}".format(
+                "Max tokens per chunk:", stats["max_tokens_per_chunk"]
+            )
+        )
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Chunks with several tokens (%):", stats["bundled_chunk_percent"]
+            )
+        )
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Tokens in bundled chunks (%):", stats["bundled_token_percent"]
+            )
+        )
+
+    print("{s:{c}^{n}}".format(s="Concurrency", n=50, c="-"))
+    times, in_flight = timelines.concurrency()
+    span = float(times[-1] - times[0]) if len(times) else 0.0
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Mean requests in flight:",
+            # Time-weighted over the span of the run.
+            float(np.sum(in_flight[:-1] * np.diff(times))) / span if span else 0.0,
+        )
+    )
+    print(
+        "{:<40} {:<10}".format(
+            "Max requests in flight:", int(in_flight.max()) if len(times) else 0
+        )
+    )
+    if args.print_concurrency and len(times):
+        samples = np.arange(times[0], times[-1] + args.interval, args.interval)
+        print(f"  {'time (s)':>10} {'in flight':>10}")
+        for time, count in zip(samples, timelines.in_flight(samples)):
+            print(f"  {time:>10.2f} {count:>10}")
+    print("=" * 50)
+
+    if args.plot:
+        plot(timelines, stall_starts, stall_lengths, args.plot)
+        print(f"Plot saved to: {args.plot}")
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Analyze per-token timelines written by "
+        "benchmark_serving_structured_output.py --capture-timelines."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="Timeline files (*.timeline.arrow) of one run.",
+    )
+    parser.add_argument(
+        "--stall-ms",
+        type=float,
+        default=None,
+        help="Gap between two chunks of a request, in ms, above which it is a "
+        "stall. Defaults to --stall-factor times the median gap.",
+    )
+    parser.add_argument(
+        "--stall-factor",
+        type=float,
+        default=DEFAULT_STALL_FACTOR,
+        help="Multiple of the median gap between chunks above which a gap is "
+        "a stall, unless --stall-ms is given.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=DEFAULT_TOP_STALLS,
+        help="Number of longest stalls to list.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Interval in seconds of the concurrency printed with --print-concurrency.",
+    )
+    parser.add_argument(
+        "--print-concurrency",
+        action="store_true",
+        help="Print the concurrency at every sampling interval.",
+    )
+    parser.add_argument(
+        "--plot",
+        type=str,
+        default=None,
+        help="Save a plot of the concurrency and the chunk gaps over time to "
+        "this file. Requires matplotlib.",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    main(create_argument_parser().parse_args())
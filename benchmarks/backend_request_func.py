@@ -1,28 +1,158 @@
 # SPDX-License-Identifier: Apache-2.0
 # SPDX-FileCopyrightText: Copyright contributors to the vLLM project
 
+import asyncio
 import io
 import json
 import os
 import sys
 import time
 import traceback
+from array import array
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING
 
 import aiohttp
-import huggingface_hub.constants
 from tqdm.asyncio import tqdm
-from transformers import AutoTokenizer, PreTrainedTokenizer, PreTrainedTokenizerFast
+
+# Imported when a tokenizer is loaded, see get_tokenizer().
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast
 
 # NOTE(simon): do not import vLLM here so the benchmark script
 # can run without vLLM installed.
 
 AIOHTTP_TIMEOUT = aiohttp.ClientTimeout(total=6 * 60 * 60)
+# Idle keep-alive connections are kept around for this long so that
+# back-to-back requests of a benchmark run reuse the same TCP connection.
+AIOHTTP_KEEPALIVE_TIMEOUT = 60
+
+
+def create_client_session(
+    max_connections: int | None = None,
+) -> aiohttp.ClientSession:
+    """Create a long-lived session with a keep-alive connection pool.
+
+    The pool is sized to ``max_connections`` (the benchmark's maximum
+    concurrency) so that every in-flight request can hold a connection
+    without re-connecting. ``None`` means an unbounded pool.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=max_connections or 0,
+        limit_per_host=max_connections or 0,
+        keepalive_timeout=AIOHTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector, trust_env=True, timeout=AIOHTTP_TIMEOUT
+    )
 
 
-@dataclass
+@asynccontextmanager
+async def client_session(
+    session: aiohttp.ClientSession | None,
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """Yield the shared session, or a throwaway one for this request only.
+
+    Without a shared session every request pays for its own connector,
+    DNS lookup and TCP handshake, which is what ``--no-connection-pool``
+    measures.
+    """
+    if session is not None:
+        yield session
+        return
+    async with aiohttp.ClientSession(
+        trust_env=True, timeout=AIOHTTP_TIMEOUT
+    ) as new_session:
+        yield new_session
+
+
+def _json_loads_stdlib(payload: memoryview) -> dict:
+    # json.loads() accepts bytes but not memoryview, so this path copies.
+    return json.loads(bytes(payload))
+
+
+try:
+    # orjson parses straight from the memoryview, without a copy or a
+    # UTF-8 decode to str, and is several times faster than the stdlib.
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = _json_loads_stdlib
+
+
+class SSEParser:
+    """Incremental Server-Sent Events parser shared by the streaming backends.
+
+    Raw response bytes are appended to a single ``bytearray`` as they arrive
+    from the socket. Complete ``data:`` lines are parsed as JSON straight from
+    ``memoryview`` slices of that buffer, so events split across TCP chunks
+    are reassembled without decoding every chunk to ``str``. Comment lines
+    (``:``, used as pings), other SSE fields and the ``[DONE]`` sentinel are
+    skipped.
+    """
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        """Consume ``chunk`` and return the events it completed, in order."""
+        buffer = self._buffer
+        buffer += chunk
+        events = []
+        start = 0
+        with memoryview(buffer) as view:
+            while (end := buffer.find(b"\n", start)) != -1:
+                line_start, line_end, start = start, end, end + 1
+                if line_end > line_start and buffer[line_end - 1] == 0x0D:
+                    line_end -= 1
+                if not buffer.startswith(b"data:", line_start, line_end):
+                    continue
+                line_start += 5
+                if buffer.startswith(b" ", line_start, line_end):
+                    line_start += 1
+                if buffer.startswith(b"[DONE]", line_start, line_end):
+                    continue
+                with view[line_start:line_end] as payload:
+                    events.append(_json_loads(payload))
+        del buffer[:start]
+        return events
+
+    def flush(self) -> list[dict]:
+        """Parse a final event that the server did not terminate with a newline."""
+        if not self._buffer.strip():
+            return []
+        return self.feed(b"\n")
+
+
+async def iter_sse_events(
+    response: aiohttp.ClientResponse,
+) -> AsyncIterator[tuple[float, dict]]:
+    """Yield ``(timestamp, event)`` for every event of a streamed response.
+
+    Events that arrive in the same TCP read share one timestamp, taken before
+    they are parsed, so client-side parsing does not leak into TTFT and ITL.
+    """
+    parser = SSEParser()
+    async for chunk_bytes in response.content.iter_any():
+        timestamp = time.perf_counter()
+        for event in parser.feed(chunk_bytes):
+            yield timestamp, event
+    timestamp = time.perf_counter()
+    for event in parser.flush():
+        yield timestamp, event
+
+
+@dataclass(slots=True)
 class RequestFuncInput:
-    prompt: str
+    # Text, or token ids for the completions backends.
+    prompt: str | list[int]
     api_url: str
     prompt_len: int
     output_len: int
@@ -34,31 +164,109 @@ class RequestFuncInput:
     ignore_eos: bool = False
     language: str | None = None
     request_id: str | None = None
-
-
-@dataclass
+    # When False the streamed text is not kept on the output, which is all
+    # that is needed when the generated text is not evaluated for correctness.
+    keep_generated_text: bool = True
+    # Earlier messages of a multi-turn conversation, which the chat backend
+    # sends before the prompt.
+    history: list[dict] | None = None
+    # Deadlines in seconds from the start of the request for the first token
+    # and for the whole response, None for no deadline. The OpenAI backends
+    # cancel a request that misses one and close its connection, so that the
+    # server aborts it.
+    ttft_timeout: float | None = None
+    timeout: float | None = None
+    # Ask the server for the token count of every streamed chunk, for the
+    # per-token timelines. Supported by the OpenAI backends.
+    capture_timeline: bool = False
+
+
+@dataclass(slots=True)
 class RequestFuncOutput:
-    generated_text: str = ""
+    # None when the request was sent with keep_generated_text=False.
+    generated_text: str | None = ""
     success: bool = False
     latency: float = 0.0
     output_tokens: int = 0
     ttft: float = 0.0  # Time to first token
-    itl: list[float] = field(default_factory=list)  # list of inter-token latencies
+    # inter-token latencies, stored as packed doubles rather than float objects
+    itl: array = field(default_factory=partial(array, "d"))
     tpot: float = 0.0  # avg next-token latencies
     prompt_len: int = 0
     error: str = ""
+    # Failed because it missed a deadline of its RequestFuncInput.
+    timed_out: bool = False
+    # Time from the start of the request to the response headers.
+    first_byte: float = 0.0
+    # With capture_timeline, the server-reported number of tokens generated
+    # so far at every streamed chunk with choices, i.e. at the first token and
+    # at every ITL (0 where the server reported none).
+    chunk_tokens: array = field(default_factory=partial(array, "q"))
+    # Set by the benchmark's scheduler: which of the benchmark's requests this
+    # is, when it was sent (seconds since the start of the run) and how late
+    # that was versus its schedule, when it started after waiting for a
+    # --max-concurrency slot, and which turn of its conversation it is in a
+    # multi-turn benchmark.
+    request_idx: int = 0
+    send_time: float = 0.0
+    scheduling_lag: float = 0.0
+    start_time: float = 0.0
+    turn: int = 0
+
+
+def request_deadline(request_func_input: RequestFuncInput) -> asyncio.Timeout:
+    """A timeout at the first deadline of a request that starts now: its TTFT
+    deadline, or its total deadline if that is sooner. Once the first token
+    arrived, :func:`first_token_deadline` moves it to the total deadline."""
+    now = asyncio.get_running_loop().time()
+    deadlines = [
+        now + deadline
+        for deadline in (request_func_input.ttft_timeout, request_func_input.timeout)
+        if deadline is not None
+    ]
+    return asyncio.timeout_at(min(deadlines) if deadlines else None)
+
+
+def first_token_deadline(
+    deadline: asyncio.Timeout, request_func_input: RequestFuncInput, st: float
+) -> None:
+    """Move ``deadline`` from :func:`request_deadline` to the total deadline of
+    the request, which started at ``time.perf_counter()`` ``st``."""
+    if request_func_input.ttft_timeout is None:
+        return
+    deadline.reschedule(
+        asyncio.get_running_loop().time()
+        + request_func_input.timeout
+        - (time.perf_counter() - st)
+        if request_func_input.timeout is not None
+        else None
+    )
+
+
+def deadline_exceeded(output: RequestFuncOutput, deadline: asyncio.Timeout) -> bool:
+    """Mark ``output`` as timed out if ``deadline`` expired, and return whether
+    it did."""
+    if not deadline.expired():
+        return False
+    output.success = False
+    output.timed_out = True
+    output.error = (
+        "Deadline exceeded while streaming."
+        if output.ttft
+        else "Deadline exceeded before the first token."
+    )
+    return True
 
 
 async def async_request_tgi(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith("generate_stream")
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         params = {
             "max_new_tokens": request_func_input.output_len,
             "do_sample": True,
@@ -89,23 +297,12 @@ async def async_request_tgi(
                 url=api_url, json=payload, headers=headers
             ) as response:
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-                        chunk_bytes = chunk_bytes.decode("utf-8")
-
-                        # NOTE: Sometimes TGI returns a ping response without
-                        # any data, we should skip it.
-                        if chunk_bytes.startswith(":"):
-                            continue
-                        chunk = chunk_bytes.removeprefix("data:")
-
-                        data = json.loads(chunk)
-                        timestamp = time.perf_counter()
+                    # NOTE: Sometimes TGI returns a ping response without
+                    # any data, the SSE parser skips it.
+                    async for timestamp, data in iter_sse_events(response):
                         # First token
                         if ttft == 0.0:
-                            ttft = time.perf_counter() - st
+                            ttft = timestamp - st
                             output.ttft = ttft
 
                         # Decoding phase
@@ -116,7 +313,11 @@ async def async_request_tgi(
 
                     output.latency = most_recent_timestamp - st
                     output.success = True
-                    output.generated_text = data["generated_text"]
+                    output.generated_text = (
+                        data["generated_text"]
+                        if request_func_input.keep_generated_text
+                        else None
+                    )
                 else:
                     output.error = response.reason or ""
                     output.success = False
@@ -133,13 +334,12 @@ async def async_request_tgi(
 async def async_request_trt_llm(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith("generate_stream")
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         payload = {
             "accumulate_tokens": True,
             "text_input": request_func_input.prompt,
@@ -156,6 +356,8 @@ async def async_request_trt_llm(
         output = RequestFuncOutput()
         output.prompt_len = request_func_input.prompt_len
 
+        # Chunks are joined once at the end; "+=" per token is quadratic.
+        text_chunks: list[str] = []
         ttft = 0.0
         st = time.perf_counter()
         most_recent_timestamp = st
@@ -164,16 +366,8 @@ async def async_request_trt_llm(
                 url=api_url, json=payload, headers=headers
             ) as response:
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix("data:")
-
-                        data = json.loads(chunk)
-                        output.generated_text += data["text_output"]
-                        timestamp = time.perf_counter()
+                    async for timestamp, data in iter_sse_events(response):
+                        text_chunks.append(data["text_output"])
                         # First token
                         if ttft == 0.0:
                             ttft = timestamp - st
@@ -187,6 +381,11 @@ async def async_request_trt_llm(
 
                     output.latency = most_recent_timestamp - st
                     output.success = True
+                    output.generated_text = (
+                        "".join(text_chunks)
+                        if request_func_input.keep_generated_text
+                        else None
+                    )
 
                 else:
                     output.error = response.reason or ""
@@ -204,15 +403,14 @@ async def async_request_trt_llm(
 async def async_request_deepspeed_mii(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(("completions", "profile")), (
         "OpenAI Completions API URL must end with 'completions' or 'profile'."
     )
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         payload = {
             "model": request_func_input.model,
             "prompt": request_func_input.prompt,
@@ -251,6 +449,8 @@ async def async_request_deepspeed_mii(
                         )
                         output.success = False
                     output.success = True
+                    if not request_func_input.keep_generated_text:
+                        output.generated_text = None
                 else:
                     output.error = response.reason or ""
                     output.success = False
@@ -267,15 +467,14 @@ async def async_request_deepspeed_mii(
 async def async_request_openai_completions(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(("completions", "profile")), (
         "OpenAI Completions API URL must end with 'completions' or 'profile'."
     )
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         payload = {
             "model": request_func_input.model_name
             if request_func_input.model_name
@@ -292,6 +491,8 @@ async def async_request_openai_completions(
         }
         if request_func_input.ignore_eos:
             payload["ignore_eos"] = request_func_input.ignore_eos
+        if request_func_input.capture_timeline:
+            payload["stream_options"]["continuous_usage_stats"] = True
         if request_func_input.extra_body:
             payload.update(request_func_input.extra_body)
         headers = {"Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}"}
@@ -301,46 +502,49 @@ async def async_request_openai_completions(
         output = RequestFuncOutput()
         output.prompt_len = request_func_input.prompt_len
 
-        generated_text = ""
+        # Chunks are joined once at the end; "+=" per token is quadratic.
+        text_chunks: list[str] = []
+        deadline = request_deadline(request_func_input)
         st = time.perf_counter()
         most_recent_timestamp = st
         try:
-            async with session.post(
-                url=api_url, json=payload, headers=headers
-            ) as response:
+            async with (
+                deadline,
+                session.post(url=api_url, json=payload, headers=headers) as response,
+            ):
+                output.first_byte = time.perf_counter() - st
                 if response.status == 200:
                     first_chunk_received = False
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix("data: ")
-                        if chunk != "[DONE]":
-                            data = json.loads(chunk)
-
-                            # NOTE: Some completion API might have a last
-                            # usage summary response without a token so we
-                            # want to check a token was generated
-                            if choices := data.get("choices"):
-                                # Note that text could be empty here
-                                # e.g. for special tokens
-                                text = choices[0].get("text")
-                                timestamp = time.perf_counter()
-                                # First token
-                                if not first_chunk_received:
-                                    first_chunk_received = True
-                                    ttft = time.perf_counter() - st
-                                    output.ttft = ttft
-
-                                # Decoding phase
-                                else:
-                                    output.itl.append(timestamp - most_recent_timestamp)
+                    async for timestamp, data in iter_sse_events(response):
+                        # NOTE: Some completion API might have a last
+                        # usage summary response without a token so we
+                        # want to check a token was generated
+                        if choices := data.get("choices"):
+                            # Note that text could be empty here
+                            # e.g. for special tokens
+                            text = choices[0].get("text")
+                            # First token
+                            if not first_chunk_received:
+                                first_chunk_received = True
+                                ttft = timestamp - st
+                                output.ttft = ttft
+                                first_token_deadline(deadline, request_func_input, st)
+
+                            # Decoding phase
+                            else:
+                                output.itl.append(timestamp - most_recent_timestamp)
+
+                            if request_func_input.capture_timeline:
+                                usage = data.get("usage") or {}
+                                output.chunk_tokens.append(
+                                    usage.get("completion_tokens") or 0
+                                )
 
-                                most_recent_timestamp = timestamp
-                                generated_text += text or ""
-                            if usage := data.get("usage"):
-                                output.output_tokens = usage.get("completion_tokens")
+                            most_recent_timestamp = timestamp
+                            if text:
+                                text_chunks.append(text)
+                        if usage := data.get("usage"):
+                            output.output_tokens = usage.get("completion_tokens")
                     if first_chunk_received:
                         output.success = True
                     else:
@@ -349,15 +553,20 @@ async def async_request_openai_completions(
                             "Never received a valid chunk to calculate TTFT."
                             "This response will be marked as failed!"
                         )
-                    output.generated_text = generated_text
+                    output.generated_text = (
+                        "".join(text_chunks)
+                        if request_func_input.keep_generated_text
+                        else None
+                    )
                     output.latency = most_recent_timestamp - st
                 else:
                     output.error = response.reason or ""
                     output.success = False
         except Exception:
-            output.success = False
-            exc_info = sys.exc_info()
-            output.error = "".join(traceback.format_exception(*exc_info))
+            if not deadline_exceeded(output, deadline):
+                output.success = False
+                exc_info = sys.exc_info()
+                output.error = "".join(traceback.format_exception(*exc_info))
 
     if pbar:
         pbar.update(1)
@@ -367,15 +576,14 @@ async def async_request_openai_completions(
 async def async_request_openai_chat_completions(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(("chat/completions", "profile")), (
         "OpenAI Chat Completions API URL must end with 'chat/completions'."
     )
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         content = [{"type": "text", "text": request_func_input.prompt}]
         if request_func_input.multi_modal_content:
             mm_content = request_func_input.multi_modal_content
@@ -392,6 +600,7 @@ async def async_request_openai_chat_completions(
             if request_func_input.model_name
             else request_func_input.model,
             "messages": [
+                *(request_func_input.history or ()),
                 {"role": "user", "content": content},
             ],
             "temperature": 0.0,
@@ -403,6 +612,8 @@ async def async_request_openai_chat_completions(
         }
         if request_func_input.ignore_eos:
             payload["ignore_eos"] = request_func_input.ignore_eos
+        if request_func_input.capture_timeline:
+            payload["stream_options"]["continuous_usage_stats"] = True
         if request_func_input.extra_body:
             payload.update(request_func_input.extra_body)
         headers = {
@@ -415,58 +626,62 @@ async def async_request_openai_chat_completions(
         output = RequestFuncOutput()
         output.prompt_len = request_func_input.prompt_len
 
-        generated_text = ""
+        # Chunks are joined once at the end; "+=" per token is quadratic.
+        text_chunks: list[str] = []
         ttft = 0.0
+        deadline = request_deadline(request_func_input)
         st = time.perf_counter()
         most_recent_timestamp = st
         try:
-            async with session.post(
-                url=api_url, json=payload, headers=headers
-            ) as response:
+            async with (
+                deadline,
+                session.post(url=api_url, json=payload, headers=headers) as response,
+            ):
+                output.first_byte = time.perf_counter() - st
                 if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-                        chunk_bytes = chunk_bytes.decode("utf-8")
-                        # NOTE: SSE comments (often used as pings) start with a colon.
-                        # These are not JSON data payload and should be skipped.
-                        if chunk_bytes.startswith(":"):
-                            continue
-
-                        chunk = chunk_bytes.removeprefix("data: ")
-
-                        if chunk != "[DONE]":
-                            timestamp = time.perf_counter()
-                            data = json.loads(chunk)
-
-                            if choices := data.get("choices"):
-                                content = choices[0]["delta"].get("content")
-                                # First token
-                                if ttft == 0.0:
-                                    ttft = timestamp - st
-                                    output.ttft = ttft
-
-                                # Decoding phase
-                                else:
-                                    output.itl.append(timestamp - most_recent_timestamp)
-
-                                generated_text += content or ""
-                            elif usage := data.get("usage"):
-                                output.output_tokens = usage.get("completion_tokens")
+                    # NOTE: SSE comments (often used as pings) start with a
+                    # colon. The SSE parser skips them.
+                    async for timestamp, data in iter_sse_events(response):
+                        if choices := data.get("choices"):
+                            content = choices[0]["delta"].get("content")
+                            # First token
+                            if ttft == 0.0:
+                                ttft = timestamp - st
+                                output.ttft = ttft
+                                first_token_deadline(deadline, request_func_input, st)
+
+                            # Decoding phase
+                            else:
+                                output.itl.append(timestamp - most_recent_timestamp)
+
+                            if request_func_input.capture_timeline:
+                                usage = data.get("usage") or {}
+                                output.chunk_tokens.append(
+                                    usage.get("completion_tokens") or 0
+                                )
+
+                            if content:
+                                text_chunks.append(content)
+                        elif usage := data.get("usage"):
+                            output.output_tokens = usage.get("completion_tokens")
 
-                            most_recent_timestamp = timestamp
+                        most_recent_timestamp = timestamp
 
-                    output.generated_text = generated_text
+                    output.generated_text = (
+                        "".join(text_chunks)
+                        if request_func_input.keep_generated_text
+                        else None
+                    )
                     output.success = True
                     output.latency = most_recent_timestamp - st
                 else:
                     output.error = response.reason or ""
                     output.success = False
         except Exception:
-            output.success = False
-            exc_info = sys.exc_info()
-            output.error = "".join(traceback.format_exception(*exc_info))
+            if not deadline_exceeded(output, deadline):
+                output.success = False
+                exc_info = sys.exc_info()
+                output.error = "".join(traceback.format_exception(*exc_info))
 
     if pbar:
         pbar.update(1)
@@ -476,6 +691,7 @@ async def async_request_openai_chat_completions(
 async def async_request_openai_audio(
     request_func_input: RequestFuncInput,
     pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
     # Lazy import without PlaceholderModule to avoid vllm dep.
     import soundfile
@@ -486,9 +702,7 @@ async def async_request_openai_audio(
     )
     "or `translations`."
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with client_session(session) as session:
         content = [{"type": "text", "text": request_func_input.prompt}]
         payload = {
             "model": request_func_input.model_name
@@ -529,7 +743,8 @@ async def async_request_openai_audio(
             output = RequestFuncOutput()
             output.prompt_len = request_func_input.prompt_len
 
-            generated_text = ""
+            # Chunks are joined once at the end; "+=" per token is quadratic.
+            text_chunks: list[str] = []
             ttft = 0.0
             st = time.perf_counter()
             most_recent_timestamp = st
@@ -538,38 +753,30 @@ async def async_request_openai_audio(
                     url=api_url, data=form, headers=headers
                 ) as response:
                     if response.status == 200:
-                        async for chunk_bytes in response.content:
-                            chunk_bytes = chunk_bytes.strip()
-                            if not chunk_bytes:
-                                continue
-
-                            chunk = chunk_bytes.decode("utf-8").removeprefix("data: ")
-                            if chunk != "[DONE]":
-                                timestamp = time.perf_counter()
-                                data = json.loads(chunk)
-
-                                if choices := data.get("choices"):
-                                    content = choices[0]["delta"].get("content")
-                                    # First token
-                                    if ttft == 0.0:
-                                        ttft = timestamp - st
-                                        output.ttft = ttft
-
-                                    # Decoding phase
-                                    else:
-                                        output.itl.append(
-                                            timestamp - most_recent_timestamp
-                                        )
-
-                                    generated_text += content or ""
-                                elif usage := data.get("usage"):
-                                    output.output_tokens = usage.get(
-                                        "completion_tokens"
-                                    )
-
-                                most_recent_timestamp = timestamp
-
-                        output.generated_text = generated_text
+                        async for timestamp, data in iter_sse_events(response):
+                            if choices := data.get("choices"):
+                                content = choices[0]["delta"].get("content")
+                                # First token
+                                if ttft == 0.0:
+                                    ttft = timestamp - st
+                                    output.ttft = ttft
+
+                                # Decoding phase
+                                else:
+                                    output.itl.append(timestamp - most_recent_timestamp)
+
+                                if content:
+                                    text_chunks.append(content)
+                            elif usage := data.get("usage"):
+                                output.output_tokens = usage.get("completion_tokens")
+
+                            most_recent_timestamp = timestamp
+
+                        output.generated_text = (
+                            "".join(text_chunks)
+                            if request_func_input.keep_generated_text
+                            else None
+                        )
                         output.success = True
                         output.latency = most_recent_timestamp - st
                     else:
@@ -587,6 +794,7 @@ async def async_request_openai_audio(
 
 def get_model(pretrained_model_name_or_path: str) -> str:
     if os.getenv("VLLM_USE_MODELSCOPE", "False").lower() == "true":
+        import huggingface_hub.constants
         from modelscope import snapshot_download
 
         from vllm.model_executor.model_loader.weight_utils import get_lock
@@ -609,7 +817,7 @@ def get_tokenizer(
     tokenizer_mode: str = "auto",
     trust_remote_code: bool = False,
     **kwargs,
-) -> PreTrainedTokenizer | PreTrainedTokenizerFast:
+) -> "PreTrainedTokenizer | PreTrainedTokenizerFast":
     if pretrained_model_name_or_path is not None and not os.path.exists(
         pretrained_model_name_or_path
     ):
@@ -629,6 +837,8 @@ def get_tokenizer(
             ) from e
         return MistralTokenizer.from_pretrained(str(pretrained_model_name_or_path))
     else:
+        from transformers import AutoTokenizer
+
         return AutoTokenizer.from_pretrained(
             pretrained_model_name_or_path,
             trust_remote_code=trust_remote_code,
@@ -24,52 +24,77 @@ import argparse
 import asyncio
 import copy
 import dataclasses
+import hashlib
+import itertools
 import json
+import math
+import multiprocessing
+import multiprocessing.synchronize
 import os
+import queue
 import random
+import sys
+import threading
 import time
+import traceback
 import uuid
 import warnings
-from collections.abc import AsyncGenerator
-from contextlib import nullcontext
+from array import array
+from collections.abc import AsyncGenerator, Awaitable, Callable, Container, Sequence
+from contextlib import ExitStack, nullcontext
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
-import datasets
+import aiohttp
 import numpy as np
-import pandas as pd
 from backend_request_func import (
     ASYNC_REQUEST_FUNCS,
     RequestFuncInput,
     RequestFuncOutput,
+    async_request_openai_chat_completions,
+    async_request_openai_completions,
+    create_client_session,
 )
+from client_metrics import ClientMetrics, structure_type
+from client_monitor import ClientLoadMonitor, bottleneck_reasons
+from correctness import evaluate_outputs, merge_pass_rates
+from latency_histogram import LatencyHistogram
+from length_distributions import LengthDistribution
+from request_records import RequestRecordWriter, columnar_path, timeline_path
 from tqdm.asyncio import tqdm
-from transformers import PreTrainedTokenizerBase
 
-try:
-    from vllm.transformers_utils.tokenizer import get_tokenizer
-except ImportError:
-    from backend_request_func import get_tokenizer
-
-try:
-    from vllm.utils.argparse_utils import FlexibleArgumentParser
-except ImportError:
-    from argparse import ArgumentParser as FlexibleArgumentParser
-
-try:
-    from vllm.v1.structured_output.backend_xgrammar import (
-        has_xgrammar_unsupported_json_features,
-    )
-except ImportError:
-    # Fallback if vllm is not installed - only needed for xgrammar_bench dataset
-    def has_xgrammar_unsupported_json_features(schema):
-        return False
+# transformers, datasets and vLLM take seconds to import, which each run of a
+# sweep and each spawned client process would pay. They are imported only on
+# the paths that use them.
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from transformers import PreTrainedTokenizerBase
 
 MILLISECONDS_TO_SECONDS_CONVERSION = 1000
+DEFAULT_NUM_PROMPTS = 1000
+# Number of texts handed to the tokenizer per batched call.
+TOKENIZE_BATCH_SIZE = 8192
+LATENCY_METRICS = ("ttft", "tpot", "itl", "e2el")
+# P99 event loop lag of the client above which a run is flagged as client-bound.
+DEFAULT_LOOP_LAG_THRESHOLD_MS = 10.0
+# Ping-pongs per rank to estimate its clock offset to rank 0 with --mpi, and
+# the time in seconds the ranks are given to get from the barrier to the start.
+MPI_CLOCK_SYNC_ROUNDS = 8
+MPI_START_DELAY = 0.5
+# Seconds between checks of whether a --num-client-procs worker died without
+# reporting a result.
+CLIENT_PROC_POLL_INTERVAL = 1.0
+# Fraction of the scheduled request rate below which the client did not keep
+# up with the schedule.
+SCHEDULE_TOLERANCE = 0.95
 
 
 @dataclass
 class BenchmarkMetrics:
     completed: int
+    # Unsuccessful requests: those that missed a deadline and the others.
+    timed_out: int
+    failed: int
     total_input: int
     total_output: int
     request_throughput: float
@@ -95,6 +120,14 @@ class BenchmarkMetrics:
     median_e2el_ms: float
     std_e2el_ms: float
     percentiles_e2el_ms: list[tuple[float, float]]
+    # Rate at which requests were actually sent, and how late they were sent
+    # versus the arrival schedule.
+    offered_request_rate: float
+    mean_scheduling_lag_ms: float
+    p99_scheduling_lag_ms: float
+    max_scheduling_lag_ms: float
+    # Histograms in seconds, keyed by metric name, see LATENCY_METRICS.
+    latency_histograms: dict[str, LatencyHistogram]
 
 
 @dataclasses.dataclass
@@ -102,33 +135,585 @@ class SampleRequest:
     """A class representing a single inference request for benchmarking.
 
     Attributes:
-        prompt: The input text prompt for the model.
+        prompt: The input text prompt for the model, or its token ids, which
+            only completions backends accept.
         multi_modal_data: Optional dictionary containing multi-modal data (e.g.
             images).
         prompt_len: The length of the prompt in tokens.
         expected_output_len: The expected length of the output in tokens.
+        prefix_id: The shared prefix of the prompt, for the prefix dataset.
     """
 
-    prompt: str
+    prompt: str | list[int]
     prompt_len: int
     expected_output_len: int
     schema: dict
     structure_type: str
     completion: str = None
+    prefix_id: int | None = None
+
+
+class RequestFuncInputs(Sequence[RequestFuncInput]):
+    """The ``RequestFuncInput`` of every request, built on access.
+
+    Building them lazily keeps streamed datasets (:class:`TraceDataset`) on
+    disk. Requests whose index is in ``structured_idx`` and that have a
+    schema are sent with structured output. Slices are cheap, picklable
+    views for the client processes.
+    """
+
+    def __init__(
+        self,
+        input_requests: Sequence[SampleRequest],
+        template: RequestFuncInput,
+        structured_idx: Container[int],
+        indices: range | None = None,
+    ) -> None:
+        self.input_requests = input_requests
+        self.template = template
+        self.structured_idx = structured_idx
+        self.indices = range(len(input_requests)) if indices is None else indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RequestFuncInputs(
+                self.input_requests,
+                self.template,
+                self.structured_idx,
+                self.indices[index],
+            )
+        request_idx = self.indices[index]
+        request = self.input_requests[request_idx]
+        extra_body = None
+        if request_idx in self.structured_idx and request.schema is not None:
+            # Add the schema to the extra_body
+            extra_body = {
+                "structured_outputs": {request.structure_type: request.schema}
+            }
+        return dataclasses.replace(
+            self.template,
+            prompt=request.prompt,
+            prompt_len=request.prompt_len,
+            output_len=request.expected_output_len,
+            extra_body=extra_body,
+        )
+
+
+def get_tokenizer(*args, **kwargs) -> "PreTrainedTokenizerBase":
+    """Load a tokenizer with vLLM's loader, or the local fallback when vLLM is
+    not installed."""
+    try:
+        from vllm.transformers_utils.tokenizer import get_tokenizer
+    except ImportError:
+        from backend_request_func import get_tokenizer
+    return get_tokenizer(*args, **kwargs)
+
+
+def xgrammar_schema_filter() -> Callable[[dict], bool]:
+    """vLLM's check for JSON schema features xgrammar does not support."""
+    try:
+        from vllm.v1.structured_output.backend_xgrammar import (
+            has_xgrammar_unsupported_json_features,
+        )
+    except ImportError:
+        # Fallback if vllm is not installed - only needed for xgrammar_bench
+        # dataset
+        def has_xgrammar_unsupported_json_features(schema):
+            return False
+
+    return has_xgrammar_unsupported_json_features
+
+
+DEFAULT_PROMPT_LEN_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "benchmark_serving_structured_output",
+)
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def tokenizer_identity(tokenizer: "PreTrainedTokenizerBase") -> dict:
+    """Fields that identify a tokenizer for the on-disk caches."""
+    return {
+        "name_or_path": getattr(tokenizer, "name_or_path", None),
+        "class": type(tokenizer).__name__,
+        "vocab_size": len(tokenizer),
+    }
+
+
+def prompt_len_cache_path(
+    tokenizer: "PreTrainedTokenizerBase", args: argparse.Namespace
+) -> str | None:
+    """Return the prompt-length cache file for this tokenizer and dataset.
+
+    Returns None when caching is disabled, or for ``json-unique`` whose
+    prompts contain random UUIDs and so never repeat across runs.
+    """
+    if args.no_prompt_len_cache or args.dataset == "json-unique":
+        return None
+    key = json.dumps(
+        {
+            "tokenizer": tokenizer_identity(tokenizer),
+            "dataset": args.dataset,
+            "json_schema_path": args.json_schema_path,
+        },
+        sort_keys=True,
+    )
+    return os.path.join(args.prompt_len_cache_dir, f"prompt_lens_{_digest(key)}.json")
+
+
+def get_prompt_lens(
+    tokenizer: "PreTrainedTokenizerBase",
+    prompts: list[str],
+    cache_path: str | None = None,
+) -> list[int]:
+    """Return the token length of every prompt.
+
+    Each distinct prompt is tokenized once, in batched tokenizer calls. With
+    ``cache_path``, lengths are looked up by prompt hash in that JSON file
+    first, and newly computed ones are added to it.
+    """
+    cached: dict[str, int] = {}
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            warnings.warn(
+                f"Ignoring unreadable prompt length cache {cache_path}: {e}",
+                stacklevel=2,
+            )
+
+    digests = {prompt: _digest(prompt) for prompt in dict.fromkeys(prompts)}
+    missing = [prompt for prompt, digest in digests.items() if digest not in cached]
+    for start in range(0, len(missing), TOKENIZE_BATCH_SIZE):
+        batch = missing[start : start + TOKENIZE_BATCH_SIZE]
+        for prompt, ids in zip(batch, tokenizer(batch).input_ids):
+            cached[digests[prompt]] = len(ids)
+
+    if missing and cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp_path, cache_path)
+
+    print(
+        f"Prompt lengths: {len(digests)} distinct prompts, "
+        f"{len(digests) - len(missing)} from cache, {len(missing)} tokenized"
+    )
+    return [cached[digests[prompt]] for prompt in prompts]
+
+
+def regular_token_ids(vocab_size: int, special_ids: Container[int]) -> np.ndarray:
+    """The token ids of the vocabulary that are not special tokens, which
+    the prompts of token ids are made of."""
+    return np.setdiff1d(
+        np.arange(vocab_size, dtype=np.int64),
+        np.fromiter(special_ids, dtype=np.int64),
+    )
+
+
+class TraceDataset(Sequence[SampleRequest]):
+    """Requests of a JSONL trace, read from disk on access.
+
+    Every line of the trace is one request::
+
+        {"timestamp": 0.0, "prompt": "...", "output_len": 128}
+        {"timestamp": 0.7, "prompt_len": 2048, "schema": {...}}
+
+    Only ``timestamp`` (arrival time in seconds) and either ``prompt`` or
+    ``prompt_len`` are required. A request with only ``prompt_len`` is sent
+    as that many token ids, never special ones, which needs a completions
+    endpoint. Optional fields are ``output_len`` (default ``output_len``),
+    ``schema`` and ``structure_type`` (default ``"json"``) for structured
+    output, and ``completion`` for the correctness evaluation.
+
+    The trace is scanned once, keeping only the offset, arrival time and
+    prompt length of every line in memory, and noting in
+    ``token_id_prompts`` whether any request is sent as token ids. Prompts
+    without ``prompt_len`` are tokenized with ``count_tokens`` in batches
+    during the scan. The trace stays open for reading until :meth:`close`,
+    or the end of a ``with`` block. Slices share the open file, so a shard of
+    the trace is cheap to send to a client process, which opens it again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        count_tokens: Callable[[list[str]], list[int]],
+        vocab_size: int,
+        special_ids: Container[int],
+        output_len: int,
+        num_requests: int | None = None,
+    ) -> None:
+        self.path = path
+        self._token_ids = regular_token_ids(vocab_size, special_ids)
+        self.output_len = output_len
+        self._file = None
+        self.token_id_prompts = False
+        offsets, timestamps, prompt_lens = array("q"), array("d"), array("q")
+        pending: list[tuple[int, str]] = []
+
+        def tokenize_pending():
+            lens = count_tokens([prompt for _, prompt in pending])
+            for (i, _), prompt_len in zip(pending, lens):
+                prompt_lens[i] = prompt_len
+            pending.clear()
+
+        with open(path, "rb") as f:
+            offset = 0
+            for line_no, line in enumerate(f, 1):
+                if num_requests is not None and len(offsets) == num_requests:
+                    break
+                if line.strip():
+                    record = json.loads(line)
+                    if "timestamp" not in record or not (
+                        "prompt" in record or "prompt_len" in record
+                    ):
+                        raise ValueError(
+                            f"{path}:{line_no}: a trace entry needs a "
+                            '"timestamp" and a "prompt" or "prompt_len".'
+                        )
+                    offsets.append(offset)
+                    timestamps.append(float(record["timestamp"]))
+                    if "prompt" not in record:
+                        self.token_id_prompts = True
+                    if "prompt_len" in record:
+                        prompt_lens.append(int(record["prompt_len"]))
+                    else:
+                        prompt_lens.append(0)
+                        pending.append((len(prompt_lens) - 1, record["prompt"]))
+                        if len(pending) == TOKENIZE_BATCH_SIZE:
+                            tokenize_pending()
+                offset += len(line)
+        if pending:
+            tokenize_pending()
+        if not offsets:
+            raise ValueError(f"Trace {path} has no requests.")
+
+        # Replay in arrival order, even if the trace was not written in it.
+        order = np.argsort(np.frombuffer(timestamps), kind="stable")
+        self._offsets = np.frombuffer(offsets, dtype=np.int64)[order]
+        self._timestamps = np.frombuffer(timestamps)[order]
+        self._prompt_lens = np.frombuffer(prompt_lens, dtype=np.int64)[order]
+        self._file = open(path, "rb")
+
+    def arrival_times(self, time_scale: float = 1.0) -> np.ndarray:
+        """Send times relative to the first request, for :func:`run_requests`.
+
+        ``time_scale`` stretches (> 1) or compresses (< 1) the trace.
+        """
+        return (self._timestamps - self._timestamps[0]) * time_scale
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = copy.copy(self)
+            # The copy goes through __getstate__, which drops the file.
+            view._file = self._file
+            view._offsets = self._offsets[index]
+            view._timestamps = self._timestamps[index]
+            view._prompt_lens = self._prompt_lens[index]
+            return view
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        offset = int(self._offsets[index])
+        self._file.seek(offset)
+        record = json.loads(self._file.readline())
+        prompt_len = int(self._prompt_lens[index])
+        prompt = record.get("prompt")
+        if prompt is None:
+            # Consecutive token ids from an offset derived from the entry,
+            # so that no two requests share a prefix.
+            positions = (offset + np.arange(prompt_len)) % len(self._token_ids)
+            prompt = self._token_ids[positions].tolist()
+        schema = record.get("schema")
+        return SampleRequest(
+            prompt=prompt,
+            prompt_len=prompt_len,
+            expected_output_len=int(record.get("output_len", self.output_len)),
+            schema=schema,
+            structure_type=record.get("structure_type", "json") if schema else None,
+            completion=record.get("completion"),
+        )
+
+    def __getstate__(self) -> dict:
+        # Each process opens the trace itself.
+        return {**self.__dict__, "_file": None}
+
+    def close(self) -> None:
+        """Close the trace, which also closes it for the slices."""
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "TraceDataset":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+XGRAMMAR_BENCH_DATASET = "NousResearch/json-mode-eval"
+
+
+def xgrammar_bench_cache_path(
+    tokenizer: "PreTrainedTokenizerBase", cache_dir: str
+) -> str:
+    """Return the preprocessed xgrammar_bench file for this tokenizer."""
+    key = json.dumps(
+        {
+            "tokenizer": tokenizer_identity(tokenizer),
+            "chat_template": _digest(str(tokenizer.chat_template)),
+            "dataset": XGRAMMAR_BENCH_DATASET,
+            # Unsupported schemas are only filtered out with vLLM installed.
+            "schema_filter": xgrammar_schema_filter().__module__,
+        },
+        sort_keys=True,
+    )
+    return os.path.join(cache_dir, f"xgrammar_bench_{_digest(key)}.arrow")
+
+
+def preprocess_xgrammar_bench(tokenizer: "PreTrainedTokenizerBase", path: str) -> None:
+    """Download, filter, template and tokenize the xgrammar_bench dataset and
+    write it to ``path`` as an Arrow IPC file.
+
+    The file has a ``schema``, ``prompt``, ``completion`` and ``prompt_len``
+    column. It is written to a temporary file first, so concurrent runs never
+    see a partial cache.
+    """
+    import datasets
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    has_xgrammar_unsupported_json_features = xgrammar_schema_filter()
+    dataset = datasets.load_dataset(XGRAMMAR_BENCH_DATASET, split="train")
+    full_dataset_len = len(dataset)
+
+    def _filter_func(item):
+        import json
+
+        schema = json.loads(item["schema"])
+        return not has_xgrammar_unsupported_json_features(schema)
+
+    dataset = dataset.filter(_filter_func)
+    num_filtered_out = full_dataset_len - len(dataset)
+    print(
+        f"dataset has {len(dataset)} entries after filtering "
+        f"out {num_filtered_out} entries with unsupported features"
+    )
+    # Whole columns at once, indexing dataset[column][idx] in a loop
+    # materialises the column on every access.
+    columns = dataset.to_dict()
+    prompts = tokenizer.apply_chat_template(
+        columns["prompt"], tokenize=False, add_generation_prompt=True
+    )
+    prompt_lens = []
+    for start in range(0, len(prompts), TOKENIZE_BATCH_SIZE):
+        batch = prompts[start : start + TOKENIZE_BATCH_SIZE]
+        prompt_lens += [len(ids) for ids in tokenizer(batch).input_ids]
+    table = pa.table(
+        {
+            "schema": columns["schema"],
+            "prompt": prompts,
+            "completion": columns["completion"],
+            "prompt_len": pa.array(prompt_lens, type=pa.int64()),
+        }
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def load_xgrammar_bench(tokenizer: "PreTrainedTokenizerBase", cache_dir: str) -> str:
+    """Return the preprocessed xgrammar_bench file in ``cache_dir``, creating
+    it on the first use. Later runs need neither the network nor the
+    tokenizer's chat template work."""
+    path = xgrammar_bench_cache_path(tokenizer, cache_dir)
+    if os.path.exists(path):
+        print(f"Using preprocessed xgrammar_bench dataset {path}")
+    else:
+        preprocess_xgrammar_bench(tokenizer, path)
+        print(f"Preprocessed xgrammar_bench dataset saved to {path}")
+    return path
+
+
+class XGrammarBenchDataset(Sequence[SampleRequest]):
+    """``num_requests`` requests cycling through a preprocessed xgrammar_bench
+    file, see :func:`preprocess_xgrammar_bench`.
+
+    The file is memory-mapped, so loading it copies nothing, and rows are
+    only converted to Python objects on access. Each process maps the file
+    itself.
+    """
+
+    def __init__(
+        self, path: str, num_requests: int, output_len: int, structure_type: str
+    ) -> None:
+        self.path = path
+        self.output_len = output_len
+        self.structure_type = structure_type
+        self._table = None
+        self._indices = range(num_requests)
+        self._num_rows = self.table.num_rows
+
+    @property
+    def table(self) -> "pa.Table":
+        if self._table is None:
+            import pyarrow as pa
+            import pyarrow.ipc
+
+            with pa.memory_map(self.path) as source:
+                self._table = pa.ipc.open_file(source).read_all()
+        return self._table
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = copy.copy(self)
+            view._indices = self._indices[index]
+            return view
+        row = self._indices[index] % self._num_rows
+        return SampleRequest(
+            prompt=self.table["prompt"][row].as_py(),
+            prompt_len=self.table["prompt_len"][row].as_py(),
+            expected_output_len=self.output_len,
+            schema=self.table["schema"][row].as_py(),
+            structure_type=self.structure_type,
+            completion=self.table["completion"][row].as_py(),
+        )
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_table": None}
+
+
+class RandomDataset(Sequence[SampleRequest]):
+    """Requests of random token ids with lengths drawn from distributions.
+
+    All lengths are drawn up front in one vectorized call per distribution;
+    the prompt of a request is generated when it is accessed, from a random
+    generator seeded with ``seed`` and the request index. A million requests
+    therefore take a few megabytes and are created in milliseconds, and every
+    process builds the same prompts. Prompts are sent as token ids, so their
+    lengths are exact; this needs a completions endpoint. Special tokens are
+    never drawn.
+    """
+
+    def __init__(
+        self,
+        num_requests: int,
+        vocab_size: int,
+        special_ids: Container[int],
+        input_len: LengthDistribution,
+        output_len: LengthDistribution,
+        schema: dict,
+        structure_type: str,
+        seed: int,
+    ) -> None:
+        rng = np.random.default_rng(seed)
+        self._input_lens = input_len.sample(rng, num_requests)
+        self._output_lens = output_len.sample(rng, num_requests)
+        self._indices = range(num_requests)
+        self._token_ids = regular_token_ids(vocab_size, special_ids)
+        self.schema = schema
+        self.structure_type = structure_type
+        self.seed = seed
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = copy.copy(self)
+            view._input_lens = self._input_lens[index]
+            view._output_lens = self._output_lens[index]
+            view._indices = self._indices[index]
+            return view
+        prompt_len = int(self._input_lens[index])
+        rng = np.random.default_rng((self.seed, self._indices[index]))
+        prompt = self._token_ids[
+            rng.integers(0, len(self._token_ids), prompt_len)
+        ].tolist()
+        return SampleRequest(
+            prompt=prompt,
+            prompt_len=prompt_len,
+            expected_output_len=int(self._output_lens[index]),
+            schema=self.schema,
+            structure_type=self.structure_type,
+        )
+
+
+def load_json_schema(args: argparse.Namespace) -> dict:
+    if args.json_schema_path is None:
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        args.json_schema_path = os.path.join(
+            dir_path, "structured_schemas", "structured_schema_1.json"
+        )
+    with open(args.json_schema_path) as f:
+        return json.load(f)
+
+
+def sample_shared_prefix_requests(
+    num_requests: int,
+    vocab_size: int,
+    special_ids: Container[int],
+    prefix_len: int,
+    num_prefixes: int,
+    suffix_len: int,
+    output_len: int,
+    schema: dict,
+    structure_type: str,
+    seed: int,
+) -> list[SampleRequest]:
+    """Requests whose prompts are one of ``num_prefixes`` shared prefixes of
+    ``prefix_len`` token ids followed by a unique suffix of ``suffix_len``
+    token ids, e.g. the retrieved context and the question of a RAG prompt.
+
+    The token ids are random, and never special tokens, so prompts overlap
+    exactly as configured. Each
+    request picks its prefix at random, see :func:`prefix_cache_ttft` for
+    how the TTFT of the first (cold) and later (warm) uses compare.
+    """
+    rng = np.random.default_rng(seed)
+    token_ids = regular_token_ids(vocab_size, special_ids)
+    prefixes = token_ids[
+        rng.integers(0, len(token_ids), size=(num_prefixes, prefix_len))
+    ]
+    prefix_ids = rng.integers(0, num_prefixes, size=num_requests)
+    suffixes = token_ids[
+        rng.integers(0, len(token_ids), size=(num_requests, suffix_len))
+    ]
+    return [
+        SampleRequest(
+            prompt=np.concatenate([prefixes[prefix_id], suffix]).tolist(),
+            prompt_len=prefix_len + suffix_len,
+            expected_output_len=output_len,
+            schema=schema,
+            structure_type=structure_type,
+            prefix_id=int(prefix_id),
+        )
+        for prefix_id, suffix in zip(prefix_ids, suffixes)
+    ]
 
 
 def sample_requests(
-    tokenizer: PreTrainedTokenizerBase, args: argparse.Namespace
+    tokenizer: "PreTrainedTokenizerBase", args: argparse.Namespace
 ) -> list[SampleRequest]:
     if args.dataset == "json" or args.dataset == "json-unique":
-        if args.json_schema_path is None:
-            dir_path = os.path.dirname(os.path.realpath(__file__))
-            args.json_schema_path = os.path.join(
-                dir_path, "structured_schemas", "structured_schema_1.json"
-            )
         json_schemas = []
-        with open(args.json_schema_path) as f:
-            schema = json.load(f)
+        schema = load_json_schema(args)
 
         if args.dataset == "json-unique":
             json_schemas = [copy.deepcopy(schema) for _ in range(args.num_prompts)]
@@ -142,16 +727,28 @@ def sample_requests(
         else:
             json_schemas = [schema] * args.num_prompts
 
+        # The "json" dataset shares one schema object, so its prompt is only
+        # built once.
+        schema_prompts: dict[int, str] = {}
+
         def gen_prompt(index: int):
-            return f"Generate an example of a brief user profile given the following schema: {json.dumps(get_schema(index))}"  # noqa: E501
+            schema = get_schema(index)
+            if (prompt := schema_prompts.get(id(schema))) is None:
+                prompt = f"Generate an example of a brief user profile given the following schema: {json.dumps(schema)}"  # noqa: E501
+                schema_prompts[id(schema)] = prompt
+            return prompt
 
         def get_schema(index: int):
             return json_schemas[index % len(json_schemas)]
 
+        prompts = [gen_prompt(i) for i in range(args.num_prompts)]
+        prompt_lens = get_prompt_lens(
+            tokenizer, prompts, prompt_len_cache_path(tokenizer, args)
+        )
         requests = [
             SampleRequest(
-                prompt=gen_prompt(i),
-                prompt_len=len(tokenizer(gen_prompt(i)).input_ids),
+                prompt=prompts[i],
+                prompt_len=prompt_lens[i],
                 expected_output_len=args.output_len,
                 schema=get_schema(i),
                 structure_type=args.structure_type,
@@ -227,60 +824,80 @@ def sample_requests(
         ]
 
     elif args.dataset == "xgrammar_bench":
-        requests: list[SampleRequest] = []
-        dataset = datasets.load_dataset("NousResearch/json-mode-eval", split="train")
-        full_dataset_len = len(dataset)
-
-        def _filter_func(item):
-            import json
+        requests = XGrammarBenchDataset(
+            load_xgrammar_bench(tokenizer, args.prompt_len_cache_dir),
+            args.num_prompts,
+            args.output_len,
+            args.structure_type,
+        )
 
-            schema = json.loads(item["schema"])
-            return not has_xgrammar_unsupported_json_features(schema)
+    elif args.dataset == "trace":
+        requests = TraceDataset(
+            args.trace_path,
+            lambda prompts: [len(ids) for ids in tokenizer(prompts).input_ids],
+            len(tokenizer),
+            set(tokenizer.all_special_ids),
+            args.output_len,
+            args.num_prompts,
+        )
+        print(f"Trace {args.trace_path}: {len(requests)} requests")
+
+    elif args.dataset == "random":
+        input_len = LengthDistribution(args.random_input_len)
+        output_len = LengthDistribution(args.random_output_len or str(args.output_len))
+        requests = RandomDataset(
+            args.num_prompts,
+            len(tokenizer),
+            set(tokenizer.all_special_ids),
+            input_len,
+            output_len,
+            load_json_schema(args),
+            args.structure_type,
+            args.seed,
+        )
+        print(
+            f"Random dataset: input lengths {input_len.spec}, "
+            f"output lengths {output_len.spec}"
+        )
 
-        dataset = dataset.filter(_filter_func)
-        num_filtered_out = full_dataset_len - len(dataset)
+    elif args.dataset == "prefix":
+        requests = sample_shared_prefix_requests(
+            args.num_prompts,
+            len(tokenizer),
+            set(tokenizer.all_special_ids),
+            args.prefix_len,
+            args.num_prefixes,
+            args.suffix_len,
+            args.output_len,
+            load_json_schema(args),
+            args.structure_type,
+            args.seed,
+        )
         print(
-            f"dataset has {len(dataset)} entries after filtering "
-            f"out {num_filtered_out} entries with unsupported features"
-        )
-        len_dataset = len(dataset)
-        for data_point_idx in range(args.num_prompts):
-            idx = data_point_idx
-            while idx >= len_dataset:
-                idx -= len_dataset
-            schema = dataset["schema"][idx]
-            prompt = tokenizer.apply_chat_template(
-                dataset["prompt"][idx], tokenize=False, add_generation_prompt=True
-            )
-            input_len = len(tokenizer(prompt).input_ids)
-            completion = dataset["completion"][idx]
-
-            requests.append(
-                SampleRequest(
-                    prompt=prompt,
-                    prompt_len=input_len,
-                    expected_output_len=args.output_len,
-                    schema=schema,
-                    structure_type=args.structure_type,
-                    completion=completion,
-                )
-            )
+            f"Shared prefixes: {args.num_prefixes} of {args.prefix_len} tokens, "
+            f"{args.suffix_len} suffix tokens per request"
+        )
 
     return requests
 
 
-async def get_request(
-    input_requests: list[SampleRequest],
+def get_arrival_times(
+    num_requests: int,
     request_rate: float,
     burstiness: float = 1.0,
-) -> AsyncGenerator[tuple[int, SampleRequest], None]:
+) -> np.ndarray:
     """
-    Asynchronously generates requests at a specified rate
-    with OPTIONAL burstiness.
+    Precomputes the send times of ``num_requests`` requests at a specified
+    rate with OPTIONAL burstiness.
+
+    The schedule is absolute: element ``i`` is the time in seconds, relative
+    to the start of the run, at which request ``i`` should be sent. Sleeping
+    until these deadlines (rather than for each interval in turn) keeps event
+    loop delays from accumulating and lowering the offered load.
 
     Args:
-        input_requests:
-            A list of input requests, each represented as a tuple.
+        num_requests:
+            The number of requests to schedule.
         request_rate:
             The rate at which requests are generated (requests/s).
         burstiness (optional):
@@ -292,272 +909,1457 @@ async def get_request(
             in more bursty requests, while a higher burstiness value
             (burstiness > 1) results in a more uniform arrival of requests.
     """
-    input_requests = iter(input_requests)
-
     # Calculate scale parameter theta to maintain the desired request_rate.
     assert burstiness > 0, (
         f"A positive burstiness factor is expected, but given {burstiness}."
     )
+    arrival_times = np.zeros(num_requests)
+    if request_rate == float("inf") or num_requests < 2:
+        # If the request rate is infinity, then we don't need to wait.
+        return arrival_times
     theta = 1.0 / (request_rate * burstiness)
+    # Sample the request intervals from the gamma distribution.
+    # If burstiness is 1, it follows exponential distribution.
+    # The first request is sent right away.
+    intervals = np.random.gamma(shape=burstiness, scale=theta, size=num_requests - 1)
+    np.cumsum(intervals, out=arrival_times[1:])
+    return arrival_times
 
-    for i, request in enumerate(input_requests):
-        yield i, request
 
-        if request_rate == float("inf"):
-            # If the request rate is infinity, then we don't need to wait.
-            continue
+def get_arrival_times_for_duration(
+    duration: float,
+    request_rate: float,
+    burstiness: float = 1.0,
+) -> np.ndarray:
+    """Like :func:`get_arrival_times`, but schedules requests for ``duration``
+    seconds instead of a fixed number of requests. ``request_rate`` must be
+    finite."""
+    num_requests = math.ceil(duration * request_rate) + 1
+    arrival_times = get_arrival_times(num_requests, request_rate, burstiness)
+    while arrival_times[-1] < duration:
+        num_requests *= 2
+        arrival_times = get_arrival_times(num_requests, request_rate, burstiness)
+    return arrival_times[arrival_times < duration]
 
-        # Sample the request interval from the gamma distribution.
-        # If burstiness is 1, it follows exponential distribution.
-        interval = np.random.gamma(shape=burstiness, scale=theta)
-        # The next request will be sent after the interval.
-        await asyncio.sleep(interval)
 
+def scheduled_request_rate(arrival_times: np.ndarray) -> float:
+    """The request rate of a schedule from :func:`get_arrival_times`."""
+    if len(arrival_times) < 2 or arrival_times[-1] == 0:
+        return float("inf")
+    return (len(arrival_times) - 1) / float(arrival_times[-1])
 
-def calculate_metrics(
-    input_requests: list[tuple[str, int, int]],
-    outputs: list[RequestFuncOutput],
-    dur_s: float,
-    tokenizer: PreTrainedTokenizerBase,
-    selected_percentile_metrics: list[str],
-    selected_percentiles: list[float],
-    goodput_config_dict: dict[str, float] | None = None,
-) -> tuple[BenchmarkMetrics, list[int]]:
-    actual_output_lens: list[int] = []
-    total_input = 0
-    completed = 0
-    good_completed = 0
-    itls: list[float] = []
-    tpots: list[float] = []
-    all_tpots: list[float] = []
-    ttfts: list[float] = []
-    e2els: list[float] = []
-    for i in range(len(outputs)):
-        if outputs[i].success:
-            # We use the tokenizer to count the number of output tokens for all
-            # serving backends instead of looking at len(outputs[i].itl) since
-            # multiple output tokens may be bundled together
-            # Note : this may inflate the output token count slightly
-            output_len = len(
-                tokenizer(outputs[i].generated_text, add_special_tokens=False).input_ids
-            )
-            actual_output_lens.append(output_len)
-            total_input += input_requests[i].prompt_len
-            tpot = 0
-            if output_len > 1:
-                latency_minus_ttft = outputs[i].latency - outputs[i].ttft
-                tpot = latency_minus_ttft / (output_len - 1)
-                tpots.append(tpot)
-            outputs[i].tpot = tpot
-            # Note: if output_len <= 1, we regard tpot as 0 for goodput
-            all_tpots.append(tpot)
-            itls += outputs[i].itl
-            ttfts.append(outputs[i].ttft)
-            e2els.append(outputs[i].latency)
-            completed += 1
-        else:
-            actual_output_lens.append(0)
 
-    if goodput_config_dict:
-        valid_metrics = []
-        slo_values = []
+async def get_request(
+    arrival_times: np.ndarray,
+    start_time: float,
+) -> AsyncGenerator[int, None]:
+    """
+    Asynchronously yields the index of every arrival time of
+    ``arrival_times`` at that time. The times are offsets in seconds from
+    ``start_time`` (a ``time.monotonic()`` timestamp). The callers build a
+    request's input from the index only when it is sent, since inputs are
+    built on access (see :class:`RequestFuncInputs`).
+    """
+    for i, arrival_time in enumerate(arrival_times.tolist()):
+        delay = start_time + arrival_time - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield i
+
 
-        if "ttft" in goodput_config_dict:
-            valid_metrics.append(ttfts)
-            slo_values.append(
-                goodput_config_dict["ttft"] / MILLISECONDS_TO_SECONDS_CONVERSION
+class OutputRecorder:
+    """Consumes every output as its request completes.
+
+    The ITLs of successful requests sent inside ``window`` (send times in
+    seconds, None for all requests) go into ``itl_histogram``, the output is
+    written to ``writer`` if there is one, and then the ITLs are dropped from
+    the output. The memory of a run therefore does not grow with the number
+    of generated tokens.
+    """
+
+    def __init__(
+        self,
+        window: tuple[float, float] | None = None,
+        writer: RequestRecordWriter | None = None,
+    ) -> None:
+        self.window = window
+        self.writer = writer
+        self.itl_histogram = LatencyHistogram()
+
+    def __call__(self, output: RequestFuncOutput) -> None:
+        measured = (
+            self.window is None or self.window[0] <= output.send_time < self.window[1]
+        )
+        if measured and output.success:
+            self.itl_histogram.record_many(output.itl)
+        if output.success and output.generated_text is None:
+            # The number of streamed chunks is the fallback output length
+            # when neither the text nor the usage is available.
+            output.output_tokens = output.output_tokens or len(output.itl) + 1
+        if self.writer is not None:
+            self.writer.write(
+                {
+                    "request_idx": output.request_idx,
+                    "measured": measured,
+                    "success": output.success,
+                    "prompt_len": output.prompt_len,
+                    "output_tokens": output.output_tokens,
+                    "ttft": output.ttft,
+                    "latency": output.latency,
+                    "send_time": output.send_time,
+                    "scheduling_lag": output.scheduling_lag,
+                    "turn": output.turn,
+                    "timed_out": output.timed_out,
+                    "itl": output.itl.tolist(),
+                    "generated_text": output.generated_text,
+                    "error": output.error,
+                }
             )
-        if "tpot" in goodput_config_dict:
-            valid_metrics.append(all_tpots)
-            slo_values.append(
-                goodput_config_dict["tpot"] / MILLISECONDS_TO_SECONDS_CONVERSION
+            if self.writer.timeline is not None:
+                self.writer.timeline.write(
+                    output.request_idx,
+                    output.success,
+                    output.start_time,
+                    output.first_byte,
+                    output.ttft,
+                    output.itl,
+                    output.chunk_tokens,
+                )
+        output.itl = array("d")
+        output.chunk_tokens = array("q")
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_requests(
+    request_func: Callable[..., Awaitable[RequestFuncOutput]],
+    request_inputs: RequestFuncInputs,
+    arrival_times: np.ndarray | None,
+    max_concurrency: int | None,
+    session: aiohttp.ClientSession | None,
+    pbar: tqdm | None = None,
+    duration: float | None = None,
+    on_complete: Callable[[RequestFuncOutput], None] | None = None,
+    client_metrics: ClientMetrics | None = None,
+    load_monitor: ClientLoadMonitor | None = None,
+) -> list[RequestFuncOutput]:
+    """Send ``request_inputs`` on the ``arrival_times`` schedule and wait for
+    them.
+
+    If ``arrival_times`` is None, the load is closed-loop instead: each of
+    ``max_concurrency`` clients sends requests back to back, cycling through
+    ``request_inputs``, until ``duration`` seconds have passed.
+
+    Returns the outputs in the order they were sent, with their
+    ``request_idx`` (into the unsliced ``request_inputs``), ``send_time`` and
+    ``scheduling_lag`` filled in. ``on_complete`` is called with each output
+    as soon as its request completes. Sent and completed requests are
+    exported to ``client_metrics`` if given. ``load_monitor`` samples the
+    client load while the requests run; its backlog counts the requests that
+    are due but wait for the event loop or a --max-concurrency slot.
+    """
+    start_time = time.monotonic()
+    if load_monitor is not None:
+        load_monitor.start(start_time)
+
+    async def timed_request_func(request_idx, arrival_time, semaphore):
+        # The lag is measured when the event loop gets to the request, before
+        # it waits for a free --max-concurrency slot.
+        send_time = time.monotonic() - start_time
+        request_func_input = request_inputs[request_idx]
+        structure = structure_type(request_func_input)
+        async with semaphore:
+            if load_monitor is not None:
+                load_monitor.backlog -= 1
+            if client_metrics is not None:
+                client_metrics.request_sent(structure)
+            request_start_time = time.monotonic() - start_time
+            output = await request_func(
+                request_func_input=request_func_input,
+                pbar=pbar,
+                session=session,
             )
-        if "e2el" in goodput_config_dict:
-            valid_metrics.append(e2els)
-            slo_values.append(
-                goodput_config_dict["e2el"] / MILLISECONDS_TO_SECONDS_CONVERSION
+        if client_metrics is not None:
+            client_metrics.request_completed(output, structure)
+        output.request_idx = request_inputs.indices[request_idx]
+        output.send_time = send_time
+        output.scheduling_lag = send_time - arrival_time
+        output.start_time = request_start_time
+        if on_complete is not None:
+            on_complete(output)
+        return output
+
+    try:
+        if arrival_times is None:
+            assert max_concurrency and duration is not None
+            requests = itertools.cycle(range(len(request_inputs)))
+            outputs: list[RequestFuncOutput] = []
+
+            async def client():
+                for request_idx in requests:
+                    send_time = time.monotonic() - start_time
+                    if send_time >= duration:
+                        return
+                    if load_monitor is not None:
+                        load_monitor.backlog += 1
+                    outputs.append(
+                        await timed_request_func(request_idx, send_time, nullcontext())
+                    )
+
+            await asyncio.gather(*(client() for _ in range(max_concurrency)))
+            outputs.sort(key=lambda output: output.send_time)
+            return outputs
+
+        semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency else nullcontext()
+        )
+        tasks: list[asyncio.Task] = []
+        async for i in get_request(arrival_times, start_time):
+            if load_monitor is not None:
+                load_monitor.backlog += 1
+            tasks.append(
+                asyncio.create_task(
+                    timed_request_func(
+                        i % len(request_inputs), float(arrival_times[i]), semaphore
+                    )
+                )
             )
+        return await asyncio.gather(*tasks)
+    finally:
+        if load_monitor is not None:
+            await load_monitor.stop()
 
-        for req_metric in zip(*valid_metrics):
-            is_good_req = all([s >= r for s, r in zip(slo_values, req_metric)])
-            if is_good_req:
-                good_completed += 1
 
-    if completed == 0:
-        warnings.warn(
-            "All requests failed. This is likely due to a misconfiguration "
-            "on the benchmark arguments.",
-            stacklevel=2,
-        )
-    metrics = BenchmarkMetrics(
-        completed=completed,
-        total_input=total_input,
-        total_output=sum(actual_output_lens),
-        request_throughput=completed / dur_s,
-        request_goodput=good_completed / dur_s,
-        output_throughput=sum(actual_output_lens) / dur_s,
-        total_token_throughput=(total_input + sum(actual_output_lens)) / dur_s,
-        mean_ttft_ms=np.mean(ttfts or 0)
-        * 1000,  # ttfts is empty if streaming is not supported by backend
-        std_ttft_ms=np.std(ttfts or 0) * 1000,
-        median_ttft_ms=np.median(ttfts or 0) * 1000,
-        percentiles_ttft_ms=[
-            (p, np.percentile(ttfts or 0, p) * 1000) for p in selected_percentiles
-        ],
-        mean_tpot_ms=np.mean(tpots or 0) * 1000,
-        std_tpot_ms=np.std(tpots or 0) * 1000,
-        median_tpot_ms=np.median(tpots or 0) * 1000,
-        percentiles_tpot_ms=[
-            (p, np.percentile(tpots or 0, p) * 1000) for p in selected_percentiles
-        ],
-        mean_itl_ms=np.mean(itls or 0) * 1000,
-        std_itl_ms=np.std(itls or 0) * 1000,
-        median_itl_ms=np.median(itls or 0) * 1000,
-        percentiles_itl_ms=[
-            (p, np.percentile(itls or 0, p) * 1000) for p in selected_percentiles
-        ],
-        mean_e2el_ms=np.mean(e2els or 0) * 1000,
-        std_e2el_ms=np.std(e2els or 0) * 1000,
-        median_e2el_ms=np.median(e2els or 0) * 1000,
-        percentiles_e2el_ms=[
-            (p, np.percentile(e2els or 0, p) * 1000) for p in selected_percentiles
-        ],
-    )
+async def run_conversations(
+    request_func: Callable[..., Awaitable[RequestFuncOutput]],
+    request_inputs: RequestFuncInputs,
+    num_turns: int,
+    arrival_times: np.ndarray,
+    max_concurrency: int | None,
+    session: aiohttp.ClientSession | None,
+    think_time: float = 0.0,
+    pbar: tqdm | None = None,
+    on_complete: Callable[[RequestFuncOutput], None] | None = None,
+    client_metrics: ClientMetrics | None = None,
+    load_monitor: ClientLoadMonitor | None = None,
+) -> list[RequestFuncOutput]:
+    """Run multi-turn conversations of ``num_turns`` requests each.
+
+    Conversation ``c`` is made of requests ``c * num_turns`` to
+    ``(c + 1) * num_turns - 1`` and starts at ``arrival_times[c]``. Each of
+    its turns is sent with the conversation so far as history, once the
+    reply to the previous turn arrived and an exponentially distributed think
+    time with mean ``think_time`` seconds passed. ``max_concurrency`` limits
+    the conversations in progress, i.e. the simulated users, rather than the
+    requests in flight. A conversation ends at its first failed turn.
+
+    The ``prompt_len`` of a turn is its context: the prompts and replies of
+    the earlier turns and its own prompt, without the chat template. Returns
+    the outputs in the order they were sent, with their ``turn`` filled in;
+    see :func:`run_requests` for the rest.
+    """
+    start_time = time.monotonic()
+    if load_monitor is not None:
+        load_monitor.start(start_time)
+    rng = np.random.default_rng()
+
+    async def conversation(conversation_idx, arrival_time, semaphore):
+        outputs = []
+        history: list[dict] = []
+        context_len = 0
+        # As in run_requests, the first turn is sent when the event loop gets
+        # to it, before it waits for a free --max-concurrency slot.
+        due_time = arrival_time
+        send_time = time.monotonic() - start_time
+        async with semaphore:
+            if load_monitor is not None:
+                load_monitor.backlog -= 1
+            for turn in range(num_turns):
+                if turn > 0:
+                    think = rng.exponential(think_time) if think_time > 0 else 0.0
+                    due_time = time.monotonic() - start_time + think
+                    await asyncio.sleep(think)
+                    send_time = time.monotonic() - start_time
+                request_idx = conversation_idx * num_turns + turn
+                request_func_input = request_inputs[request_idx]
+                context_len += request_func_input.prompt_len
+                structure = structure_type(request_func_input)
+                if client_metrics is not None:
+                    client_metrics.request_sent(structure)
+                request_start_time = time.monotonic() - start_time
+                # The reply is needed for the history of the next turn.
+                output = await request_func(
+                    request_func_input=dataclasses.replace(
+                        request_func_input,
+                        prompt_len=context_len,
+                        history=history,
+                        keep_generated_text=True,
+                    ),
+                    pbar=pbar,
+                    session=session,
+                )
+                if client_metrics is not None:
+                    client_metrics.request_completed(output, structure)
+                output.request_idx = request_inputs.indices[request_idx]
+                output.send_time = send_time
+                output.scheduling_lag = send_time - due_time
+                output.start_time = request_start_time
+                output.turn = turn
+                if output.success:
+                    history = [
+                        *history,
+                        {"role": "user", "content": request_func_input.prompt},
+                        {"role": "assistant", "content": output.generated_text},
+                    ]
+                    context_len += output.output_tokens or len(output.itl) + 1
+                if not request_func_input.keep_generated_text:
+                    output.generated_text = None
+                if on_complete is not None:
+                    on_complete(output)
+                outputs.append(output)
+                if not output.success:
+                    if pbar is not None:
+                        pbar.update(num_turns - turn - 1)
+                    break
+        return outputs
 
-    return metrics, actual_output_lens
+    try:
+        semaphore = (
+            asyncio.Semaphore(max_concurrency) if max_concurrency else nullcontext()
+        )
+        tasks: list[asyncio.Task] = []
+        num_conversations = len(request_inputs) // num_turns
+        async for i in get_request(arrival_times, start_time):
+            if load_monitor is not None:
+                load_monitor.backlog += 1
+            tasks.append(
+                asyncio.create_task(
+                    conversation(
+                        i % num_conversations, float(arrival_times[i]), semaphore
+                    )
+                )
+            )
+        conversations = await asyncio.gather(*tasks)
+        outputs = [output for outputs in conversations for output in outputs]
+        outputs.sort(key=lambda output: output.send_time)
+        return outputs
+    finally:
+        if load_monitor is not None:
+            await load_monitor.stop()
 
 
-async def benchmark(
+def _client_proc_main(
+    proc_idx: int,
     backend: str,
-    api_url: str,
-    base_url: str,
-    model_id: str,
-    tokenizer: PreTrainedTokenizerBase,
-    input_requests: list[SampleRequest],
-    request_rate: float,
-    burstiness: float,
-    disable_tqdm: bool,
-    profile: bool,
-    selected_percentile_metrics: list[str],
-    selected_percentiles: list[str],
-    ignore_eos: bool,
+    request_inputs: list[RequestFuncInput],
+    arrival_times: np.ndarray | None,
     max_concurrency: int | None,
-    structured_output_ratio: float,
-    goodput_config_dict: dict[str, float] | None = None,
-):
-    if backend in ASYNC_REQUEST_FUNCS:
-        request_func = ASYNC_REQUEST_FUNCS[backend]
-    else:
-        raise ValueError(f"Unknown backend: {backend}")
-
-    def prepare_extra_body(request) -> dict:
-        extra_body = {}
-        # Add the schema to the extra_body
-        extra_body["structured_outputs"] = {}
-        extra_body["structured_outputs"][request.structure_type] = request.schema
-        return extra_body
+    connection_pool: bool,
+    duration: float | None,
+    window: tuple[float, float] | None,
+    record_prefix: str | None,
+    prometheus: tuple[int, str, str] | None,
+    barrier: multiprocessing.synchronize.Barrier,
+    result_queue: multiprocessing.Queue,
+) -> None:
+    """Entry point of one ``--num-client-procs`` worker process.
+
+    The worker runs its shard of the requests on its own event loop and
+    session, records the outputs with an :class:`OutputRecorder` (writing
+    them to ``record_prefix`` files if given) and its load with a
+    :class:`ClientLoadMonitor`, and puts
+    ``(proc_idx, start, end, outputs, itl_histogram, load_monitor)`` on
+    ``result_queue``. If it fails, it puts ``(proc_idx, error)`` instead and
+    aborts ``barrier``, so that neither the parent nor the other workers wait
+    for it.
+    With ``prometheus`` (the port, run id and dataset of a
+    :class:`ClientMetrics`), the worker serves its own client metrics.
+    """
+    try:
+        result = _run_client_proc(
+            backend,
+            request_inputs,
+            arrival_times,
+            max_concurrency,
+            connection_pool,
+            duration,
+            window,
+            record_prefix,
+            prometheus,
+            barrier,
+        )
+    except threading.BrokenBarrierError:
+        # Another worker failed before the start and reports its error.
+        return
+    except BaseException:
+        result_queue.put(
+            (
+                proc_idx,
+                RuntimeError(
+                    f"Client process {proc_idx} failed:\n{traceback.format_exc()}"
+                ),
+            )
+        )
+        barrier.abort()
+        raise
+    result_queue.put((proc_idx, *result))
 
-    print("Starting initial single prompt test run...")
-    structured_output_req_idx = random.sample(
-        range(len(input_requests)), int(len(input_requests) * structured_output_ratio)
-    )
 
-    test_request = input_requests[0]
-    test_req_extra_body = (
-        prepare_extra_body(test_request) if 0 in structured_output_req_idx else None
-    )
-    test_input = RequestFuncInput(
-        model=model_id,
-        prompt=test_request.prompt,
-        api_url=api_url,
-        prompt_len=test_request.prompt_len,
-        output_len=test_request.expected_output_len,
-        ignore_eos=ignore_eos,
-        extra_body=test_req_extra_body,
+def _run_client_proc(
+    backend: str,
+    request_inputs: list[RequestFuncInput],
+    arrival_times: np.ndarray | None,
+    max_concurrency: int | None,
+    connection_pool: bool,
+    duration: float | None,
+    window: tuple[float, float] | None,
+    record_prefix: str | None,
+    prometheus: tuple[int, str, str] | None,
+    barrier: multiprocessing.synchronize.Barrier,
+) -> tuple[float, float, list[RequestFuncOutput], LatencyHistogram, ClientLoadMonitor]:
+    recorder = OutputRecorder(
+        window,
+        RequestRecordWriter(record_prefix, request_inputs.template.capture_timeline)
+        if record_prefix
+        else None,
     )
-    test_output = await request_func(request_func_input=test_input)
-    if not test_output.success:
-        raise ValueError(
-            "Initial test run failed - Please make sure benchmark arguments "
-            f"are correctly specified. Error: {test_output.error}"
+    load_monitor = ClientLoadMonitor()
+    client_metrics = None
+    if prometheus is not None:
+        client_metrics = ClientMetrics(*prometheus)
+        client_metrics.scheduled_request_rate.set(
+            scheduled_request_rate(arrival_times)
+            if arrival_times is not None
+            else float("nan")
         )
-    else:
-        print("Initial test run completed. Starting main benchmark run...")
 
-    if profile:
-        print("Starting profiler...")
-        profile_input = RequestFuncInput(
-            model=model_id,
-            prompt=test_request.prompt,
-            api_url=base_url + "/start_profile",
-            prompt_len=test_request.prompt_len,
-            output_len=test_request.expected_output_len,
-            ignore_eos=ignore_eos,
-            extra_body=test_req_extra_body,
-        )
-        profile_output = await request_func(request_func_input=profile_input)
-        if profile_output.success:
-            print("Profiler started")
+    async def run_shard():
+        session = create_client_session(max_concurrency) if connection_pool else None
+        try:
+            # All workers start sending at the same time, once every one of
+            # them has imported its modules and set up its session.
+            await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+            # time.monotonic() is the system-wide CLOCK_MONOTONIC, so start
+            # and end times are comparable across the worker processes.
+            start = time.monotonic()
+            outputs = await run_requests(
+                ASYNC_REQUEST_FUNCS[backend],
+                request_inputs,
+                arrival_times,
+                max_concurrency,
+                session,
+                duration=duration,
+                on_complete=recorder,
+                client_metrics=client_metrics,
+                load_monitor=load_monitor,
+            )
+            return start, time.monotonic(), outputs
+        finally:
+            recorder.close()
+            if client_metrics is not None:
+                client_metrics.close()
+            if session is not None:
+                await session.close()
 
-    distribution = "Poisson process" if burstiness == 1.0 else "Gamma distribution"
+    return (*asyncio.run(run_shard()), recorder.itl_histogram, load_monitor)
 
-    print(f"Traffic request rate: {request_rate}")
-    print(f"Burstiness factor: {burstiness} ({distribution})")
-    print(f"Maximum request concurrency: {max_concurrency}")
 
-    pbar = None if disable_tqdm else tqdm(total=len(input_requests))
+def run_client_procs(
+    num_client_procs: int,
+    backend: str,
+    request_inputs: list[RequestFuncInput],
+    arrival_times: np.ndarray | None,
+    max_concurrency: int | None,
+    connection_pool: bool,
+    duration: float | None = None,
+    window: tuple[float, float] | None = None,
+    record_prefix: str | None = None,
+    client_metrics: ClientMetrics | None = None,
+) -> tuple[list[RequestFuncOutput], float, LatencyHistogram, ClientLoadMonitor]:
+    """Shard ``request_inputs`` across worker processes and merge the outputs.
+
+    Requests are dealt round-robin to the workers together with their slice
+    of the arrival schedule, and each worker gets an equal share of the
+    maximum concurrency, so the combined load matches a single-process run.
+    See :func:`run_requests` for ``arrival_times`` and ``duration``, and
+    :class:`OutputRecorder` for ``window``. With ``record_prefix``, worker
+    ``i`` writes its per-request records to ``{record_prefix}.proc{i}``
+    files. With ``client_metrics``, worker ``i`` serves its client metrics on
+    ``client_metrics.worker_port(i)``.
+
+    Returns the outputs in the order they were sent, the benchmark duration
+    in seconds, and the merged ITL histogram and load samples of the workers.
+    Raises the error of the first worker that fails, after stopping the
+    others.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(num_client_procs)
+    result_queue = ctx.Queue()
+    procs = []
+    for proc_idx in range(num_client_procs):
+        proc = ctx.Process(
+            target=_client_proc_main,
+            args=(
+                proc_idx,
+                backend,
+                request_inputs[proc_idx::num_client_procs],
+                (
+                    arrival_times[proc_idx::num_client_procs]
+                    if arrival_times is not None
+                    else None
+                ),
+                concurrency_share(max_concurrency, num_client_procs, proc_idx),
+                connection_pool,
+                duration,
+                window,
+                f"{record_prefix}.proc{proc_idx}" if record_prefix else None,
+                (
+                    (
+                        client_metrics.worker_port(proc_idx),
+                        client_metrics.run_id,
+                        client_metrics.dataset,
+                    )
+                    if client_metrics is not None
+                    else None
+                ),
+                barrier,
+                result_queue,
+            ),
+            daemon=True,
+        )
+        proc.start()
+        procs.append(proc)
 
-    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else nullcontext()
+    # Drain the queue before joining, a worker cannot exit while its
+    # (possibly large) result is still buffered in the pipe.
+    results = []
+    try:
+        while len(results) < num_client_procs:
+            try:
+                result = result_queue.get(timeout=CLIENT_PROC_POLL_INTERVAL)
+            except queue.Empty:
+                # A worker that was killed, e.g. by the OOM killer, reports
+                # nothing.
+                reported = {result[0] for result in results}
+                for proc_idx, proc in enumerate(procs):
+                    if proc.exitcode not in (None, 0) and proc_idx not in reported:
+                        raise RuntimeError(
+                            f"Client process {proc_idx} exited with code "
+                            f"{proc.exitcode}."
+                        ) from None
+                continue
+            if isinstance(result[1], BaseException):
+                raise result[1]
+            results.append(result)
+    finally:
+        if len(results) < num_client_procs:
+            for proc in procs:
+                proc.terminate()
+        for proc in procs:
+            proc.join()
+    # The workers pass the barrier together, so their records differ by no
+    # more than the barrier wake-up skew.
+    return merge_client_results([result[1:] for result in results])
+
+
+def concurrency_share(
+    max_concurrency: int | None, num_clients: int, client_idx: int
+) -> int | None:
+    """The share of ``max_concurrency`` of one of ``num_clients`` clients.
+    Every client needs a share of at least one, a share of 0 would be read as
+    unbounded."""
+    if max_concurrency is None:
+        return None
+    if max_concurrency < num_clients:
+        raise ValueError(
+            f"A maximum concurrency of {max_concurrency} cannot be shared by "
+            f"{num_clients} clients, every client needs at least one request "
+            "in flight."
+        )
+    return max_concurrency // num_clients + (client_idx < max_concurrency % num_clients)
 
-    async def limited_request_func(request_func_input, pbar):
-        async with semaphore:
-            return await request_func(request_func_input=request_func_input, pbar=pbar)
 
-    benchmark_start_time = time.perf_counter()
-    tasks: list[asyncio.Task] = []
-    expected: list[str] = []
-    async for i, request in get_request(input_requests, request_rate, burstiness):
-        extra_body = (
-            prepare_extra_body(request) if i in structured_output_req_idx else None
+def merge_client_results(
+    results: list[
+        tuple[
+            float, float, list[RequestFuncOutput], LatencyHistogram, ClientLoadMonitor
+        ]
+    ],
+) -> tuple[list[RequestFuncOutput], float, LatencyHistogram, ClientLoadMonitor]:
+    """Merge the ``(start, end, outputs, itl_histogram, load_monitor)`` of
+    several clients whose start and end times are on the same clock.
+
+    Returns the outputs in the order they were sent, with send times relative
+    to the earliest start, the benchmark duration in seconds, and the merged
+    ITL histogram and load samples.
+    """
+    first_start = min(start for start, *_ in results)
+    outputs: list[RequestFuncOutput] = []
+    itl_histogram = LatencyHistogram()
+    load_monitor = ClientLoadMonitor()
+    for start, _, client_outputs, client_itl_histogram, client_load_monitor in results:
+        for output in client_outputs:
+            output.send_time += start - first_start
+            output.start_time += start - first_start
+        outputs += client_outputs
+        itl_histogram.merge(client_itl_histogram)
+        load_monitor.merge(client_load_monitor, start - first_start)
+    outputs.sort(key=lambda output: output.send_time)
+    duration = max(end for _, end, *_ in results) - first_start
+    return outputs, duration, itl_histogram, load_monitor
+
+
+def mpi_clock_offset(comm, rounds: int = MPI_CLOCK_SYNC_ROUNDS) -> float:
+    """Estimate the offset to add to this rank's ``time.time()`` to get rank
+    0's, from the round trip with the lowest latency (as in NTP)."""
+    offset, best_round_trip = 0.0, math.inf
+    for peer in range(1, comm.Get_size()):
+        for _ in range(rounds):
+            if comm.Get_rank() == 0:
+                comm.recv(source=peer)
+                comm.send(time.time(), dest=peer)
+            elif comm.Get_rank() == peer:
+                sent = time.time()
+                comm.send(None, dest=0)
+                root_time = comm.recv(source=0)
+                received = time.time()
+                if received - sent < best_round_trip:
+                    best_round_trip = received - sent
+                    offset = root_time - (sent + received) / 2
+    return offset
+
+
+async def run_mpi_rank(
+    comm,
+    request_func: Callable[..., Awaitable[RequestFuncOutput]],
+    request_inputs: RequestFuncInputs,
+    arrival_times: np.ndarray | None,
+    max_concurrency: int | None,
+    session: aiohttp.ClientSession | None,
+    duration: float | None = None,
+    window: tuple[float, float] | None = None,
+    record_prefix: str | None = None,
+    client_metrics: ClientMetrics | None = None,
+    tokenizer: "PreTrainedTokenizerBase | None" = None,
+    goodput_config_dict: dict[str, float] | None = None,
+    token_count_strategy: str = "usage",
+    gather_outputs: bool = False,
+) -> tuple[
+    list[RequestFuncOutput],
+    tuple[list[RequestFuncOutput], "PartialMetrics", float, ClientLoadMonitor] | None,
+]:
+    """Run this MPI rank's share of the requests, the ``--mpi`` counterpart of
+    :func:`run_client_procs`.
+
+    Requests, arrival times and concurrency are dealt round-robin to the
+    ranks. After a barrier, all ranks start sending at the same moment of
+    rank 0's clock, correcting for the clock offsets between the nodes.
+    With ``record_prefix``, rank ``r`` writes its per-request records to
+    ``{record_prefix}.rank{r}`` files.
+
+    Every rank computes the partial metrics of its requests sent inside
+    ``window`` (see :func:`accumulate_metrics`) and returns its own outputs,
+    e.g. to evaluate their correctness, with send times relative to the
+    earliest start of all ranks. Rank 0 also returns the merged results of
+    all ranks: their outputs without the generated text with
+    ``gather_outputs`` (otherwise none), their merged partial metrics, the
+    benchmark duration in seconds and the merged load samples. The other
+    ranks return None for those.
+    """
+    from mpi4py import MPI
+
+    rank, size = comm.Get_rank(), comm.Get_size()
+    recorder = OutputRecorder(
+        window,
+        RequestRecordWriter(
+            f"{record_prefix}.rank{rank}", request_inputs.template.capture_timeline
         )
-        request_func_input = RequestFuncInput(
-            model=model_id,
-            prompt=request.prompt,
+        if record_prefix
+        else None,
+    )
+    load_monitor = ClientLoadMonitor()
+    clock_offset = mpi_clock_offset(comm)
+    start_at = comm.bcast(time.time() + MPI_START_DELAY if rank == 0 else None)
+    comm.Barrier()
+    delay = start_at - (time.time() + clock_offset)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    start = time.time() + clock_offset
+    try:
+        outputs = await run_requests(
+            request_func,
+            request_inputs[rank::size],
+            arrival_times[rank::size] if arrival_times is not None else None,
+            concurrency_share(max_concurrency, size, rank),
+            session,
+            duration=duration,
+            on_complete=recorder,
+            client_metrics=client_metrics,
+            load_monitor=load_monitor,
+        )
+    finally:
+        recorder.close()
+    end = time.time() + clock_offset
+    first_start = comm.allreduce(start, op=MPI.MIN)
+    for output in outputs:
+        output.send_time += start - first_start
+        output.start_time += start - first_start
+    measured = (
+        outputs
+        if window is None
+        else [o for o in outputs if window[0] <= o.send_time < window[1]]
+    )
+    partial, _ = accumulate_metrics(
+        measured,
+        tokenizer,
+        goodput_config_dict,
+        token_count_strategy,
+        recorder.itl_histogram,
+    )
+    shifted_load_monitor = ClientLoadMonitor()
+    shifted_load_monitor.merge(load_monitor, start - first_start)
+
+    # Only the counters and histograms are sent to rank 0, not the outputs.
+    partial = comm.reduce(partial, op=_merged, root=0)
+    load_monitor = comm.reduce(shifted_load_monitor, op=_merged, root=0)
+    end = comm.reduce(end, op=MPI.MAX, root=0)
+    all_outputs = (
+        comm.gather(
+            [dataclasses.replace(output, generated_text=None) for output in outputs],
+            root=0,
+        )
+        if gather_outputs
+        else None
+    )
+    if rank != 0:
+        return outputs, None
+    merged_outputs = []
+    if all_outputs is not None:
+        merged_outputs = list(itertools.chain.from_iterable(all_outputs))
+        merged_outputs.sort(key=lambda output: output.send_time)
+    return outputs, (merged_outputs, partial, end - first_start, load_monitor)
+
+
+def _merged(first, second):
+    """Merge ``second`` into ``first`` and return it, as an MPI reduce op."""
+    first.merge(second)
+    return first
+
+
+TOKEN_COUNT_STRATEGIES = ["usage", "batch-tokenize", "tokenize"]
+
+
+def count_output_tokens(
+    outputs: list[RequestFuncOutput],
+    tokenizer: "PreTrainedTokenizerBase",
+    strategy: str = "usage",
+) -> list[int]:
+    """Count the output tokens of every request, 0 for failed requests.
+
+    Strategies:
+        usage: Use the ``completion_tokens`` usage reported by the server and
+            re-tokenize (batched) only the outputs that have none.
+        batch-tokenize: Re-tokenize all outputs with batched tokenizer calls,
+            which fast tokenizers parallelise internally.
+        tokenize: Re-tokenize the outputs one at a time.
+
+    Outputs whose text was not kept always use the server-reported usage,
+    or the number of streamed chunks when the server reported none.
+    """
+    if strategy not in TOKEN_COUNT_STRATEGIES:
+        raise ValueError(f"Unknown token count strategy: {strategy}")
+
+    output_lens = [0] * len(outputs)
+    to_tokenize: list[int] = []
+    for i, output in enumerate(outputs):
+        if not output.success:
+            continue
+        if output.generated_text is None:
+            output_lens[i] = output.output_tokens or len(output.itl) + 1
+        elif strategy == "usage" and output.output_tokens:
+            output_lens[i] = output.output_tokens
+        else:
+            to_tokenize.append(i)
+
+    if strategy == "tokenize":
+        for i in to_tokenize:
+            output_lens[i] = len(
+                tokenizer(outputs[i].generated_text, add_special_tokens=False).input_ids
+            )
+        return output_lens
+
+    for start in range(0, len(to_tokenize), TOKENIZE_BATCH_SIZE):
+        batch = to_tokenize[start : start + TOKENIZE_BATCH_SIZE]
+        input_ids = tokenizer(
+            [outputs[i].generated_text for i in batch], add_special_tokens=False
+        ).input_ids
+        for i, ids in zip(batch, input_ids):
+            output_lens[i] = len(ids)
+    return output_lens
+
+
+def prefix_cache_ttft(
+    outputs: list[RequestFuncOutput],
+    input_requests: Sequence[SampleRequest],
+    window: tuple[float, float] | None = None,
+) -> dict[str, LatencyHistogram]:
+    """Split the TTFT of the successful requests sent inside ``window`` by
+    whether their shared prefix could have been cached.
+
+    A request is "warm" if an earlier request with the same prefix had
+    received its first token, i.e. the prefix had been prefilled, before the
+    request was sent, and "cold" otherwise. ``outputs`` must be in the order
+    they were sent, and include the requests sent before ``window`` so that
+    the warm-up warms the cache. Evictions are not tracked.
+    """
+    ttfts = {"cold": LatencyHistogram(), "warm": LatencyHistogram()}
+    # Earliest time a request with the prefix received its first token.
+    prefilled: dict[int, float] = {}
+    for output in outputs:
+        prefix_id = input_requests[output.request_idx].prefix_id
+        warm = prefilled.get(prefix_id, math.inf) <= output.send_time
+        if output.success:
+            if window is None or window[0] <= output.send_time < window[1]:
+                ttfts["warm" if warm else "cold"].record(output.ttft)
+            prefilled[prefix_id] = min(
+                prefilled.get(prefix_id, math.inf), output.send_time + output.ttft
+            )
+    return ttfts
+
+
+def turn_stats(
+    outputs: list[RequestFuncOutput],
+    num_turns: int,
+    selected_percentiles: list[float],
+) -> list[dict]:
+    """TTFT and context length of the successful requests of every turn of a
+    multi-turn benchmark."""
+    stats = []
+    for turn in range(num_turns):
+        ttfts = LatencyHistogram()
+        context_lens = []
+        for output in outputs:
+            if output.turn == turn and output.success:
+                ttfts.record(output.ttft)
+                context_lens.append(output.prompt_len)
+        stats.append(
+            {
+                "turn": turn,
+                "count": ttfts.count,
+                "mean_ttft_ms": ttfts.mean * 1000,
+                **{
+                    f"p{str(int(p)) if int(p) == p else str(p)}_ttft_ms": (
+                        ttfts.percentile(p) * 1000
+                    )
+                    for p in selected_percentiles
+                },
+                "mean_context_len": float(np.mean(context_lens or 0)),
+                "max_context_len": int(np.max(context_lens or 0)),
+            }
+        )
+    return stats
+
+
+@dataclass
+class PartialMetrics:
+    """Counters and latency histograms of the requests of one client, which
+    are merged with those of the other clients (e.g. MPI ranks) before
+    :func:`finalize_metrics` turns them into :class:`BenchmarkMetrics`."""
+
+    sent: int = 0
+    completed: int = 0
+    timed_out: int = 0
+    good_completed: int = 0
+    total_input: int = 0
+    total_output: int = 0
+    first_send_time: float = math.inf
+    last_send_time: float = -math.inf
+    # Histograms in seconds, keyed by metric name, see LATENCY_METRICS.
+    latency_histograms: dict[str, LatencyHistogram] = dataclasses.field(
+        default_factory=lambda: {
+            metric: LatencyHistogram() for metric in LATENCY_METRICS
+        }
+    )
+    scheduling_lags: LatencyHistogram = dataclasses.field(
+        default_factory=LatencyHistogram
+    )
+
+    def merge(self, other: "PartialMetrics") -> None:
+        """Add the requests of ``other``, whose send times are on the same
+        clock."""
+        self.sent += other.sent
+        self.completed += other.completed
+        self.timed_out += other.timed_out
+        self.good_completed += other.good_completed
+        self.total_input += other.total_input
+        self.total_output += other.total_output
+        self.first_send_time = min(self.first_send_time, other.first_send_time)
+        self.last_send_time = max(self.last_send_time, other.last_send_time)
+        for metric, histogram in other.latency_histograms.items():
+            self.latency_histograms[metric].merge(histogram)
+        self.scheduling_lags.merge(other.scheduling_lags)
+
+
+def accumulate_metrics(
+    outputs: list[RequestFuncOutput],
+    tokenizer: "PreTrainedTokenizerBase",
+    goodput_config_dict: dict[str, float] | None = None,
+    token_count_strategy: str = "usage",
+    itl_histogram: LatencyHistogram | None = None,
+) -> tuple[PartialMetrics, list[int]]:
+    """Count and record the latencies of ``outputs``, and return them with
+    the output length of every request. ``itl_histogram`` holds the ITLs if
+    they were already recorded when the requests completed (see
+    :class:`OutputRecorder`)."""
+    # Multiple output tokens may be bundled into one streamed chunk, so the
+    # output length cannot be read off len(outputs[i].itl).
+    actual_output_lens = count_output_tokens(outputs, tokenizer, token_count_strategy)
+    partial = PartialMetrics(sent=len(outputs), total_output=sum(actual_output_lens))
+    histograms = partial.latency_histograms
+    if itl_histogram is not None:
+        histograms["itl"] = itl_histogram
+    slo_values = {
+        metric: slo / MILLISECONDS_TO_SECONDS_CONVERSION
+        for metric, slo in (goodput_config_dict or {}).items()
+    }
+    for i in range(len(outputs)):
+        if outputs[i].success:
+            output_len = actual_output_lens[i]
+            partial.total_input += outputs[i].prompt_len
+            tpot = 0
+            if output_len > 1:
+                latency_minus_ttft = outputs[i].latency - outputs[i].ttft
+                tpot = latency_minus_ttft / (output_len - 1)
+                histograms["tpot"].record(tpot)
+            outputs[i].tpot = tpot
+            histograms["itl"].record_many(outputs[i].itl)
+            histograms["ttft"].record(outputs[i].ttft)
+            histograms["e2el"].record(outputs[i].latency)
+            partial.completed += 1
+
+            if slo_values:
+                # Note: if output_len <= 1, we regard tpot as 0 for goodput
+                request_metrics = {
+                    "ttft": outputs[i].ttft,
+                    "tpot": tpot,
+                    "e2el": outputs[i].latency,
+                }
+                if all(
+                    slo >= request_metrics[metric] for metric, slo in slo_values.items()
+                ):
+                    partial.good_completed += 1
+        elif outputs[i].timed_out:
+            partial.timed_out += 1
+
+    # Failed requests count towards the offered load as well.
+    if outputs:
+        send_times = [output.send_time for output in outputs]
+        partial.first_send_time = min(send_times)
+        partial.last_send_time = max(send_times)
+        partial.scheduling_lags.record_many(
+            [output.scheduling_lag for output in outputs]
+        )
+    return partial, actual_output_lens
+
+
+def finalize_metrics(
+    partial: PartialMetrics,
+    dur_s: float,
+    selected_percentiles: list[float],
+) -> BenchmarkMetrics:
+    """The metrics of a run of ``dur_s`` seconds from its (merged) partial
+    metrics."""
+    if partial.completed == 0:
+        warnings.warn(
+            "All requests failed. This is likely due to a misconfiguration "
+            "on the benchmark arguments.",
+            stacklevel=2,
+        )
+    send_span = (
+        partial.last_send_time - partial.first_send_time if partial.sent else 0.0
+    )
+    offered_request_rate = (
+        (partial.sent - 1) / send_span if send_span > 0 else float("inf")
+    )
+    lags = partial.scheduling_lags
+
+    # The histograms stay empty (and report 0) for metrics that were not
+    # measured, e.g. TTFT if streaming is not supported by the backend.
+    histograms = partial.latency_histograms
+    ttft, tpot, itl, e2el = (histograms[metric] for metric in LATENCY_METRICS)
+    total_tokens = partial.total_input + partial.total_output
+    return BenchmarkMetrics(
+        completed=partial.completed,
+        timed_out=partial.timed_out,
+        failed=partial.sent - partial.completed - partial.timed_out,
+        total_input=partial.total_input,
+        total_output=partial.total_output,
+        request_throughput=partial.completed / dur_s,
+        request_goodput=partial.good_completed / dur_s,
+        output_throughput=partial.total_output / dur_s,
+        total_token_throughput=total_tokens / dur_s,
+        mean_ttft_ms=ttft.mean * 1000,
+        std_ttft_ms=ttft.std() * 1000,
+        median_ttft_ms=ttft.median() * 1000,
+        percentiles_ttft_ms=[
+            (p, ttft.percentile(p) * 1000) for p in selected_percentiles
+        ],
+        mean_tpot_ms=tpot.mean * 1000,
+        std_tpot_ms=tpot.std() * 1000,
+        median_tpot_ms=tpot.median() * 1000,
+        percentiles_tpot_ms=[
+            (p, tpot.percentile(p) * 1000) for p in selected_percentiles
+        ],
+        mean_itl_ms=itl.mean * 1000,
+        std_itl_ms=itl.std() * 1000,
+        median_itl_ms=itl.median() * 1000,
+        percentiles_itl_ms=[
+            (p, itl.percentile(p) * 1000) for p in selected_percentiles
+        ],
+        mean_e2el_ms=e2el.mean * 1000,
+        std_e2el_ms=e2el.std() * 1000,
+        median_e2el_ms=e2el.median() * 1000,
+        percentiles_e2el_ms=[
+            (p, e2el.percentile(p) * 1000) for p in selected_percentiles
+        ],
+        offered_request_rate=offered_request_rate,
+        mean_scheduling_lag_ms=lags.mean * 1000,
+        p99_scheduling_lag_ms=lags.percentile(99) * 1000,
+        max_scheduling_lag_ms=(lags.max if lags.count else 0.0) * 1000,
+        latency_histograms=histograms,
+    )
+
+
+def calculate_metrics(
+    input_requests: list[tuple[str, int, int]],
+    outputs: list[RequestFuncOutput],
+    dur_s: float,
+    tokenizer: "PreTrainedTokenizerBase",
+    selected_percentile_metrics: list[str],
+    selected_percentiles: list[float],
+    goodput_config_dict: dict[str, float] | None = None,
+    token_count_strategy: str = "usage",
+    itl_histogram: LatencyHistogram | None = None,
+) -> tuple[BenchmarkMetrics, list[int]]:
+    """``itl_histogram`` holds the ITLs if they were already recorded when
+    the requests completed (see :class:`OutputRecorder`)."""
+    partial, actual_output_lens = accumulate_metrics(
+        outputs, tokenizer, goodput_config_dict, token_count_strategy, itl_histogram
+    )
+    return finalize_metrics(partial, dur_s, selected_percentiles), actual_output_lens
+
+
+async def benchmark(
+    backend: str,
+    api_url: str,
+    base_url: str,
+    model_id: str,
+    tokenizer: "PreTrainedTokenizerBase",
+    input_requests: Sequence[SampleRequest],
+    request_rate: float,
+    burstiness: float,
+    disable_tqdm: bool,
+    profile: bool,
+    selected_percentile_metrics: list[str],
+    selected_percentiles: list[str],
+    ignore_eos: bool,
+    max_concurrency: int | None,
+    structured_output_ratio: float,
+    goodput_config_dict: dict[str, float] | None = None,
+    connection_pool: bool = True,
+    keep_generated_text: bool = True,
+    num_client_procs: int = 1,
+    token_count_strategy: str = "usage",
+    duration: float | None = None,
+    warmup: float = 0.0,
+    cooldown: float = 0.0,
+    arrival_times: np.ndarray | None = None,
+    record_prefix: str | None = None,
+    client_metrics: ClientMetrics | None = None,
+    loop_lag_threshold_ms: float = DEFAULT_LOOP_LAG_THRESHOLD_MS,
+    mpi_comm=None,
+    num_turns: int | None = None,
+    think_time: float = 0.0,
+    ttft_timeout: float | None = None,
+    request_timeout: float | None = None,
+    capture_timelines: bool = False,
+):
+    """Run the benchmark. ``arrival_times``, e.g. of a replayed trace,
+    replaces the schedule drawn from ``request_rate`` and ``burstiness``.
+    With ``record_prefix``, per-request records are written to
+    ``{record_prefix}.jsonl`` and a columnar file as requests complete.
+    ``client_metrics`` exports the progress of the run to Prometheus. The run
+    is flagged as client-bound if the P99 event loop lag of the client
+    exceeds ``loop_lag_threshold_ms`` or its CPU is saturated.
+
+    With ``mpi_comm``, every rank calls this function and runs its share of
+    the requests (see :func:`run_mpi_rank`). Rank 0 returns the results of
+    the whole run, the other ranks return None instead. Every rank returns
+    the correctness entries of its own requests.
+
+    With ``num_turns``, the requests are sent as multi-turn conversations (see
+    :func:`run_conversations`) that start at ``request_rate``, and
+    ``max_concurrency`` limits the conversations in progress.
+
+    Requests that miss their ``ttft_timeout`` or ``request_timeout``
+    deadline (seconds) are cancelled and counted as timed out. With
+    ``capture_timelines``, the per-token timeline of every request is written
+    next to its records (see :class:`request_records.TimelineWriter`)."""
+    if backend in ASYNC_REQUEST_FUNCS:
+        request_func = ASYNC_REQUEST_FUNCS[backend]
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    # One keep-alive session is shared by every request of the run, so the
+    # client does not add a TCP handshake to each request's TTFT. Without it,
+    # each request opens (and tears down) its own connection.
+    session = create_client_session(max_concurrency) if connection_pool else None
+
+    print("Starting initial single prompt test run...")
+    structured_output_req_idx = set(
+        random.sample(
+            range(len(input_requests)),
+            int(len(input_requests) * structured_output_ratio),
+        )
+    )
+    request_inputs = RequestFuncInputs(
+        input_requests,
+        RequestFuncInput(
+            model=model_id,
+            prompt="",
             api_url=api_url,
-            prompt_len=request.prompt_len,
-            output_len=request.expected_output_len,
+            prompt_len=0,
+            output_len=0,
             ignore_eos=ignore_eos,
-            extra_body=extra_body,
+            keep_generated_text=keep_generated_text,
+            ttft_timeout=ttft_timeout,
+            timeout=request_timeout,
+            capture_timeline=capture_timelines,
+        ),
+        structured_output_req_idx,
+    )
+
+    test_request = input_requests[0]
+    # The test request may be slow on a cold server and has no deadlines.
+    test_input = dataclasses.replace(
+        request_inputs[0], keep_generated_text=True, ttft_timeout=None, timeout=None
+    )
+    test_req_extra_body = test_input.extra_body
+    test_result = None
+    if mpi_comm is None or mpi_comm.Get_rank() == 0:
+        test_output = await request_func(request_func_input=test_input, session=session)
+        test_result = (test_output.success, test_output.error)
+    if mpi_comm is not None:
+        # Only rank 0 sends the test request, all ranks stop if it fails.
+        test_result = mpi_comm.bcast(test_result)
+    test_success, test_error = test_result
+    if not test_success:
+        if session is not None:
+            await session.close()
+        raise ValueError(
+            "Initial test run failed - Please make sure benchmark arguments "
+            f"are correctly specified. Error: {test_error}"
         )
-        expected.append(request.completion)
-        tasks.append(
-            asyncio.create_task(
-                limited_request_func(request_func_input=request_func_input, pbar=pbar)
-            )
+    else:
+        print("Initial test run completed. Starting main benchmark run...")
+
+    if profile:
+        print("Starting profiler...")
+        profile_input = RequestFuncInput(
+            model=model_id,
+            prompt=test_request.prompt,
+            api_url=base_url + "/start_profile",
+            prompt_len=test_request.prompt_len,
+            output_len=test_request.expected_output_len,
+            ignore_eos=ignore_eos,
+            extra_body=test_req_extra_body,
+        )
+        profile_output = await request_func(
+            request_func_input=profile_input, session=session
+        )
+        if profile_output.success:
+            print("Profiler started")
+
+    distribution = "Poisson process" if burstiness == 1.0 else "Gamma distribution"
+
+    print(f"Traffic request rate: {request_rate}")
+    print(f"Burstiness factor: {burstiness} ({distribution})")
+    print(f"Maximum request concurrency: {max_concurrency}")
+    print(f"Connection pooling: {'enabled' if connection_pool else 'disabled'}")
+
+    if num_client_procs > 1:
+        print(f"Client processes: {num_client_procs}")
+    if mpi_comm is not None:
+        print(f"MPI ranks: {mpi_comm.Get_size()}")
+
+    run_duration = None
+    if arrival_times is not None:
+        print(f"Replaying {len(arrival_times)} arrivals over {arrival_times[-1]:.2f}s")
+    elif num_turns is not None:
+        num_conversations = len(request_inputs) // num_turns
+        print(f"Conversations: {num_conversations} of {num_turns} turns")
+        print(f"Mean think time: {think_time}s")
+        arrival_times = get_arrival_times(num_conversations, request_rate, burstiness)
+    elif duration is None:
+        arrival_times = get_arrival_times(len(request_inputs), request_rate, burstiness)
+    else:
+        # Load is generated throughout the warm-up, measurement and cool-down
+        # windows, cycling through the requests. Without a request rate, the
+        # --max-concurrency clients send back to back (closed loop).
+        print(f"Duration: {duration}s (warm-up {warmup}s, cool-down {cooldown}s)")
+        run_duration = warmup + duration + cooldown
+        arrival_times = (
+            get_arrival_times_for_duration(run_duration, request_rate, burstiness)
+            if request_rate != float("inf")
+            else None
         )
-    outputs: list[RequestFuncOutput] = await asyncio.gather(*tasks)
 
-    if pbar is not None:
-        pbar.close()
+    if client_metrics is not None:
+        client_metrics.scheduled_request_rate.set(
+            scheduled_request_rate(arrival_times)
+            if arrival_times is not None
+            else float("nan")
+        )
 
-    benchmark_duration = time.perf_counter() - benchmark_start_time
+    # Only requests that start inside the measurement window count.
+    window = (warmup, warmup + duration) if duration is not None else None
 
-    metrics, actual_output_lens = calculate_metrics(
-        input_requests=input_requests,
-        outputs=outputs,
-        dur_s=benchmark_duration,
-        tokenizer=tokenizer,
-        selected_percentile_metrics=selected_percentile_metrics,
-        selected_percentiles=selected_percentiles,
-        goodput_config_dict=goodput_config_dict,
+    def measured(outputs: list[RequestFuncOutput]) -> list[RequestFuncOutput]:
+        if window is None:
+            return outputs
+        return [
+            output for output in outputs if window[0] <= output.send_time < window[1]
+        ]
+
+    def correctness_entries(outputs: list[RequestFuncOutput]) -> list[dict]:
+        # Requests sent without structured output have no structure type and
+        # are not evaluated.
+        entries = []
+        for output in outputs:
+            request = input_requests[output.request_idx]
+            structured = output.request_idx in structured_output_req_idx
+            entries.append(
+                {
+                    "generated": output.generated_text,
+                    "expected": request.completion,
+                    "structure_type": request.structure_type if structured else None,
+                    "schema": request.schema,
+                }
+            )
+        return entries
+
+    # Empty when the generated text was not kept for correctness evaluation.
+    ret = []
+    partial_metrics = None
+    if mpi_comm is not None:
+        rank_outputs, merged = await run_mpi_rank(
+            mpi_comm,
+            request_func,
+            request_inputs,
+            arrival_times,
+            max_concurrency,
+            session,
+            run_duration,
+            window,
+            record_prefix,
+            client_metrics,
+            tokenizer,
+            goodput_config_dict,
+            token_count_strategy,
+            # Only to split the TTFT by prefix, see prefix_cache_ttft.
+            gather_outputs=input_requests[0].prefix_id is not None,
+        )
+        # Every rank evaluates the correctness of its own outputs.
+        if keep_generated_text:
+            ret = correctness_entries(measured(rank_outputs))
+        if merged is None:
+            if session is not None:
+                await session.close()
+            return None, ret
+        outputs, partial_metrics, benchmark_duration, load_monitor = merged
+        record_files = (
+            [f"{record_prefix}.rank{i}" for i in range(mpi_comm.Get_size())]
+            if record_prefix
+            else []
+        )
+    elif num_client_procs > 1:
+        (
+            outputs,
+            benchmark_duration,
+            itl_histogram,
+            load_monitor,
+        ) = await asyncio.get_running_loop().run_in_executor(
+            None,
+            run_client_procs,
+            num_client_procs,
+            backend,
+            request_inputs,
+            arrival_times,
+            max_concurrency,
+            connection_pool,
+            run_duration,
+            window,
+            record_prefix,
+            client_metrics,
+        )
+        record_files = (
+            [f"{record_prefix}.proc{i}" for i in range(num_client_procs)]
+            if record_prefix
+            else []
+        )
+    else:
+        pbar = (
+            None
+            if disable_tqdm
+            else tqdm(
+                total=len(arrival_times) * (num_turns or 1)
+                if arrival_times is not None
+                else None
+            )
+        )
+        recorder = OutputRecorder(
+            window,
+            RequestRecordWriter(record_prefix, request_inputs.template.capture_timeline)
+            if record_prefix
+            else None,
+        )
+        load_monitor = ClientLoadMonitor()
+        benchmark_start_time = time.perf_counter()
+        try:
+            if num_turns is not None:
+                outputs = await run_conversations(
+                    request_func,
+                    request_inputs,
+                    num_turns,
+                    arrival_times,
+                    max_concurrency,
+                    session,
+                    think_time,
+                    pbar,
+                    on_complete=recorder,
+                    client_metrics=client_metrics,
+                    load_monitor=load_monitor,
+                )
+            else:
+                outputs = await run_requests(
+                    request_func,
+                    request_inputs,
+                    arrival_times,
+                    max_concurrency,
+                    session,
+                    pbar,
+                    duration=run_duration,
+                    on_complete=recorder,
+                    client_metrics=client_metrics,
+                    load_monitor=load_monitor,
+                )
+        finally:
+            recorder.close()
+        benchmark_duration = time.perf_counter() - benchmark_start_time
+        itl_histogram = recorder.itl_histogram
+        record_files = [record_prefix] if record_prefix else []
+
+        if pbar is not None:
+            pbar.close()
+
+    prefix_ttfts = (
+        prefix_cache_ttft(outputs, input_requests, window)
+        if input_requests[0].prefix_id is not None
+        else None
     )
+    if window is not None:
+        # Throughput is taken over the measurement window.
+        outputs = measured(outputs)
+        benchmark_duration = duration
+    if keep_generated_text and mpi_comm is None:
+        ret = correctness_entries(outputs)
+
+    if partial_metrics is None:
+        metrics, _ = calculate_metrics(
+            input_requests=input_requests,
+            outputs=outputs,
+            dur_s=benchmark_duration,
+            tokenizer=tokenizer,
+            selected_percentile_metrics=selected_percentile_metrics,
+            selected_percentiles=selected_percentiles,
+            goodput_config_dict=goodput_config_dict,
+            token_count_strategy=token_count_strategy,
+            itl_histogram=itl_histogram,
+        )
+    else:
+        # The MPI ranks measured their own requests, see run_mpi_rank.
+        metrics = finalize_metrics(
+            partial_metrics, benchmark_duration, selected_percentiles
+        )
+
+    # Compare against the rate of the sampled schedule rather than the
+    # configured one, which a short gamma-distributed schedule can miss.
+    scheduled_rate = (
+        scheduled_request_rate(arrival_times)
+        if arrival_times is not None
+        else float("inf")
+    )
+    # With multi-turn conversations, the schedule is of conversations.
+    if (
+        scheduled_rate != float("inf")
+        and num_turns is None
+        and metrics.offered_request_rate < SCHEDULE_TOLERANCE * scheduled_rate
+    ):
+        warnings.warn(
+            f"Requests were sent at {metrics.offered_request_rate:.2f} req/s "
+            f"instead of the scheduled {scheduled_rate:.2f} req/s (max "
+            f"scheduling lag {metrics.max_scheduling_lag_ms:.2f} ms). The "
+            "client cannot keep up with the request rate, consider "
+            "--num-client-procs.",
+            stacklevel=2,
+        )
+    client_load = load_monitor.summary(window)
+    client_bottleneck = bottleneck_reasons(client_load, loop_lag_threshold_ms)
+    if client_bottleneck:
+        warnings.warn(
+            "The benchmark client was the bottleneck: "
+            + "; ".join(client_bottleneck)
+            + ". The results measure the client rather than the server, "
+            "consider more client processes (--num-client-procs or MPI ranks).",
+            stacklevel=2,
+        )
 
     print("{s:{c}^{n}}".format(s=" Serving Benchmark Result ", n=50, c="="))
     print("{:<40} {:<10}".format("Successful requests:", metrics.completed))
+    if ttft_timeout is not None or request_timeout is not None:
+        print("{:<40} {:<10}".format("Timed-out requests:", metrics.timed_out))
+    print("{:<40} {:<10}".format("Failed requests:", metrics.failed))
     if max_concurrency is not None:
         print("{:<40} {:<10}".format("Maximum request concurrency:", max_concurrency))
     if request_rate != float("inf"):
         print("{:<40} {:<10.2f}".format("Request rate configured (RPS):", request_rate))
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Request rate offered (RPS):", metrics.offered_request_rate
+            )
+        )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Mean scheduling lag (ms):", metrics.mean_scheduling_lag_ms
+        )
+    )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "P99 scheduling lag (ms):", metrics.p99_scheduling_lag_ms
+        )
+    )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "P99 client event loop lag (ms):", client_load["p99_loop_lag_ms"]
+        )
+    )
+    print(
+        "{:<40} {:<10.2f}".format(
+            "Mean client CPU (%):", client_load["mean_cpu_percent"]
+        )
+    )
     print("{:<40} {:<10.2f}".format("Benchmark duration (s):", benchmark_duration))
     print("{:<40} {:<10}".format("Total input tokens:", metrics.total_input))
     print("{:<40} {:<10}".format("Total generated tokens:", metrics.total_output))
@@ -586,29 +2388,41 @@ async def benchmark(
     result = {
         "duration": benchmark_duration,
         "completed": metrics.completed,
+        "timed_out": metrics.timed_out,
+        "failed": metrics.failed,
+        "ttft_timeout": ttft_timeout,
+        "request_timeout": request_timeout,
         "total_input_tokens": metrics.total_input,
         "total_output_tokens": metrics.total_output,
         "request_throughput": metrics.request_throughput,
+        "request_goodput": metrics.request_goodput if goodput_config_dict else None,
         "output_throughput": metrics.output_throughput,
         "total_token_throughput": metrics.total_token_throughput,
-        "ttft_description": pd.Series([output.ttft for output in outputs])
-        .describe()
-        .to_dict(),
-        "tpot_description": pd.Series([output.tpot for output in outputs])
-        .describe()
-        .to_dict(),
-        "input_lens": [output.prompt_len for output in outputs],
-        "output_lens": actual_output_lens,
-        "ttfts": [output.ttft for output in outputs],
-        "itls": [output.itl for output in outputs],
-        "errors": [output.error for output in outputs],
+        "ttft_description": metrics.latency_histograms["ttft"].describe(),
+        "tpot_description": metrics.latency_histograms["tpot"].describe(),
+        # The per-request records are in these files, see request_records.
+        "request_records": [
+            {
+                "jsonl": f"{prefix}.jsonl",
+                "columnar": columnar_path(prefix),
+                **({"timeline": timeline_path(prefix)} if capture_timelines else {}),
+            }
+            for prefix in record_files
+        ],
+        "scheduled_request_rate": scheduled_rate,
+        "offered_request_rate": metrics.offered_request_rate,
+        "mean_scheduling_lag_ms": metrics.mean_scheduling_lag_ms,
+        "p99_scheduling_lag_ms": metrics.p99_scheduling_lag_ms,
+        "max_scheduling_lag_ms": metrics.max_scheduling_lag_ms,
+        # Load of the client (per client process) during the measurement.
+        "client_load": client_load,
+        "client_bottleneck": client_bottleneck,
+        "latency_histograms": {
+            metric: histogram.to_dict()
+            for metric, histogram in metrics.latency_histograms.items()
+        },
     }
 
-    ret = [
-        {"generated": output.generated_text, "expected": gt}
-        for output, gt in zip(outputs, expected)
-    ]
-
     def process_one_metric(
         # E.g., "ttft"
         metric_attribute_name: str,
@@ -653,6 +2467,50 @@ async def benchmark(
     process_one_metric("itl", "ITL", "Inter-token Latency")
     process_one_metric("e2el", "E2EL", "End-to-end Latency")
 
+    if prefix_ttfts is not None:
+        print("{s:{c}^{n}}".format(s="Prefix Cache TTFT", n=50, c="-"))
+        result["prefix_cache_ttft"] = {}
+        for state, histogram in prefix_ttfts.items():
+            stats = {
+                "count": histogram.count,
+                "mean_ttft_ms": histogram.mean * 1000,
+                **{
+                    f"p{str(int(p)) if int(p) == p else str(p)}_ttft_ms": (
+                        histogram.percentile(p) * 1000
+                    )
+                    for p in selected_percentiles
+                },
+            }
+            print(
+                "{:<40} {:<10}".format(
+                    f"{state.capitalize()}-prefix requests:", stats["count"]
+                )
+            )
+            for key, value in list(stats.items())[1:]:
+                name = key.split("_")[0].capitalize()
+                print(
+                    "{:<40} {:<10.2f}".format(
+                        f"{name} TTFT {state} prefix (ms):", value
+                    )
+                )
+            result["prefix_cache_ttft"][state] = stats
+
+    if num_turns is not None:
+        print("{s:{c}^{n}}".format(s="Multi-turn", n=50, c="-"))
+        result["turns"] = turn_stats(outputs, num_turns, selected_percentiles)
+        for stats in result["turns"]:
+            turn = stats["turn"] + 1
+            print(
+                "{:<40} {:<10.2f}".format(
+                    f"Turn {turn} mean TTFT (ms):", stats["mean_ttft_ms"]
+                )
+            )
+            print(
+                "{:<40} {:<10.2f}".format(
+                    f"Turn {turn} mean context (tokens):", stats["mean_context_len"]
+                )
+            )
+
     print("=" * 50)
 
     if profile:
@@ -665,58 +2523,41 @@ async def benchmark(
             output_len=test_request.expected_output_len,
             extra_body={test_request.structure_type: test_request.schema},
         )
-        profile_output = await request_func(request_func_input=profile_input)
+        profile_output = await request_func(
+            request_func_input=profile_input, session=session
+        )
         if profile_output.success:
             print("Profiler stopped")
 
-    return result, ret
-
-
-def evaluate(ret, args):
-    def _eval_correctness_json(expected, actual):
-        # extract json string from string using regex
-        import regex as re
-
-        actual = actual.replace("\n", "").replace(" ", "").strip()
-        try:
-            actual = re.search(r"\{.*\}", actual).group()
-            actual = json.loads(actual)
-        except Exception:
-            return False
-
-        return True
-
-    def _eval_correctness_choice(expected, actual):
-        return actual in args.choice
+    if session is not None:
+        await session.close()
 
-    def _eval_correctness_regex(expected, actual):
-        import regex as re
+    return result, ret
 
-        return re.match(args.regex, actual) is not None
 
-    def _eval_correctness(expected, actual):
-        if args.structure_type == "json":
-            return _eval_correctness_json(expected, actual)
-        elif args.structure_type == "regex":
-            return _eval_correctness_regex(expected, actual)
-        elif args.structure_type == "choice":
-            return _eval_correctness_choice(expected, actual)
-        else:
-            return None
+def evaluate(ret, num_procs=None, mpi_comm=None):
+    """Check the generated texts against the schemas of their requests, see
+    :mod:`correctness`. Sets the ``correctness`` of every entry of ``ret`` and
+    returns the overall pass rate in percent (None if nothing was evaluated)
+    and the pass rates per schema.
 
-    scores = []
-    for res in ret:
-        score = _eval_correctness(res["expected"], res["generated"])
+    With ``mpi_comm``, every rank evaluates its own entries and rank 0
+    returns the pass rates of all ranks, the other ranks ``(None, None)``.
+    """
+    scores, by_schema = evaluate_outputs(
+        [(res["structure_type"], res["schema"], res["generated"]) for res in ret],
+        num_procs,
+    )
+    for res, score in zip(ret, scores):
         res["correctness"] = score
-        scores.append(score)
+    if mpi_comm is not None:
+        by_schema = mpi_comm.reduce(by_schema, op=merge_pass_rates, root=0)
+        if by_schema is None:
+            return None, None
 
-    not_none_scores = [score for score in scores if score is not None]
-
-    return (
-        (sum(not_none_scores) / len(not_none_scores) * 100)
-        if len(not_none_scores) > 0
-        else None
-    )
+    total = sum(entry["count"] for entry in by_schema)
+    passed = sum(entry["passed"] for entry in by_schema)
+    return (passed / total * 100 if total > 0 else None), by_schema
 
 
 def parse_goodput(slo_pairs):
@@ -757,6 +2598,20 @@ def check_goodput_args(args):
 
 
 def main(args: argparse.Namespace):
+    # Closes the trace of --dataset trace however the run ends.
+    with ExitStack() as resources:
+        _main(args, resources)
+
+
+def _main(args: argparse.Namespace, resources: ExitStack):
+    mpi_comm = None
+    if args.mpi:
+        from mpi4py import MPI
+
+        mpi_comm = MPI.COMM_WORLD
+        if mpi_comm.Get_rank() != 0:
+            # Rank 0 reports for all ranks.
+            sys.stdout = open(os.devnull, "w")
     print(args)
     random.seed(args.seed)
     np.random.seed(args.seed)
@@ -789,72 +2644,697 @@ def main(args: argparse.Namespace):
 
     if args.no_structured_output:
         args.structured_output_ratio = 0
-    if args.save_results:
+    if args.dataset == "trace":
+        if args.trace_path is None:
+            raise ValueError("--dataset trace requires --trace-path.")
+        if args.trace_time_scale <= 0:
+            raise ValueError("--trace-time-scale must be positive.")
+        if args.duration is not None or args.sweep == "request-rate":
+            raise ValueError(
+                "A trace is replayed with its own arrival times, it cannot be "
+                "combined with --duration or --sweep request-rate."
+            )
+    elif args.num_prompts is None:
+        args.num_prompts = DEFAULT_NUM_PROMPTS
+    if args.dataset == "prefix" and (
+        args.prefix_len < 0
+        or args.suffix_len < 0
+        or args.prefix_len + args.suffix_len == 0
+        or args.num_prefixes < 1
+    ):
+        raise ValueError(
+            "--prefix-len and --suffix-len must be non-negative with a positive "
+            "sum, and --num-prefixes must be at least 1."
+        )
+    # A sweep always saves the results of every step.
+    if args.save_results or args.sweep is not None:
         result_file_name = f"{args.structured_output_ratio}so"
         result_file_name += f"_{backend}"
         result_file_name += f"_{args.request_rate}qps"
         result_file_name += f"_{args.model.split('/')[-1]}"
         result_file_name += f"_{args.dataset}"
-        result_file_name += f"_{args.num_prompts}"
+        result_file_name += f"_{args.num_prompts or 'all'}"
         result_file_name += f"_out{args.output_len}"
         result_file_name += ".txt"
+        if args.result_filename:
+            result_file_name = args.result_filename
+        if args.result_dir:
+            # The per-request records are written while the benchmark runs.
+            os.makedirs(args.result_dir, exist_ok=True)
+            result_file_name = os.path.join(args.result_dir, result_file_name)
     else:
         result_file_name = None
 
     input_requests = sample_requests(tokenizer, args)
+    if isinstance(input_requests, TraceDataset):
+        resources.enter_context(input_requests)
+    if args.preprocess_only:
+        print("Dataset preprocessed, exiting (--preprocess-only).")
+        return
 
     goodput_config_dict = check_goodput_args(args)
 
+    # The random and prefix datasets, and trace entries with only a
+    # prompt_len, are sent as token ids.
+    if (
+        args.dataset in ("random", "prefix")
+        or args.dataset == "trace"
+        and input_requests.token_id_prompts
+    ) and (
+        ASYNC_REQUEST_FUNCS.get(backend) is not async_request_openai_completions
+        or args.multi_turn is not None
+    ):
+        raise ValueError(
+            f"--dataset {args.dataset} sends prompts as token ids, which requires "
+            "a completions backend, e.g. --backend vllm, and cannot be combined "
+            "with --multi-turn."
+        )
+
+    if any(
+        timeout is not None and timeout <= 0
+        for timeout in (args.ttft_timeout, args.request_timeout)
+    ):
+        raise ValueError("--ttft-timeout and --request-timeout must be positive.")
+    if (
+        args.ttft_timeout is not None or args.request_timeout is not None
+    ) and ASYNC_REQUEST_FUNCS.get(backend) not in (
+        async_request_openai_completions,
+        async_request_openai_chat_completions,
+    ):
+        raise ValueError(
+            "--ttft-timeout and --request-timeout are supported by the "
+            "OpenAI-compatible backends only."
+        )
+    if args.capture_timelines:
+        if result_file_name is None:
+            raise ValueError(
+                "--capture-timelines writes next to the per-request records and "
+                "requires --save-results."
+            )
+        if ASYNC_REQUEST_FUNCS.get(backend) not in (
+            async_request_openai_completions,
+            async_request_openai_chat_completions,
+        ):
+            raise ValueError(
+                "--capture-timelines is supported by the OpenAI-compatible "
+                "backends only."
+            )
+    if args.multi_turn is not None:
+        if args.multi_turn < 1 or args.think_time < 0:
+            raise ValueError(
+                "--multi-turn must be at least 1 and --think-time non-negative."
+            )
+        if (
+            ASYNC_REQUEST_FUNCS.get(backend)
+            is not async_request_openai_chat_completions
+        ):
+            raise ValueError(
+                "--multi-turn sends the conversation history as chat messages "
+                "and requires --backend openai-chat."
+            )
+        if (
+            args.dataset == "trace"
+            or args.duration is not None
+            or args.num_client_procs > 1
+            or mpi_comm is not None
+        ):
+            raise ValueError(
+                "--multi-turn cannot be combined with --dataset trace, "
+                "--duration, --num-client-procs or --mpi."
+            )
+        if len(input_requests) < args.multi_turn:
+            raise ValueError("--multi-turn needs at least one conversation of prompts.")
+    if mpi_comm is not None and args.num_client_procs > 1:
+        raise ValueError(
+            "--mpi cannot be combined with --num-client-procs, launch more "
+            "ranks instead."
+        )
+    if args.sweep is not None:
+        for value in parse_sweep_values(args):
+            check_concurrency_args(
+                args, value if args.sweep == "max-concurrency" else None, mpi_comm
+            )
+    else:
+        check_concurrency_args(args, mpi_comm=mpi_comm)
+    if args.duration is not None:
+        if args.duration <= 0 or args.warmup < 0 or args.cooldown < 0:
+            raise ValueError(
+                "--duration must be positive and --warmup and --cooldown non-negative."
+            )
+        if (
+            args.request_rate == float("inf")
+            and args.max_concurrency is None
+            and args.sweep is None
+            and not args.self_benchmark
+        ):
+            raise ValueError("--duration requires --request-rate or --max-concurrency.")
+    elif args.warmup or args.cooldown:
+        raise ValueError("--warmup and --cooldown require --duration.")
+
+    benchmark_kwargs = dict(
+        backend=backend,
+        api_url=api_url,
+        base_url=base_url,
+        model_id=model_id,
+        tokenizer=tokenizer,
+        input_requests=input_requests,
+        burstiness=args.burstiness,
+        disable_tqdm=args.disable_tqdm,
+        # Only rank 0 of an --mpi run drives the profiler.
+        profile=args.profile and (mpi_comm is None or mpi_comm.Get_rank() == 0),
+        selected_percentile_metrics=args.percentile_metrics.split(","),
+        selected_percentiles=[float(p) for p in args.metric_percentiles.split(",")],
+        ignore_eos=args.ignore_eos,
+        structured_output_ratio=args.structured_output_ratio,
+        goodput_config_dict=goodput_config_dict,
+        connection_pool=not args.no_connection_pool,
+        keep_generated_text=not args.disable_correctness_eval,
+        num_client_procs=args.num_client_procs,
+        token_count_strategy=args.token_count_strategy,
+        duration=args.duration,
+        warmup=args.warmup,
+        cooldown=args.cooldown,
+        loop_lag_threshold_ms=args.loop_lag_threshold_ms,
+        mpi_comm=mpi_comm,
+        num_turns=args.multi_turn,
+        think_time=args.think_time,
+        ttft_timeout=args.ttft_timeout,
+        request_timeout=args.request_timeout,
+        capture_timelines=args.capture_timelines,
+        arrival_times=(
+            input_requests.arrival_times(args.trace_time_scale)
+            if args.dataset == "trace"
+            else None
+        ),
+    )
+    client_metrics = None
+    if args.prometheus_port is not None:
+        run_id = args.run_id or uuid.uuid4().hex[:8]
+        port = args.prometheus_port
+        if mpi_comm is not None:
+            # Ranks on the same node serve on consecutive ports.
+            run_id = mpi_comm.bcast(run_id)
+            port += mpi_comm.Split_type(MPI.COMM_TYPE_SHARED).Get_rank()
+        client_metrics = ClientMetrics(port, run_id, args.dataset)
+        benchmark_kwargs["client_metrics"] = client_metrics
+        print(
+            f"Serving client metrics (run_id={run_id}) on port "
+            f"{args.prometheus_port}"
+            + (
+                f", client processes on ports {client_metrics.worker_port(0)}-"
+                f"{client_metrics.worker_port(args.num_client_procs - 1)}"
+                if args.num_client_procs > 1
+                else ""
+            )
+            + (", MPI ranks on the following ports of their node" if mpi_comm else "")
+        )
+    try:
+        if args.self_benchmark:
+            run_self_benchmark(args, benchmark_kwargs, result_file_name)
+        elif args.sweep is not None:
+            run_sweep(args, benchmark_kwargs, goodput_config_dict, result_file_name)
+        else:
+            run_benchmark(args, benchmark_kwargs, result_file_name)
+    finally:
+        if client_metrics is not None:
+            client_metrics.close()
+
+
+def check_concurrency_args(args, max_concurrency: int | None = None, mpi_comm=None):
+    max_concurrency = max_concurrency or args.max_concurrency
+    if args.num_client_procs < 1:
+        raise ValueError("--num-client-procs must be at least 1.")
+    if max_concurrency is not None and max_concurrency < args.num_client_procs:
+        raise ValueError(
+            "--max-concurrency must be at least --num-client-procs, so that "
+            "every client process can have a request in flight."
+        )
+    if (
+        mpi_comm is not None
+        and max_concurrency is not None
+        and max_concurrency < mpi_comm.Get_size()
+    ):
+        raise ValueError(
+            "--max-concurrency must be at least the number of MPI ranks, so "
+            "that every rank can have a request in flight."
+        )
+
+
+def run_benchmark(
+    args: argparse.Namespace, benchmark_kwargs: dict, result_file_name: str | None
+) -> dict:
+    """Run one benchmark at ``args.request_rate`` and ``args.max_concurrency``,
+    evaluate it and save the results to ``result_file_name`` (if not None).
+
+    The saved file is a small summary; the per-request records are written
+    next to it, to ``<result_file_name without extension>.requests.*`` files,
+    while the benchmark runs. Returns the summary.
+    """
+    record_prefix = None
+    if result_file_name is not None:
+        record_prefix = f"{os.path.splitext(result_file_name)[0]}.requests"
     benchmark_result, ret = asyncio.run(
         benchmark(
-            backend=backend,
-            api_url=api_url,
-            base_url=base_url,
-            model_id=model_id,
-            tokenizer=tokenizer,
-            input_requests=input_requests,
             request_rate=args.request_rate,
-            burstiness=args.burstiness,
-            disable_tqdm=args.disable_tqdm,
-            profile=args.profile,
-            selected_percentile_metrics=args.percentile_metrics.split(","),
-            selected_percentiles=[float(p) for p in args.metric_percentiles.split(",")],
-            ignore_eos=args.ignore_eos,
             max_concurrency=args.max_concurrency,
-            structured_output_ratio=args.structured_output_ratio,
-            goodput_config_dict=goodput_config_dict,
+            record_prefix=record_prefix,
+            **benchmark_kwargs,
         )
     )
+    mpi_comm = benchmark_kwargs.get("mpi_comm")
+    if args.disable_correctness_eval:
+        score, score_by_schema = None, None
+    else:
+        score, score_by_schema = evaluate(ret, args.eval_procs, mpi_comm)
+    if benchmark_result is None:
+        # Another MPI rank than 0: get rank 0's results, so that all ranks
+        # take the same sweep steps.
+        return mpi_comm.bcast(None)
 
     # Save config and results to json
-    score = evaluate(ret, args)
-    print("correct_rate(%)", score, "\n")
-    if args.save_results:
-        results = {
-            "backend": backend,
-            "model_id": model_id,
-            "tokenizer_id": tokenizer_id,
-            "num_prompts": args.num_prompts,
-            "request_rate": args.request_rate
-            if args.request_rate < float("inf")
-            else "inf",
-            "burstiness": args.burstiness,
-            "max_concurrency": args.max_concurrency,
-            "correct_rate(%)": score,
-        }
-        results = {"outputs": ret, **results, **benchmark_result}
-
-        # Save to file
-        if args.result_filename:
-            result_file_name = args.result_filename
-        if args.result_dir:
-            result_file_name = os.path.join(args.result_dir, result_file_name)
+    if not args.disable_correctness_eval:
+        print("correct_rate(%)", score, "\n")
+        if len(score_by_schema) > 1:
+            print("{s:{c}^{n}}".format(s="Correct Rate by Schema", n=50, c="-"))
+            for entry in score_by_schema:
+                name = entry["title"] or entry["schema"]
+                print(
+                    "{:<40} {:<10.2f}".format(
+                        f"{entry['structure_type']} {name} ({entry['count']}):",
+                        entry["pass_rate"],
+                    )
+                )
+            print("=" * 50)
+    results = {
+        "backend": args.backend,
+        "model_id": args.model,
+        "tokenizer_id": args.tokenizer if args.tokenizer is not None else args.model,
+        "num_prompts": len(benchmark_kwargs["input_requests"]),
+        "request_rate": args.request_rate
+        if args.request_rate < float("inf")
+        else "inf",
+        "burstiness": args.burstiness,
+        "max_concurrency": args.max_concurrency,
+        "connection_pool": not args.no_connection_pool,
+        "num_client_procs": args.num_client_procs,
+        "mpi_ranks": mpi_comm.Get_size() if mpi_comm is not None else None,
+        "token_count_strategy": args.token_count_strategy,
+        # "duration" (from the benchmark result) is the measurement window.
+        "warmup": args.warmup,
+        "cooldown": args.cooldown,
+        "correct_rate(%)": score,
+        "correct_rate_by_schema": score_by_schema,
+        **benchmark_result,
+    }
+    if result_file_name is not None:
         with open(result_file_name, "w", encoding="utf-8") as outfile:
             json.dump(results, outfile, indent=4)
+    if mpi_comm is not None:
+        mpi_comm.bcast(results)
+    return results
+
+
+SWEEP_PARAMETERS = ["request-rate", "max-concurrency"]
+DEFAULT_SWEEP_VALUES = "1,2,4,8,16,32,64,128,256"
+# Request rates stepped through by --self-benchmark, and the fraction of the
+# requests beyond the mock server's error rate that may fail at a sustained
+# rate.
+SELF_BENCHMARK_RATES = "50,100,200,400,800,1600,3200,6400"
+SELF_BENCHMARK_FAILURE_TOLERANCE = 0.02
+
+
+def parse_sweep_values(
+    args: argparse.Namespace, default: str = DEFAULT_SWEEP_VALUES
+) -> list[float]:
+    sweep_values = args.sweep_values or default
+    try:
+        values = sorted({float(value) for value in sweep_values.split(",")})
+    except ValueError as err:
+        raise ValueError(
+            f"Invalid --sweep-values {sweep_values!r}, expected a "
+            "comma-separated list of numbers."
+        ) from err
+    if values[0] <= 0:
+        raise ValueError("--sweep-values must be positive.")
+    if args.sweep == "max-concurrency":
+        if any(value != int(value) for value in values):
+            raise ValueError("--sweep-values must be integers for max-concurrency.")
+        values = [int(value) for value in values]
+    return values
+
+
+def knee_point(steps: list[dict]) -> dict | None:
+    """The step with the highest power, i.e. request throughput divided by
+    mean end-to-end latency. Beyond it, added load buys less throughput than
+    it costs latency."""
+    steps = [step for step in steps if step["mean_e2el_ms"] > 0]
+    if not steps:
+        return None
+    return max(
+        steps, key=lambda step: step["request_throughput"] / step["mean_e2el_ms"]
+    )
+
+
+def search_load(
+    values: list[float],
+    run_step: Callable[[float], bool],
+    search_steps: int,
+    integer: bool = False,
+    stop_at_failure: bool = True,
+    minimum: int = 1,
+) -> None:
+    """Call ``run_step`` with ``values`` in increasing order, stopping at the
+    first one it fails (returns False for) if ``stop_at_failure``. The highest
+    value it passes is then narrowed down with ``search_steps`` rounds of
+    binary search between the highest passed and the failed value. An
+    ``integer`` search never probes values below ``minimum``."""
+    passed, failed = (minimum - 1 if integer else 0), None
+    for value in values:
+        if run_step(value):
+            passed = value
+        elif stop_at_failure:
+            failed = value
+            break
+    if failed is None:
+        return
+
+    for _ in range(search_steps):
+        if integer:
+            if failed - passed <= 1:
+                break
+            value = (passed + failed) // 2
+        else:
+            value = round((passed + failed) / 2, 3)
+        if run_step(value):
+            passed = value
+        else:
+            failed = value
+
+
+def run_sweep(
+    args: argparse.Namespace,
+    benchmark_kwargs: dict,
+    goodput_config_dict: dict[str, float],
+    result_file_name: str,
+) -> dict:
+    """Step --request-rate or --max-concurrency through --sweep-values to build
+    the throughput-versus-latency curve and report its knee point.
+
+    With --goodput, stepping stops at the first load that misses the SLOs,
+    i.e. at which less than --sweep-slo-attainment of the sent requests
+    complete and meet all of them. The highest load that meets the SLOs is then narrowed
+    down with --sweep-search-steps rounds of binary search.
+
+    Every step's results are saved next to ``result_file_name``, and the
+    sweep summary is rewritten after every step.
+    """
+    root, ext = os.path.splitext(result_file_name)
+    sweep_file_name = f"{root}_sweep_{args.sweep}.json"
+    steps: list[dict] = []
+    sweep = {
+        "sweep": args.sweep,
+        "goodput": goodput_config_dict,
+        "slo_attainment_target": args.sweep_slo_attainment,
+        "steps": steps,
+        "max_load_meeting_slo": None,
+        "knee_point": None,
+    }
+
+    def save_sweep():
+        mpi_comm = benchmark_kwargs.get("mpi_comm")
+        if mpi_comm is not None and mpi_comm.Get_rank() != 0:
+            return
+        with open(sweep_file_name, "w", encoding="utf-8") as outfile:
+            json.dump(sweep, outfile, indent=4)
+
+    def run_step(value) -> bool:
+        step_args = copy.copy(args)
+        if args.sweep == "request-rate":
+            step_args.request_rate = value
+        else:
+            step_args.max_concurrency = value
+        print(
+            "{s:{c}^{n}}".format(s=f" Sweep step: {args.sweep} {value} ", n=50, c="#")
+        )
+        step_file_name = f"{root}_{args.sweep}{value}{ext}"
+        results = run_benchmark(step_args, benchmark_kwargs, step_file_name)
+
+        # Requests that failed or timed out count against the SLOs, so that
+        # an overloaded step cannot meet them on its few completed requests.
+        sent = results["completed"] + results["failed"] + results["timed_out"]
+        slo_attainment = (
+            results["request_goodput"] * results["duration"] / sent
+            if goodput_config_dict and sent
+            else None
+        )
+        step = {
+            "value": value,
+            "result_file": step_file_name,
+            # Summary statistics only, the step's result file has the rest.
+            **{
+                key: result
+                for key, result in results.items()
+                if result is None or isinstance(result, (int, float, str))
+            },
+            "mean_e2el_ms": results["latency_histograms"]["e2el"]["mean"] * 1000,
+            "slo_attainment": slo_attainment,
+            # Steps where the client was the bottleneck understate the server.
+            "client_bottleneck": results["client_bottleneck"],
+        }
+        meets_slo = (
+            slo_attainment is not None and slo_attainment >= args.sweep_slo_attainment
+        )
+        step["meets_slo"] = meets_slo if goodput_config_dict else None
+        steps.append(step)
+        if meets_slo and (
+            sweep["max_load_meeting_slo"] is None
+            or value > sweep["max_load_meeting_slo"]
+        ):
+            sweep["max_load_meeting_slo"] = value
+        knee = knee_point(steps)
+        sweep["knee_point"] = knee["value"] if knee else None
+        save_sweep()
+        return meets_slo
+
+    mpi_comm = benchmark_kwargs.get("mpi_comm")
+    search_load(
+        parse_sweep_values(args),
+        run_step,
+        args.sweep_search_steps,
+        integer=args.sweep == "max-concurrency",
+        stop_at_failure=bool(goodput_config_dict),
+        # Every client process or MPI rank needs a request in flight.
+        minimum=max(
+            args.num_client_procs,
+            mpi_comm.Get_size() if mpi_comm is not None else 1,
+        ),
+    )
+    steps.sort(key=lambda step: step["value"])
+    save_sweep()
+
+    print("{s:{c}^{n}}".format(s=" Sweep Result ", n=50, c="="))
+    print(
+        "{:<16} {:<18} {:<16} {:<10}".format(
+            args.sweep, "Throughput (req/s)", "Mean E2EL (ms)", "SLO"
+        )
+    )
+    for step in steps:
+        slo = {True: "met", False: "missed", None: "-"}[step["meets_slo"]]
+        print(
+            "{:<16} {:<18.2f} {:<16.2f} {:<10}".format(
+                step["value"], step["request_throughput"], step["mean_e2el_ms"], slo
+            )
+        )
+    print("{:<40} {:<10}".format("Knee point:", str(sweep["knee_point"])))
+    if goodput_config_dict:
+        print(
+            "{:<40} {:<10}".format(
+                "Max load meeting SLOs:", str(sweep["max_load_meeting_slo"])
+            )
+        )
+    print(f"Sweep results saved to: {sweep_file_name}")
+    print("=" * 50)
+    return sweep
+
+
+def run_self_benchmark(
+    args: argparse.Namespace,
+    benchmark_kwargs: dict,
+    result_file_name: str | None,
+) -> dict:
+    """Find the highest request rate the benchmark client sustains against
+    the mock server: step --request-rate through --sweep-values until a rate
+    is not sustained, then narrow it down like :func:`run_sweep`.
+
+    A rate is sustained if the requests are sent on schedule, the client is
+    not the bottleneck (see ``client_monitor``) and no more requests fail than
+    the mock server's --mock-error-rate (plus a tolerance). The mock server
+    answers as configured at any load, so whatever limits the rate is the
+    client.
+    """
+    steps: list[dict] = []
+    root, ext = os.path.splitext(result_file_name or "")
+
+    def run_step(rate) -> bool:
+        step_args = copy.copy(args)
+        step_args.request_rate = rate
+        print("{s:{c}^{n}}".format(s=f" Self-benchmark rate {rate} ", n=50, c="#"))
+        results = run_benchmark(
+            step_args,
+            benchmark_kwargs,
+            f"{root}_rate{rate}{ext}" if result_file_name is not None else None,
+        )
+        reasons = list(results["client_bottleneck"])
+        if (
+            results["offered_request_rate"]
+            < SCHEDULE_TOLERANCE * results["scheduled_request_rate"]
+        ):
+            reasons.append(
+                f"requests sent at {results['offered_request_rate']:.2f} req/s "
+                f"of {results['scheduled_request_rate']:.2f} req/s scheduled"
+            )
+        unsuccessful = results["failed"] + results["timed_out"]
+        total = results["completed"] + unsuccessful
+        if (
+            total
+            and unsuccessful / total
+            > args.mock_error_rate + SELF_BENCHMARK_FAILURE_TOLERANCE
+        ):
+            reasons.append(f"{unsuccessful} of {total} requests failed")
+        steps.append(
+            {
+                "request_rate": rate,
+                "offered_request_rate": results["offered_request_rate"],
+                "request_throughput": results["request_throughput"],
+                "output_throughput": results["output_throughput"],
+                "mean_cpu_percent": results["client_load"]["mean_cpu_percent"],
+                "p99_loop_lag_ms": results["client_load"]["p99_loop_lag_ms"],
+                "failed": unsuccessful,
+                "sustained": not reasons,
+                "reasons": reasons,
+            }
+        )
+        return not reasons
+
+    search_load(
+        parse_sweep_values(args, SELF_BENCHMARK_RATES),
+        run_step,
+        args.sweep_search_steps,
+    )
+    steps.sort(key=lambda step: step["request_rate"])
+    sustained = [step for step in steps if step["sustained"]]
+    best = max(sustained, key=lambda step: step["request_rate"], default=None)
+    summary = {
+        "num_client_procs": args.num_client_procs,
+        "mock_server": {
+            "ttft": args.mock_ttft,
+            "itl": args.mock_itl,
+            "output_len": args.mock_output_len,
+            "error_rate": args.mock_error_rate,
+            "workers": args.mock_workers,
+        },
+        "steps": steps,
+        "max_sustained_request_rate": best["request_rate"] if best else None,
+        "output_throughput_at_max": best["output_throughput"] if best else None,
+        "max_sustained_output_throughput": max(
+            (step["output_throughput"] for step in sustained), default=None
+        ),
+    }
+
+    print("{s:{c}^{n}}".format(s=" Self-Benchmark Result ", n=50, c="="))
+    print(
+        "{:<12} {:<14} {:<14} {:<10} {:<10}".format(
+            "Rate (RPS)", "Offered (RPS)", "Output tok/s", "CPU (%)", "Sustained"
+        )
+    )
+    for step in steps:
+        print(
+            "{:<12} {:<14.2f} {:<14.2f} {:<10.0f} {:<10}".format(
+                step["request_rate"],
+                step["offered_request_rate"],
+                step["output_throughput"],
+                step["mean_cpu_percent"],
+                "yes" if step["sustained"] else "no",
+            )
+        )
+    for step in steps:
+        if not step["sustained"]:
+            print(f"Rate {step['request_rate']}: {'; '.join(step['reasons'])}")
+    if best is None:
+        print("No rate was sustained, try lower --sweep-values.")
+    else:
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Max sustained request rate (RPS):", best["request_rate"]
+            )
+        )
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Output token throughput (tok/s):", best["output_throughput"]
+            )
+        )
+        print(
+            "{:<40} {:<10.2f}".format(
+                "Max sustained output tok/s:",
+                summary["max_sustained_output_throughput"],
+            )
+        )
+    if result_file_name is not None:
+        summary_file_name = f"{root}_self_benchmark.json"
+        with open(summary_file_name, "w", encoding="utf-8") as outfile:
+            json.dump(summary, outfile, indent=4)
+        print(f"Self-benchmark results saved to: {summary_file_name}")
+    print("=" * 50)
+    return summary
+
+
+def self_benchmark(args: argparse.Namespace) -> None:
+    """Run :func:`main` with --self-benchmark against a mock server started
+    on this machine."""
+    if ASYNC_REQUEST_FUNCS.get(args.backend) not in (
+        async_request_openai_completions,
+        async_request_openai_chat_completions,
+    ):
+        raise ValueError(
+            "--self-benchmark drives an OpenAI-compatible mock server and "
+            "requires an OpenAI-compatible backend, e.g. --backend vllm."
+        )
+    if args.base_url is not None or args.sweep is not None or args.mpi:
+        raise ValueError(
+            "--self-benchmark starts its own server and steps the request "
+            "rate, it cannot be combined with --base-url, --sweep or --mpi."
+        )
+    if args.dataset == "trace":
+        raise ValueError(
+            "--self-benchmark steps the request rate, it cannot replay a trace."
+        )
+    if not 0 <= args.mock_error_rate < 1:
+        raise ValueError("--mock-error-rate must be at least 0 and less than 1.")
+    server_args = [
+        "--ttft",
+        args.mock_ttft,
+        "--itl",
+        args.mock_itl,
+        "--error-rate",
+        str(args.mock_error_rate),
+        "--workers",
+        str(args.mock_workers),
+        "--seed",
+        str(args.seed),
+    ]
+    if args.mock_output_len is not None:
+        server_args += ["--output-len", args.mock_output_len]
+    # The mock server's aiohttp.web import is only paid by self-benchmarks.
+    from mock_server import running_mock_server
+
+    with running_mock_server(server_args) as base_url:
+        print(f"Mock server running at {base_url}")
+        args.base_url = base_url
+        main(args)
 
 
 def create_argument_parser():
-    parser = FlexibleArgumentParser(
+    parser = argparse.ArgumentParser(
         description="Benchmark the online serving throughput."
     )
     parser.add_argument(
@@ -881,11 +3361,97 @@ def create_argument_parser():
     parser.add_argument(
         "--dataset",
         default="json",
-        choices=["json", "json-unique", "grammar", "regex", "choice", "xgrammar_bench"],
+        choices=[
+            "json",
+            "json-unique",
+            "grammar",
+            "regex",
+            "choice",
+            "xgrammar_bench",
+            "trace",
+            "prefix",
+            "random",
+        ],
+    )
+    parser.add_argument(
+        "--random-input-len",
+        type=str,
+        default="1024",
+        help="Prompt length distribution of --dataset random: a fixed length, "
+        "fixed:N, uniform:LOW:HIGH, normal:MEAN:STD, lognormal:MEDIAN:SIGMA "
+        "or hist:PATH (a file of `length,weight` lines). The prompts are "
+        "random token ids of exactly these lengths, which needs a "
+        "completions endpoint.",
+    )
+    parser.add_argument(
+        "--random-output-len",
+        type=str,
+        default=None,
+        help="Output length distribution of --dataset random, in the format "
+        "of --random-input-len. Defaults to --output-len.",
+    )
+    parser.add_argument(
+        "--prefix-len",
+        type=int,
+        default=1024,
+        help="Length in tokens of the shared prompt prefixes of --dataset "
+        "prefix. The prompts are sent as token ids, which needs a "
+        "completions endpoint.",
+    )
+    parser.add_argument(
+        "--num-prefixes",
+        type=int,
+        default=8,
+        help="Number of distinct shared prefixes of --dataset prefix.",
+    )
+    parser.add_argument(
+        "--suffix-len",
+        type=int,
+        default=64,
+        help="Length in tokens of the unique suffix after the shared prefix "
+        "of --dataset prefix.",
+    )
+    parser.add_argument(
+        "--trace-path",
+        type=str,
+        default=None,
+        help="JSONL request trace for --dataset trace, see TraceDataset for "
+        "the format. The trace is replayed with its own arrival times, "
+        "--request-rate and --burstiness are ignored.",
+    )
+    parser.add_argument(
+        "--trace-time-scale",
+        type=float,
+        default=1.0,
+        help="Factor applied to the trace's inter-arrival times, e.g. 0.5 "
+        "replays the trace at twice its original rate.",
     )
     parser.add_argument(
         "--json-schema-path", type=str, default=None, help="Path to json schema."
     )
+    parser.add_argument(
+        "--prompt-len-cache-dir",
+        type=str,
+        default=DEFAULT_PROMPT_LEN_CACHE_DIR,
+        help="Directory of the on-disk caches: prompt token lengths and the "
+        "preprocessed xgrammar_bench dataset. Cache files are keyed by "
+        "tokenizer and dataset, so repeated runs do not re-tokenize their "
+        "prompts and xgrammar_bench runs need no network access.",
+    )
+    parser.add_argument(
+        "--preprocess-only",
+        action="store_true",
+        default=False,
+        help="Only build the dataset caches (see --prompt-len-cache-dir) and "
+        "exit, e.g. on a login node with network access before benchmarking "
+        "from compute nodes without it.",
+    )
+    parser.add_argument(
+        "--no-prompt-len-cache",
+        action="store_true",
+        default=False,
+        help="Do not read or write the prompt length cache.",
+    )
     parser.add_argument(
         "--max-concurrency",
         type=int,
@@ -919,8 +3485,10 @@ def create_argument_parser():
     parser.add_argument(
         "--num-prompts",
         type=int,
-        default=1000,
-        help="Number of prompts to process.",
+        default=None,
+        help="Number of prompts to process (default: "
+        f"{DEFAULT_NUM_PROMPTS}). With --dataset trace, the number of trace "
+        "entries to replay (default: all).",
     )
     parser.add_argument(
         "--output-len",
@@ -949,6 +3517,32 @@ def create_argument_parser():
         "bursty requests. A higher burstiness value (burstiness > 1) "
         "results in a more uniform arrival of requests.",
     )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Generate load for this many seconds (plus --warmup and "
+        "--cooldown) instead of sending --num-prompts requests once. The "
+        "--num-prompts sampled requests are cycled through. Requires "
+        "--request-rate or --max-concurrency; with only --max-concurrency, "
+        "that many clients send requests back to back.",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=0.0,
+        help="Seconds of load before the measurement window of --duration. "
+        "Requests sent during warm-up are excluded from the metrics.",
+    )
+    parser.add_argument(
+        "--cooldown",
+        type=float,
+        default=0.0,
+        help="Seconds of load after the measurement window of --duration, so "
+        "that the last measured requests do not complete on a draining "
+        "server. Requests sent during cool-down are excluded from the "
+        "metrics.",
+    )
     parser.add_argument("--seed", type=int, default=0)
     parser.add_argument(
         "--trust-remote-code",
@@ -1024,6 +3618,39 @@ def create_argument_parser():
         "and the blog: https://hao-ai-lab.github.io/blogs/distserve",
     )
 
+    parser.add_argument(
+        "--sweep",
+        choices=SWEEP_PARAMETERS,
+        default=None,
+        help="Run one benchmark per value of --sweep-values for the given "
+        "parameter and report the throughput-versus-latency curve and its "
+        "knee point. With --goodput, also search for the highest load that "
+        "meets the SLOs. The results of every step are saved.",
+    )
+    parser.add_argument(
+        "--sweep-values",
+        type=str,
+        default=None,
+        help="Comma-separated values of the --sweep parameter, in increasing "
+        f"order of load. Defaults to {DEFAULT_SWEEP_VALUES}, or to request "
+        f"rates {SELF_BENCHMARK_RATES} with --self-benchmark.",
+    )
+    parser.add_argument(
+        "--sweep-slo-attainment",
+        type=float,
+        default=0.9,
+        help="Fraction of the sent requests that must complete and meet all "
+        "--goodput SLOs for a sweep step to count as meeting them. Failed and "
+        "timed-out requests count as missing the SLOs.",
+    )
+    parser.add_argument(
+        "--sweep-search-steps",
+        type=int,
+        default=4,
+        help="Rounds of binary search between the highest sweep value that "
+        "meets the --goodput SLOs and the lowest one that does not.",
+    )
+
     parser.add_argument(
         "--no-structured-output",
         action="store_true",
@@ -1036,6 +3663,178 @@ def create_argument_parser():
         default=1.0,
         help="Ratio of Structured Outputs requests",
     )
+    parser.add_argument(
+        "--no-connection-pool",
+        action="store_true",
+        default=False,
+        help="Open a new HTTP connection for every request instead of "
+        "sharing one keep-alive connection pool (sized to --max-concurrency) "
+        "across the run. Use it to measure the connection setup cost that "
+        "per-request sessions add to TTFT.",
+    )
+    parser.add_argument(
+        "--num-client-procs",
+        type=int,
+        default=1,
+        help="Number of client processes that generate the load. Requests "
+        "are sharded round-robin across the processes, each with its own "
+        "event loop and connection pool and an equal share of "
+        "--request-rate and --max-concurrency. Use it when a single client "
+        "process saturates its CPU core before the server saturates. The "
+        "progress bar is only shown for a single process.",
+    )
+    parser.add_argument(
+        "--disable-correctness-eval",
+        action="store_true",
+        default=False,
+        help="Skip the correctness evaluation of the generated outputs. The "
+        "generated text is then not kept at all, which bounds client memory "
+        "on long runs. Output tokens are counted from the server-reported "
+        "usage instead of re-tokenizing the text.",
+    )
+    parser.add_argument(
+        "--eval-procs",
+        type=int,
+        default=None,
+        help="Number of processes validating the generated outputs against "
+        "their schemas, used for large runs. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--token-count-strategy",
+        type=str,
+        default="usage",
+        choices=TOKEN_COUNT_STRATEGIES,
+        help="How output tokens are counted for the metrics. 'usage' uses the "
+        "completion_tokens usage reported by the server and re-tokenizes only "
+        "outputs without one. 'batch-tokenize' re-tokenizes every output "
+        "with batched tokenizer calls. 'tokenize' re-tokenizes the outputs "
+        "one at a time, which was the previous behaviour.",
+    )
+    parser.add_argument(
+        "--capture-timelines",
+        action="store_true",
+        help="Write the per-token timeline of every request (start, first "
+        "byte, arrival and token count of every streamed chunk) to a "
+        "binary Arrow file next to the per-request records, for "
+        "analyze_timelines.py. Requests continuous usage stats from the "
+        "server for the token counts. Requires --save-results and pyarrow.",
+    )
+    parser.add_argument(
+        "--ttft-timeout",
+        type=float,
+        default=None,
+        help="Deadline in seconds for the first token of a request. A request "
+        "that misses it is cancelled, its connection closed so that the "
+        "server aborts it, and it is counted as timed out rather than failed.",
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=None,
+        help="Deadline in seconds for the whole response of a request, "
+        "handled like --ttft-timeout. Bounds the duration of overload runs.",
+    )
+    parser.add_argument(
+        "--multi-turn",
+        type=int,
+        default=None,
+        metavar="TURNS",
+        help="Send the prompts as multi-turn chat conversations of TURNS "
+        "consecutive prompts. Each simulated user sends a turn with the "
+        "conversation so far once the previous reply arrived and a think "
+        "time passed. --request-rate is then the rate at which conversations "
+        "start and --max-concurrency the number of simultaneous users. "
+        "Requires --backend openai-chat.",
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="Mean time in seconds a --multi-turn user waits between a reply "
+        "and the next turn, exponentially distributed.",
+    )
+    parser.add_argument(
+        "--mpi",
+        action="store_true",
+        help="Generate the load from all ranks of an MPI job, e.g. started "
+        "with `mpirun -n 8` or `srun`, to drive deployments a single node "
+        "cannot saturate. Requests and arrival times are dealt round-robin "
+        "to the ranks, which start together after clock-offset correction. "
+        "Rank 0 merges the results and reports them. Requires mpi4py.",
+    )
+    parser.add_argument(
+        "--loop-lag-threshold-ms",
+        type=float,
+        default=DEFAULT_LOOP_LAG_THRESHOLD_MS,
+        help="Warn that the client, not the server, was the bottleneck when "
+        "the P99 lag of the client's event loop during the measurement "
+        "exceeds this many milliseconds (or the client process uses more "
+        "than 90%% of a CPU core). The lag and CPU use are recorded in the "
+        "results as client_load.",
+    )
+    parser.add_argument(
+        "--self-benchmark",
+        action="store_true",
+        help="Measure the benchmark client instead of a server: start the "
+        "bundled mock server (mock_server.py) on this machine, step "
+        "--request-rate through --sweep-values and report the highest rate "
+        "and token throughput the client sustains, i.e. sends on schedule "
+        "without being the bottleneck. Runs on a CPU-only machine; only the "
+        "tokenizer of --model (or --tokenizer) is needed.",
+    )
+    parser.add_argument(
+        "--mock-ttft",
+        type=str,
+        default="0",
+        help="Time to first token of the --self-benchmark mock server in "
+        "milliseconds, as a length distribution of real values, e.g. 50, 2.5 "
+        "or lognormal:50:0.5.",
+    )
+    parser.add_argument(
+        "--mock-itl",
+        type=str,
+        default="0",
+        help="Inter-token latency of the --self-benchmark mock server in "
+        "milliseconds, as a length distribution of real values, e.g. 0.4.",
+    )
+    parser.add_argument(
+        "--mock-output-len",
+        type=str,
+        default=None,
+        help="Distribution of the output lengths of the --self-benchmark mock "
+        "server, capped by the requested length. By default, and with "
+        "--ignore-eos, every request gets its requested length.",
+    )
+    parser.add_argument(
+        "--mock-error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of the requests the --self-benchmark mock server fails.",
+    )
+    parser.add_argument(
+        "--mock-workers",
+        type=int,
+        default=1,
+        help="Processes of the --self-benchmark mock server. They share the "
+        "machine's CPUs with the client processes.",
+    )
+    parser.add_argument(
+        "--prometheus-port",
+        type=int,
+        default=None,
+        help="Serve live client-side metrics (requests in flight, sent and "
+        "completed requests, TTFT/ITL/E2EL histograms) for Prometheus on "
+        "this port while the benchmark runs. With --num-client-procs N, "
+        "the client processes serve their request metrics on the next N "
+        "ports.",
+    )
+    parser.add_argument(
+        "--run-id",
+        type=str,
+        default=None,
+        help="Value of the run_id label of the --prometheus-port metrics. "
+        "Defaults to a random id.",
+    )
 
     return parser
 
@@ -1043,4 +3842,7 @@ def create_argument_parser():
 if __name__ == "__main__":
     parser = create_argument_parser()
     args = parser.parse_args()
-    main(args)
+    if args.self_benchmark:
+        self_benchmark(args)
+    else:
+        main(args)
@@ -0,0 +1,166 @@
+"""Live Prometheus metrics of the benchmark client.
+
+With ``--prometheus-port``, the benchmark serves its own ``/metrics``
+endpoint while it runs, so client-side latencies can be plotted next to the
+server's vLLM and hardware metrics. All series carry ``run_id`` and
+``dataset`` labels, and the per-request series a ``structure_type`` label
+(``json``, ``grammar``, ``regex``, ``choice``, or ``none`` for requests sent
+without structured output).
+
+Offered and achieved RPS are the ``rate()`` of the sent and completed
+counters, e.g. ``rate(benchmark_client_requests_sent_total[10s])``; the
+request rate of the current arrival schedule is exported as a gauge.
+"""
+
+from backend_request_func import RequestFuncInput, RequestFuncOutput
+
+try:
+    from prometheus_client import (
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        start_http_server,
+    )
+except ImportError:
+    start_http_server = None
+
+# Bucket bounds in seconds, fine enough for ITLs of a few milliseconds and
+# wide enough for the E2E latency of long generations.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    float("inf"),
+)
+RUN_LABELS = ("run_id", "dataset")
+REQUEST_LABELS = (*RUN_LABELS, "structure_type")
+
+
+def structure_type(request_func_input: RequestFuncInput) -> str:
+    """The ``structure_type`` label of a request."""
+    extra_body = request_func_input.extra_body or {}
+    structured_outputs = extra_body.get("structured_outputs")
+    if not structured_outputs:
+        return "none"
+    return next(iter(structured_outputs))
+
+
+class ClientMetrics:
+    """Serves the client metrics on ``port`` of all interfaces.
+
+    Each instance has its own registry, so the client processes of
+    ``--num-client-procs`` (and tests) can each serve their own instance.
+
+    Args:
+        port: Port of the ``/metrics`` HTTP endpoint.
+        run_id: Value of the ``run_id`` label.
+        dataset: Value of the ``dataset`` label.
+    """
+
+    def __init__(self, port: int, run_id: str, dataset: str) -> None:
+        if start_http_server is None:
+            raise ImportError(
+                "prometheus_client is required for --prometheus-port. "
+                "Install it with `pip install prometheus_client`."
+            )
+        self.port = port
+        self.run_id = run_id
+        self.dataset = dataset
+        self.registry = CollectorRegistry()
+        self.requests_in_flight = Gauge(
+            "benchmark_client_requests_in_flight",
+            "Requests sent to the server and not yet completed",
+            RUN_LABELS,
+            registry=self.registry,
+        ).labels(run_id, dataset)
+        self.scheduled_request_rate = Gauge(
+            "benchmark_client_scheduled_request_rate",
+            "Request rate of the arrival schedule (NaN for closed-loop load)",
+            RUN_LABELS,
+            registry=self.registry,
+        ).labels(run_id, dataset)
+        self.requests_sent = Counter(
+            "benchmark_client_requests_sent",
+            "Requests sent to the server",
+            REQUEST_LABELS,
+            registry=self.registry,
+        )
+        self.requests_completed = Counter(
+            "benchmark_client_requests_completed",
+            "Requests that completed successfully",
+            REQUEST_LABELS,
+            registry=self.registry,
+        )
+        self.requests_failed = Counter(
+            "benchmark_client_requests_failed",
+            "Requests that failed, other than by timing out",
+            REQUEST_LABELS,
+            registry=self.registry,
+        )
+        self.requests_timed_out = Counter(
+            "benchmark_client_requests_timed_out",
+            "Requests cancelled for missing their TTFT or total deadline",
+            REQUEST_LABELS,
+            registry=self.registry,
+        )
+        self.latency = {
+            metric: Histogram(
+                f"benchmark_client_{metric}_seconds",
+                description,
+                REQUEST_LABELS,
+                registry=self.registry,
+                buckets=LATENCY_BUCKETS,
+            )
+            for metric, description in (
+                ("ttft", "Time to first token"),
+                ("itl", "Inter-token latency"),
+                ("e2el", "End-to-end request latency"),
+            )
+        }
+        self._server, self._server_thread = start_http_server(
+            port, registry=self.registry
+        )
+
+    def worker_port(self, proc_idx: int) -> int:
+        """The port served by client process ``proc_idx``."""
+        return self.port + 1 + proc_idx
+
+    def request_sent(self, structure: str) -> None:
+        self.requests_in_flight.inc()
+        self.requests_sent.labels(self.run_id, self.dataset, structure).inc()
+
+    def request_completed(self, output: RequestFuncOutput, structure: str) -> None:
+        """Record a completed request. Must be called before its ITLs are
+        dropped."""
+        self.requests_in_flight.dec()
+        labels = (self.run_id, self.dataset, structure)
+        if not output.success:
+            failed = (
+                self.requests_timed_out if output.timed_out else self.requests_failed
+            )
+            failed.labels(*labels).inc()
+            return
+        self.requests_completed.labels(*labels).inc()
+        self.latency["ttft"].labels(*labels).observe(output.ttft)
+        self.latency["e2el"].labels(*labels).observe(output.latency)
+        itl_histogram = self.latency["itl"].labels(*labels)
+        for itl in output.itl:
+            itl_histogram.observe(itl)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
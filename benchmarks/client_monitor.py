@@ -0,0 +1,126 @@
+"""Self-monitoring of the benchmark client.
+
+A saturated client delays sending requests and reading their responses, and
+the delay shows up as server latency. :class:`ClientLoadMonitor` samples the
+event-loop lag, CPU use and send backlog of a client process while it runs,
+so that a run whose client was the bottleneck can be flagged.
+"""
+
+import asyncio
+import contextlib
+import time
+from array import array
+
+import numpy as np
+
+DEFAULT_SAMPLE_INTERVAL = 0.05
+# Mean CPU use of a client process, in percent of one core, above which the
+# process is considered saturated.
+CPU_SATURATION_PERCENT = 90.0
+
+
+class ClientLoadMonitor:
+    """Samples the load of a client process every ``interval`` seconds.
+
+    Each sample records the loop lag (how much later than requested a sleep
+    on the event loop returned), the CPU time used by the process since the
+    previous sample in percent of the elapsed time, and ``backlog``: the
+    number of requests that are due but not yet sent, which
+    :func:`run_requests` keeps up to date. Sample times are in seconds from
+    the ``start_time`` passed to :meth:`start`.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.backlog = 0
+        self.times = array("d")
+        self.loop_lags = array("d")
+        self.cpu_percents = array("d")
+        self.backlogs = array("d")
+        self._task: asyncio.Task | None = None
+
+    def start(self, start_time: float) -> None:
+        """Start sampling on the running event loop. ``start_time`` is a
+        ``time.monotonic()`` timestamp."""
+        self._task = asyncio.create_task(self._sample(start_time))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _sample(self, start_time: float) -> None:
+        wall, cpu = time.monotonic(), time.process_time()
+        while True:
+            await asyncio.sleep(self.interval)
+            now, now_cpu = time.monotonic(), time.process_time()
+            self.times.append(now - start_time)
+            self.loop_lags.append(max(now - wall - self.interval, 0.0))
+            self.cpu_percents.append(100 * (now_cpu - cpu) / (now - wall))
+            self.backlogs.append(self.backlog)
+            wall, cpu = now, now_cpu
+
+    def merge(self, other: "ClientLoadMonitor", time_offset: float = 0.0) -> None:
+        """Add the samples of ``other``, e.g. of another client process, with
+        their times shifted by ``time_offset`` seconds."""
+        self.times.extend(t + time_offset for t in other.times)
+        self.loop_lags.extend(other.loop_lags)
+        self.cpu_percents.extend(other.cpu_percents)
+        self.backlogs.extend(other.backlogs)
+
+    def summary(self, window: tuple[float, float] | None = None) -> dict[str, float]:
+        """Statistics of the samples taken inside ``window`` (None for all).
+
+        With merged samples of several processes, the statistics are over
+        the samples of all of them, i.e. per client process.
+        """
+        times = np.frombuffer(self.times)
+        selected = (
+            (times >= window[0]) & (times < window[1])
+            if window is not None
+            else np.ones(len(times), dtype=bool)
+        )
+        if not selected.any():
+            return {
+                "mean_loop_lag_ms": 0.0,
+                "p99_loop_lag_ms": 0.0,
+                "max_loop_lag_ms": 0.0,
+                "mean_cpu_percent": 0.0,
+                "max_cpu_percent": 0.0,
+                "mean_backlog": 0.0,
+                "max_backlog": 0.0,
+            }
+        loop_lags_ms = np.frombuffer(self.loop_lags)[selected] * 1000
+        cpu_percents = np.frombuffer(self.cpu_percents)[selected]
+        backlogs = np.frombuffer(self.backlogs)[selected]
+        return {
+            "mean_loop_lag_ms": float(loop_lags_ms.mean()),
+            "p99_loop_lag_ms": float(np.percentile(loop_lags_ms, 99)),
+            "max_loop_lag_ms": float(loop_lags_ms.max()),
+            "mean_cpu_percent": float(cpu_percents.mean()),
+            "max_cpu_percent": float(cpu_percents.max()),
+            "mean_backlog": float(backlogs.mean()),
+            "max_backlog": float(backlogs.max()),
+        }
+
+
+def bottleneck_reasons(
+    summary: dict[str, float], loop_lag_threshold_ms: float
+) -> list[str]:
+    """Why the client that produced ``summary`` limited the benchmark, empty
+    if it did not."""
+    reasons = []
+    if summary["p99_loop_lag_ms"] > loop_lag_threshold_ms:
+        reasons.append(
+            f"P99 event loop lag {summary['p99_loop_lag_ms']:.2f} ms exceeds "
+            f"{loop_lag_threshold_ms:.2f} ms"
+        )
+    if summary["mean_cpu_percent"] > CPU_SATURATION_PERCENT:
+        reasons.append(
+            f"mean client CPU use {summary['mean_cpu_percent']:.0f}% exceeds "
+            f"{CPU_SATURATION_PERCENT:.0f}%"
+        )
+    return reasons
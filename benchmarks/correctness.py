@@ -0,0 +1,191 @@
+"""Schema-aware correctness evaluation of structured outputs.
+
+Every output is checked against the structure it was requested with:
+
+* ``json``: the outermost ``{...}`` of the text must parse and validate
+  against the request's JSON schema. Without the optional ``jsonschema``
+  package, only parsing is checked.
+* ``regex``: the text must match the request's regex from its start.
+* ``choice``: the text must be one of the request's choices.
+* Grammars are not evaluated.
+
+Validators and regexes are compiled once per distinct schema. Large
+evaluations are spread over a process pool, with each worker compiling the
+schemas it meets once.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+# Outputs per task sent to the worker processes, and the number of outputs
+# below which the evaluation stays in the calling process.
+CHUNK_SIZE = 2048
+PARALLEL_THRESHOLD = 8192
+
+# Schema key -> (structure type, schema) of the evaluation in this process,
+# and the validators compiled for them so far.
+_schemas: dict[str, tuple[str, object]] = {}
+_validators: dict[str, Callable[[str], bool]] = {}
+
+
+def _jsonschema():
+    """The optional ``jsonschema`` module, None if it is not installed. It is
+    imported on first use to keep the benchmark's startup fast."""
+    try:
+        import jsonschema
+    except ImportError:
+        return None
+    return jsonschema
+
+
+def schema_key(structure_type: str, schema) -> str:
+    """A short digest identifying a structure type and schema."""
+    text = json.dumps([structure_type, schema], sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def compile_validator(structure_type: str, schema) -> Callable[[str], bool] | None:
+    """Return a function checking an output against ``schema``, or None if
+    outputs of ``structure_type`` are not evaluated."""
+    if structure_type == "json":
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        jsonschema = _jsonschema()
+        validator = (
+            jsonschema.validators.validator_for(schema)(schema)
+            if jsonschema is not None
+            else None
+        )
+
+        def validate_json(text: str) -> bool:
+            start, end = text.find("{"), text.rfind("}")
+            if start == -1 or end < start:
+                return False
+            try:
+                instance = json.loads(text[start : end + 1])
+            except ValueError:
+                return False
+            return validator is None or validator.is_valid(instance)
+
+        return validate_json
+    if structure_type == "regex":
+        # Only regex outputs need the regex package.
+        import regex
+
+        pattern = regex.compile(schema)
+        return lambda text: pattern.match(text) is not None
+    if structure_type == "choice":
+        choices = frozenset(schema)
+        return lambda text: text in choices
+    return None
+
+
+def _init_worker(schemas: dict[str, tuple[str, object]]) -> None:
+    _schemas.clear()
+    _schemas.update(schemas)
+    _validators.clear()
+
+
+def _validate_chunk(chunk: list[tuple[str, str]]) -> list[bool | None]:
+    results = []
+    for key, text in chunk:
+        if key not in _validators:
+            _validators[key] = compile_validator(*_schemas[key])
+        validator = _validators[key]
+        results.append(validator(text) if validator is not None else None)
+    return results
+
+
+def evaluate_outputs(
+    items: Sequence[tuple[str | None, object, str | None]],
+    num_procs: int | None = None,
+) -> tuple[list[bool | None], list[dict]]:
+    """Check ``(structure_type, schema, text)`` items.
+
+    Items without a structure type (requests sent without structured output)
+    or text are not evaluated. ``num_procs`` worker processes (default: the
+    number of CPUs) are used for large evaluations.
+
+    Returns the score of every item (None if not evaluated) and the pass
+    rate of every evaluated schema, lowest first.
+    """
+    if any(item[0] == "json" for item in items) and _jsonschema() is None:
+        warnings.warn(
+            "jsonschema is not installed, JSON outputs are only checked to "
+            "parse, not validated against their schema.",
+            stacklevel=2,
+        )
+    schemas: dict[str, tuple[str, object]] = {}
+    keyed: list[tuple[str, str]] = []
+    positions: list[int] = []
+    # Schemas are shared between requests, so their keys are computed once
+    # per schema object.
+    keys_by_id: dict[tuple[str, int], str] = {}
+    for i, (structure_type, schema, text) in enumerate(items):
+        if structure_type is None or text is None:
+            continue
+        key = keys_by_id.get((structure_type, id(schema)))
+        if key is None:
+            key = schema_key(structure_type, schema)
+            keys_by_id[(structure_type, id(schema))] = key
+            schemas[key] = (structure_type, schema)
+        keyed.append((key, text))
+        positions.append(i)
+
+    chunks = [keyed[i : i + CHUNK_SIZE] for i in range(0, len(keyed), CHUNK_SIZE)]
+    num_procs = num_procs or os.cpu_count() or 1
+    if len(keyed) >= PARALLEL_THRESHOLD and num_procs > 1:
+        with ProcessPoolExecutor(
+            min(num_procs, len(chunks)), initializer=_init_worker, initargs=(schemas,)
+        ) as pool:
+            chunk_scores = list(pool.map(_validate_chunk, chunks))
+    else:
+        _init_worker(schemas)
+        chunk_scores = [_validate_chunk(chunk) for chunk in chunks]
+
+    scores: list[bool | None] = [None] * len(items)
+    stats: dict[str, list[int]] = {}
+    for (key, _), i, score in zip(
+        keyed, positions, (score for chunk in chunk_scores for score in chunk)
+    ):
+        scores[i] = score
+        if score is not None:
+            passed_total = stats.setdefault(key, [0, 0])
+            passed_total[0] += score
+            passed_total[1] += 1
+
+    by_schema = []
+    for key, (passed, total) in stats.items():
+        structure_type, schema = schemas[key]
+        title = schema.get("title") if isinstance(schema, dict) else None
+        by_schema.append(
+            {
+                "schema": key,
+                "structure_type": structure_type,
+                "title": title,
+                "count": total,
+                "passed": passed,
+                "pass_rate": passed / total * 100,
+            }
+        )
+    by_schema.sort(key=lambda entry: entry["pass_rate"])
+    return scores, by_schema
+
+
+def merge_pass_rates(first: list[dict], second: list[dict]) -> list[dict]:
+    """Combine the pass rates by schema of two :func:`evaluate_outputs`, e.g.
+    of two MPI ranks, lowest first."""
+    merged = {entry["schema"]: dict(entry) for entry in first}
+    for entry in second:
+        if entry["schema"] not in merged:
+            merged[entry["schema"]] = dict(entry)
+            continue
+        total = merged[entry["schema"]]
+        total["count"] += entry["count"]
+        total["passed"] += entry["passed"]
+        total["pass_rate"] = total["passed"] / total["count"] * 100
+    return sorted(merged.values(), key=lambda entry: entry["pass_rate"])
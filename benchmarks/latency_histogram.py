@@ -0,0 +1,211 @@
+"""Mergeable streaming latency histogram for the serving benchmarks.
+
+Latencies are counted in logarithmically sized buckets, so every value is
+represented with a bounded *relative* error. Memory therefore depends on the
+accuracy and on the covered value range, not on the number of recorded values.
+Mean and standard deviation are tracked exactly; percentiles are accurate to
+within ``relative_accuracy`` of the true sample value. Histograms with the same
+configuration can be merged, e.g. across client processes or MPI ranks.
+"""
+
+import math
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.005
+# Latencies are in seconds. Values at or below MIN_VALUE (including the 0 ITLs
+# of chunks that arrived in the same read) are counted as zero, values above
+# MAX_VALUE fall into the last bucket.
+DEFAULT_MIN_VALUE = 1e-6
+DEFAULT_MAX_VALUE = 1e6
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram with exact count, mean, std, min and max.
+
+    Args:
+        relative_accuracy: Maximum relative error of a reported percentile.
+        min_value: Smallest non-zero value that gets its own bucket.
+        max_value: Largest value that gets its own bucket.
+    """
+
+    __slots__ = (
+        "relative_accuracy",
+        "min_value",
+        "max_value",
+        "_log_gamma",
+        "_offset",
+        "counts",
+        "zero_count",
+        "count",
+        "mean",
+        "_m2",
+        "min",
+        "max",
+    )
+
+    def __init__(
+        self,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        min_value: float = DEFAULT_MIN_VALUE,
+        max_value: float = DEFAULT_MAX_VALUE,
+    ) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                f"relative_accuracy must be in (0, 1), got {relative_accuracy}."
+            )
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        num_buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset
+        self.counts = np.zeros(num_buckets + 1, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket_indices(self, values: np.ndarray) -> np.ndarray:
+        indices = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        return np.clip(indices - self._offset, 0, len(self.counts) - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        # The value in the middle (in relative terms) of the bucket.
+        gamma = math.exp(self._log_gamma)
+        return 2 * math.exp((index + self._offset) * self._log_gamma) / (gamma + 1)
+
+    def record(self, value: float) -> None:
+        """Record a single value."""
+        self.record_many(np.array([value], dtype=np.float64))
+
+    def record_many(self, values) -> None:
+        """Record a batch of values, e.g. the ITLs of one request.
+
+        ``values`` can be any sequence of floats, an ``array('d')`` or a
+        float64 NumPy array is read without a copy.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        nonzero = values[values > self.min_value]
+        self.zero_count += values.size - nonzero.size
+        if nonzero.size:
+            self.counts += np.bincount(
+                self._bucket_indices(nonzero), minlength=len(self.counts)
+            )
+        self._combine(
+            values.size, float(values.mean()), float(values.var() * values.size)
+        )
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _combine(self, count: int, mean: float, m2: float) -> None:
+        # Chan et al. parallel update of the running mean and variance.
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add the values recorded by ``other`` to this histogram."""
+        if (
+            other.relative_accuracy != self.relative_accuracy
+            or other.min_value != self.min_value
+            or other.max_value != self.max_value
+        ):
+            raise ValueError("Cannot merge histograms with different settings.")
+        if other.count == 0:
+            return
+        self.counts += other.counts
+        self.zero_count += other.zero_count
+        self._combine(other.count, other.mean, other._m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def std(self, ddof: int = 0) -> float:
+        if self.count <= ddof:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - ddof))
+
+    def _value_at(self, rank: int, cumulative: np.ndarray) -> float:
+        # The rank-th smallest recorded value, exact for the smallest and
+        # largest.
+        if rank == 0:
+            return self.min
+        if rank == self.count - 1:
+            return self.max
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        index = int(np.searchsorted(cumulative, rank - self.zero_count, side="right"))
+        return min(max(self._bucket_value(index), self.min), self.max)
+
+    def percentile(self, p: float) -> float:
+        """Return the ``p``-th percentile (0-100), 0 if nothing was recorded.
+
+        Like ``np.percentile``, the percentile is interpolated linearly between
+        the values at the two ranks around ``p / 100 * (count - 1)``.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = p / 100 * (self.count - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, self.count - 1)
+        cumulative = np.cumsum(self.counts)
+        lower_value = self._value_at(lower, cumulative)
+        upper_value = self._value_at(upper, cumulative)
+        return lower_value + (upper_value - lower_value) * (rank - lower)
+
+    def median(self) -> float:
+        return self.percentile(50)
+
+    def describe(self) -> dict[str, float]:
+        """Summary statistics with the keys of ``pandas.Series.describe()``."""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std(ddof=1),
+            "min": self.min,
+            "25%": self.percentile(25),
+            "50%": self.percentile(50),
+            "75%": self.percentile(75),
+            "max": self.max,
+        }
+
+    def to_dict(self) -> dict:
+        """Serialise to a JSON-compatible dict; empty buckets are omitted."""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self._m2,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero_count": self.zero_count,
+            "bucket_offset": self._offset,
+            "buckets": {int(i): int(c) for i, c in zip(nonzero, self.counts[nonzero])},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        """Rebuild a histogram serialised with :meth:`to_dict`."""
+        histogram = cls(data["relative_accuracy"], data["min_value"], data["max_value"])
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.zero_count = data["zero_count"]
+        histogram.count = data["count"]
+        histogram.mean = data["mean"]
+        histogram._m2 = data["m2"]
+        if histogram.count:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
@@ -0,0 +1,128 @@
+"""Token length distributions for the synthetic datasets.
+
+A distribution is given on the command line as ``KIND:PARAM[:PARAM]``:
+
+* ``1024`` or ``fixed:1024``: always 1024 tokens.
+* ``uniform:512:2048``: uniform between 512 and 2048 tokens, inclusive.
+* ``normal:1024:256``: normal with mean 1024 and standard deviation 256.
+* ``lognormal:1024:0.5``: log-normal with median 1024 whose logarithm has
+  standard deviation 0.5, a common fit for real prompt lengths.
+* ``hist:lengths.csv``: empirical distribution, one ``length,weight`` line
+  per bucket (``#`` starts a comment). Lengths are drawn with probability
+  proportional to their weight.
+
+Samples are rounded to whole tokens and clipped to at least one token (or
+another minimum). Distributions of real values (``integer=False``), e.g. the
+delays in milliseconds of ``mock_server.py``, are not rounded, and also take
+fractional numbers such as ``0.4`` or ``uniform:0.5:2.5``.
+"""
+
+import math
+
+import numpy as np
+
+DISTRIBUTION_KINDS = ("fixed", "uniform", "normal", "lognormal", "hist")
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+class LengthDistribution:
+    """A parsed length distribution, see the module docstring.
+
+    Args:
+        spec: The ``KIND:PARAM[:PARAM]`` specification.
+        integer: Whether samples are rounded to integers, False for a
+            distribution of real values.
+    """
+
+    def __init__(self, spec: str, integer: bool = True) -> None:
+        self.spec = spec
+        self.integer = integer
+        kind, _, params = spec.partition(":")
+        if not params and (kind.isdigit() or not integer and _is_number(kind)):
+            kind, params = "fixed", kind
+        if kind not in DISTRIBUTION_KINDS:
+            raise ValueError(
+                f"Unknown length distribution {spec!r}, expected one of "
+                f"{', '.join(DISTRIBUTION_KINDS)} or a fixed length."
+            )
+        self.kind = kind
+        if kind == "hist":
+            self.lengths, self.weights = self._read_histogram(params, integer)
+            self.params = ()
+            return
+        num_params = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}[kind]
+        try:
+            self.params = tuple(float(param) for param in params.split(":"))
+        except ValueError:
+            self.params = ()
+        if len(self.params) != num_params or not all(
+            math.isfinite(param) and param >= 0 for param in self.params
+        ):
+            raise ValueError(
+                f"Invalid length distribution {spec!r}: {kind} takes "
+                f"{num_params} non-negative number(s)."
+            )
+        if kind == "uniform" and self.params[0] > self.params[1]:
+            raise ValueError(f"Invalid length distribution {spec!r}: low > high.")
+
+    @staticmethod
+    def _read_histogram(path: str, integer: bool) -> tuple[np.ndarray, np.ndarray]:
+        lengths, weights = [], []
+        with open(path) as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    length, weight = line.split(",")
+                    lengths.append(int(length) if integer else float(length))
+                    weights.append(float(weight))
+                except ValueError:
+                    raise ValueError(
+                        f"{path}:{line_no}: expected a `length,weight` line."
+                    ) from None
+        weights = np.array(weights)
+        if not lengths or (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError(
+                f"Length histogram {path} needs non-negative weights with a "
+                "positive sum."
+            )
+        dtype = np.int64 if integer else np.float64
+        return np.array(lengths, dtype=dtype), weights / weights.sum()
+
+    def sample(
+        self, rng: np.random.Generator, size: int, minimum: float = 1
+    ) -> np.ndarray:
+        """Draw ``size`` lengths of at least ``minimum`` as an int64 array, or
+        a float64 array for a distribution of real values."""
+        if self.kind == "fixed":
+            lengths = np.full(size, self.params[0])
+        elif self.kind == "uniform":
+            low, high = self.params
+            if self.integer:
+                lengths = rng.integers(round(low), round(high), size, endpoint=True)
+            else:
+                lengths = rng.uniform(low, high, size)
+        elif self.kind == "normal":
+            lengths = rng.normal(*self.params, size)
+        elif self.kind == "lognormal":
+            median, sigma = self.params
+            if self.integer:
+                lengths = rng.lognormal(math.log(max(median, 1)), sigma, size)
+            else:
+                lengths = median * rng.lognormal(0.0, sigma, size)
+        else:
+            lengths = rng.choice(self.lengths, size, p=self.weights)
+        if not self.integer:
+            return np.maximum(lengths, minimum).astype(np.float64)
+        return np.maximum(np.rint(lengths), minimum).astype(np.int64)
+
+    def __repr__(self) -> str:
+        return f"LengthDistribution({self.spec!r})"
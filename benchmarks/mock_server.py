@@ -0,0 +1,355 @@
+"""Mock OpenAI-compatible streaming server.
+
+Serves ``/v1/completions`` and ``/v1/chat/completions`` as server-sent event
+streams shaped like vLLM's, without a model, so that the benchmark client can
+be exercised and measured on a machine without a GPU::
+
+    python mock_server.py --port 8000 --ttft lognormal:50:0.5 --itl 10 \\
+        --output-len uniform:64:256 --error-rate 0.01 --workers 4
+
+The time to first token and the inter-token latencies are drawn, in
+milliseconds, from distributions of real values (see
+``length_distributions.py``), so ``--itl 0.4`` sleeps 0.4 ms; zero delays
+stream a response as fast as the server can write it. A request generates its
+``max_tokens``, or fewer as drawn from ``--output-len`` unless it sets
+``ignore_eos``. ``--error-rate`` of the requests fail with an HTTP 500 before
+streaming. Usage is reported as requested with ``stream_options``.
+
+:func:`running_mock_server` starts the server in a subprocess, which is how
+``benchmark_serving_structured_output.py --self-benchmark`` uses it.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from collections.abc import Iterator
+
+import numpy as np
+from aiohttp import web
+from length_distributions import LengthDistribution
+
+# Text of every generated token, and max_tokens of requests without one.
+TOKEN_TEXT = " token"
+DEFAULT_MAX_TOKENS = 16
+
+# Seconds running_mock_server waits for the server to answer /health.
+STARTUP_TIMEOUT = 30.0
+
+
+class MockServer:
+    """Request handlers of one server process.
+
+    Args:
+        ttft: Distribution of the time to first token, in milliseconds.
+        itl: Distribution of the inter-token latency, in milliseconds.
+        output_len: Distribution of the number of tokens generated before a
+            simulated end of sequence, None to always generate ``max_tokens``.
+        error_rate: Fraction of the requests that fail.
+        model: Model name reported by ``/v1/models``.
+        seed: Seed of the random delays, lengths and errors.
+    """
+
+    def __init__(
+        self,
+        ttft: LengthDistribution,
+        itl: LengthDistribution,
+        output_len: LengthDistribution | None = None,
+        error_rate: float = 0.0,
+        model: str = "mock",
+        seed: int = 0,
+    ) -> None:
+        self.ttft = ttft
+        self.itl = itl
+        self.output_len = output_len
+        self.error_rate = error_rate
+        self.model = model
+        self.rng = np.random.default_rng(seed)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/completions", self.completions)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        return app
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.Response()
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"object": "list", "data": [{"id": self.model, "object": "model"}]}
+        )
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        return await self._stream(request, chat=False)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        return await self._stream(request, chat=True)
+
+    def _num_tokens(self, body: dict) -> tuple[int, str]:
+        """The number of tokens to generate and the finish reason."""
+        max_tokens = (
+            body.get("max_completion_tokens")
+            or body.get("max_tokens")
+            or DEFAULT_MAX_TOKENS
+        )
+        if self.output_len is None or body.get("ignore_eos"):
+            return max_tokens, "length"
+        num_tokens = int(self.output_len.sample(self.rng, 1)[0])
+        if num_tokens < max_tokens:
+            return num_tokens, "stop"
+        return max_tokens, "length"
+
+    async def _stream(self, request: web.Request, chat: bool) -> web.StreamResponse:
+        body = await request.json()
+        if self.rng.random() < self.error_rate:
+            return web.json_response(
+                {"error": {"message": "Injected error", "type": "mock_error"}},
+                status=500,
+            )
+
+        num_tokens, finish_reason = self._num_tokens(body)
+        # Delays before every token, in seconds.
+        delays = np.empty(num_tokens)
+        delays[:1] = self.ttft.sample(self.rng, 1, minimum=0) / 1000
+        delays[1:] = self.itl.sample(self.rng, num_tokens - 1, minimum=0) / 1000
+        stream_options = body.get("stream_options") or {}
+        prompt = body.get("messages") if chat else body.get("prompt")
+        prompt_tokens = len(json.dumps(prompt).split())
+        chunks = _Chunks(
+            chat,
+            body.get("model") or self.model,
+            prompt_tokens,
+            stream_options.get("continuous_usage_stats", False),
+        )
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        # Tokens without a delay between them are written together.
+        pending: list[bytes] = []
+        try:
+            for i, delay in enumerate(delays):
+                if delay > 0:
+                    if pending:
+                        await response.write(b"".join(pending))
+                        pending.clear()
+                    await asyncio.sleep(delay)
+                pending.append(
+                    chunks.token(i, finish_reason if i == num_tokens - 1 else None)
+                )
+            if stream_options.get("include_usage"):
+                pending.append(chunks.usage(num_tokens))
+            pending.append(b"data: [DONE]\n\n")
+            await response.write(b"".join(pending))
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client went away, e.g. on a deadline.
+            pass
+        return response
+
+
+class _Chunks:
+    """Encoded SSE events of one response. Token events are identical apart
+    from continuous usage stats, so they are encoded once if there are none."""
+
+    def __init__(
+        self, chat: bool, model: str, prompt_tokens: int, continuous_usage: bool
+    ) -> None:
+        self.chat = chat
+        self.prompt_tokens = prompt_tokens
+        self.continuous_usage = continuous_usage
+        self.header = {
+            "id": f"{'chatcmpl' if chat else 'cmpl'}-{uuid.uuid4().hex}",
+            "object": "chat.completion.chunk" if chat else "text_completion",
+            "created": int(time.time()),
+            "model": model,
+        }
+        self._token = None if continuous_usage else self._encode(self._choice())
+
+    def _choice(self, first: bool = False, finish_reason: str | None = None) -> dict:
+        if self.chat:
+            delta = {"role": "assistant", "content": TOKEN_TEXT}
+            if not first:
+                del delta["role"]
+            return {"index": 0, "delta": delta, "finish_reason": finish_reason}
+        return {
+            "index": 0,
+            "text": TOKEN_TEXT,
+            "logprobs": None,
+            "finish_reason": finish_reason,
+        }
+
+    def _usage(self, completion_tokens: int) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": self.prompt_tokens + completion_tokens,
+        }
+
+    def _encode(self, choice: dict | None, usage: dict | None = None) -> bytes:
+        event = {**self.header, "choices": [choice] if choice else []}
+        if usage is not None:
+            event["usage"] = usage
+        return b"data: " + json.dumps(event).encode() + b"\n\n"
+
+    def token(self, index: int, finish_reason: str | None) -> bytes:
+        first = index == 0 and self.chat
+        if self._token is not None and not first and finish_reason is None:
+            return self._token
+        choice = self._choice(first, finish_reason)
+        usage = self._usage(index + 1) if self.continuous_usage else None
+        return self._encode(choice, usage)
+
+    def usage(self, completion_tokens: int) -> bytes:
+        return self._encode(None, self._usage(completion_tokens))
+
+
+def serve(args: argparse.Namespace, worker: int = 0) -> None:
+    """Run a server process until it is interrupted."""
+    server = MockServer(
+        ttft=LengthDistribution(args.ttft, integer=False),
+        itl=LengthDistribution(args.itl, integer=False),
+        output_len=LengthDistribution(args.output_len) if args.output_len else None,
+        error_rate=args.error_rate,
+        model=args.model,
+        seed=args.seed + worker,
+    )
+    web.run_app(
+        server.make_app(),
+        host=args.host,
+        port=args.port,
+        reuse_port=args.workers > 1,
+        access_log=None,
+        print=None,
+    )
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_mock_server(
+    server_args: list[str], host: str = "127.0.0.1"
+) -> Iterator[str]:
+    """Run the mock server with the command-line arguments ``server_args`` in
+    a subprocess on a free port of ``host``, and yield its base URL once it is
+    ready. The server is stopped on exit."""
+    port = _free_port(host)
+    base_url = f"http://{host}:{port}"
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--host", host, "--port", str(port), *server_args]
+    )
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"The mock server exited with code {process.returncode}."
+                )
+            try:
+                with urllib.request.urlopen(f"{base_url}/health", timeout=1):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"The mock server did not start within {STARTUP_TIMEOUT}s."
+                    ) from None
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main(args: argparse.Namespace) -> None:
+    if not 0 <= args.error_rate <= 1:
+        raise ValueError("--error-rate must be between 0 and 1.")
+    if args.workers < 1:
+        raise ValueError("--workers must be at least 1.")
+    if args.workers == 1:
+        serve(args)
+        return
+    # The workers share the port, the kernel spreads the connections.
+    workers = [
+        multiprocessing.Process(target=serve, args=(args, worker))
+        for worker in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    # Stop the workers when stopped, e.g. by running_mock_server.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Mock OpenAI-compatible streaming server for benchmarking "
+        "the benchmark client."
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--ttft",
+        type=str,
+        default="0",
+        help="Distribution of the time to first token in milliseconds, e.g. "
+        "50, 2.5 or lognormal:50:0.5. See length_distributions.py.",
+    )
+    parser.add_argument(
+        "--itl",
+        type=str,
+        default="0",
+        help="Distribution of the inter-token latency in milliseconds, e.g. 0.4.",
+    )
+    parser.add_argument(
+        "--output-len",
+        type=str,
+        default=None,
+        help="Distribution of the number of tokens generated before a "
+        "simulated end of sequence, capped by max_tokens. By default, and for "
+        "requests with ignore_eos, max_tokens tokens are generated.",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of the requests that fail with an HTTP 500.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Server processes sharing the port. Use enough that the server "
+        "is not the bottleneck.",
+    )
+    parser.add_argument("--model", type=str, default="mock")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+if __name__ == "__main__":
+    main(create_argument_parser().parse_args())
@@ -0,0 +1,263 @@
+"""Incremental per-request result files for the serving benchmarks.
+
+Every completed request is appended to two files as it completes:
+
+* ``<prefix>.jsonl``: one JSON object per request, including the generated
+  text and the inter-token latencies.
+* ``<prefix>.arrow``: the numeric fields in Arrow IPC stream format, written
+  in record batches. The stream format stays readable up to the last complete
+  batch if the run crashes, and loads with ``pyarrow.ipc.open_stream(path)
+  .read_all()`` (or ``.read_pandas()``). Without pyarrow, the scalar fields are
+  written to ``<prefix>.npz`` when the writer is closed instead.
+
+Missing values (None, e.g. ``output_tokens`` when the server reported no
+usage) are written as -1 to the integer columns and NaN to the float columns
+of the columnar file, and as null to the JSONL file.
+
+With ``timeline=True``, the per-token timeline of every request also goes to
+``<prefix>.timeline.arrow`` (see :class:`TimelineWriter`), which
+``analyze_timelines.py`` reads.
+"""
+
+import contextlib
+import functools
+from array import array
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+try:
+    import orjson
+except ImportError:
+    import json
+
+    def _dumps(record: dict) -> bytes:
+        return json.dumps(record).encode("utf-8")
+else:
+
+    def _dumps(record: dict) -> bytes:
+        return orjson.dumps(record)
+
+
+@functools.cache
+def _pyarrow():
+    """The pyarrow module, or None if it is not installed. It is imported by
+    the first writer rather than with this module, as it takes tens of
+    milliseconds to import."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pa
+
+
+# Records per Arrow record batch, i.e. how many completed requests can be lost
+# from the columnar file in a crash.
+BATCH_SIZE = 1024
+
+# Numeric per-request fields, with their array typecodes and dtypes.
+COLUMNS = {
+    "request_idx": ("q", np.int64),
+    "measured": ("b", np.bool_),
+    "success": ("b", np.bool_),
+    "prompt_len": ("q", np.int64),
+    "output_tokens": ("q", np.int64),
+    "ttft": ("d", np.float64),
+    "latency": ("d", np.float64),
+    "send_time": ("d", np.float64),
+    "scheduling_lag": ("d", np.float64),
+    "turn": ("q", np.int64),
+    "timed_out": ("b", np.bool_),
+}
+# Columnar value of a missing (None) field, by typecode.
+MISSING = {"q": -1, "d": float("nan"), "b": False}
+
+
+def columnar_path(prefix: str) -> str:
+    """The columnar file written for ``prefix``."""
+    return f"{prefix}.arrow" if _pyarrow() is not None else f"{prefix}.npz"
+
+
+def timeline_path(prefix: str) -> str:
+    """The timeline file written for ``prefix``."""
+    return f"{prefix}.timeline.arrow"
+
+
+class TimelineWriter:
+    """Appends per-token request timelines to an Arrow IPC stream file.
+
+    Each row is one request: ``request_idx``, ``success``, ``start_time``
+    (seconds since the start of the run), and relative to it ``first_byte``
+    (response headers) and ``chunk_times`` (arrival of every streamed chunk
+    with choices), with the number of tokens of each chunk in
+    ``chunk_tokens`` (empty if the server did not report them). Times within
+    a request are float32, which keeps microsecond resolution for requests of
+    up to a minute.
+
+    Args:
+        path: Path of the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        if _pyarrow() is None:
+            raise ImportError(
+                "pyarrow is required for per-token timelines. Install it with "
+                "`pip install pyarrow`."
+            )
+        self.path = path
+        self._writer = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._request_idx = array("q")
+        self._success = array("b")
+        self._start_time = array("d")
+        self._first_byte = array("f")
+        self._chunk_times: list[np.ndarray] = []
+        self._chunk_tokens: list[np.ndarray] = []
+
+    def write(
+        self,
+        request_idx: int,
+        success: bool,
+        start_time: float,
+        first_byte: float,
+        ttft: float,
+        itl: array,
+        cumulative_tokens: array,
+    ) -> None:
+        """Write the timeline of one request from its TTFT, ITLs and the
+        cumulative token count at every chunk (0 where unknown)."""
+        self._request_idx.append(request_idx)
+        self._success.append(success)
+        self._start_time.append(start_time)
+        self._first_byte.append(first_byte)
+        if ttft > 0:
+            chunk_times = np.empty(len(itl) + 1, dtype=np.float32)
+            chunk_times[0] = ttft
+            chunk_times[1:] = ttft + np.cumsum(np.frombuffer(itl))
+        else:
+            chunk_times = np.empty(0, dtype=np.float32)
+        self._chunk_times.append(chunk_times)
+        cumulative = np.frombuffer(cumulative_tokens, dtype=np.int64)
+        if len(cumulative) and cumulative[-1] > 0:
+            # Chunks without a count are counted with the next one.
+            self._chunk_tokens.append(
+                np.diff(np.maximum.accumulate(cumulative), prepend=0).astype(np.int32)
+            )
+        else:
+            self._chunk_tokens.append(np.empty(0, dtype=np.int32))
+        if len(self._request_idx) == BATCH_SIZE:
+            self._write_batch()
+
+    @staticmethod
+    def _list_array(values: list[np.ndarray], dtype) -> "pa.ListArray":
+        offsets = np.zeros(len(values) + 1, dtype=np.int32)
+        np.cumsum([len(v) for v in values], out=offsets[1:])
+        flat = np.concatenate(values) if values else np.empty(0, dtype=dtype)
+        pa = _pyarrow()
+        return pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat))
+
+    def _write_batch(self) -> None:
+        pa = _pyarrow()
+        batch = pa.record_batch(
+            {
+                "request_idx": pa.array(np.frombuffer(self._request_idx, np.int64)),
+                "success": pa.array(np.frombuffer(self._success, np.bool_)),
+                "start_time": pa.array(np.frombuffer(self._start_time)),
+                "first_byte": pa.array(np.frombuffer(self._first_byte, np.float32)),
+                "chunk_times": self._list_array(self._chunk_times, np.float32),
+                "chunk_tokens": self._list_array(self._chunk_tokens, np.int32),
+            }
+        )
+        if self._writer is None:
+            self._writer = pa.ipc.new_stream(self.path, batch.schema)
+        self._writer.write_batch(batch)
+        self._reset()
+
+    def close(self) -> None:
+        if self._request_idx or self._writer is None:
+            self._write_batch()
+        self._writer.close()
+
+
+class RequestRecordWriter:
+    """Appends per-request records to the JSONL and columnar files.
+
+    Args:
+        prefix: Path of the files without extension.
+        timeline: Also write per-token timelines with a :class:`TimelineWriter`
+            (``self.timeline``).
+    """
+
+    def __init__(self, prefix: str, timeline: bool = False) -> None:
+        # Closes the files even if writing the last batch fails.
+        self._files = contextlib.ExitStack()
+        self.timeline = TimelineWriter(timeline_path(prefix)) if timeline else None
+        if self.timeline is not None:
+            self._files.callback(self.timeline.close)
+        self.jsonl_path = f"{prefix}.jsonl"
+        self.columnar_path = columnar_path(prefix)
+        self._jsonl = self._files.enter_context(open(self.jsonl_path, "wb"))
+        self._columns = {
+            name: array(typecode) for name, (typecode, _) in COLUMNS.items()
+        }
+        self._itls: list[list[float]] = []
+        self._arrow_writer = None
+        self.num_records = 0
+
+    def write(self, record: dict) -> None:
+        """Write one record. All of its fields go to the JSONL file; the
+        ``COLUMNS`` fields, and with pyarrow ``itl``, also to the columnar
+        file."""
+        self._jsonl.write(_dumps(record))
+        self._jsonl.write(b"\n")
+        for name, column in self._columns.items():
+            value = record[name]
+            column.append(MISSING[column.typecode] if value is None else value)
+        if _pyarrow() is not None:
+            self._itls.append(record["itl"])
+            if len(self._itls) == BATCH_SIZE:
+                self._write_batch()
+        self.num_records += 1
+
+    def _write_batch(self) -> None:
+        pa = _pyarrow()
+        batch = pa.record_batch(
+            {
+                **{
+                    name: pa.array(np.frombuffer(self._columns[name], dtype=dtype))
+                    for name, (_, dtype) in COLUMNS.items()
+                },
+                "itl": pa.array(self._itls, type=pa.list_(pa.float64())),
+            }
+        )
+        if self._arrow_writer is None:
+            self._arrow_writer = self._files.enter_context(
+                pa.ipc.new_stream(self.columnar_path, batch.schema)
+            )
+        self._arrow_writer.write_batch(batch)
+        for name, (typecode, _) in COLUMNS.items():
+            self._columns[name] = array(typecode)
+        self._itls = []
+        self._jsonl.flush()
+
+    def close(self) -> None:
+        """Write the last batch and close the files. The JSONL file is flushed
+        and closed even if that fails."""
+        with self._files:
+            if _pyarrow() is not None:
+                if self._itls or self._arrow_writer is None:
+                    self._write_batch()
+            else:
+                np.savez(
+                    self.columnar_path,
+                    **{
+                        name: np.frombuffer(self._columns[name], dtype=dtype)
+                        for name, (_, dtype) in COLUMNS.items()
+                    },
+                )
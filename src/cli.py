@@ -1,9 +1,11 @@
 import cmd
+import socket
 import sys
 from vllm_server import VLLMServer
 from monitor_server import MonitorServer
 from chroma_server import ChromaServer
 from lustre_server import LustreServer
+from rag_benchmark import RAGBenchmark
 from servers import SlurmServer
 
 class CLI(cmd.Cmd):
@@ -242,7 +244,12 @@ class CLI(cmd.Cmd):
         Runs a benchmark against the started server.
         Usage: 
           bench vllm [--num-requests N] [--output-len L] [--max-concurrency C]
+                     [--sweep request-rate|max-concurrency] [--sweep-values V1,V2,...]
+                     [--goodput ttft:MS tpot:MS e2el:MS] [--prometheus-port P]
           bench chroma [--vectors N] [--queries N] [--dimension N] [--concurrent N]
+          bench rag [--queries N] [--concurrent N] [--top-k K] [--output-len L]
+                    [--documents N] [--collection NAME]
+                    [--embed-url URL] [--embed-model MODEL]
           bench lustre
         
         ChromaDB benchmark options:
@@ -250,6 +257,16 @@ class CLI(cmd.Cmd):
           --queries, -q N      : Number of queries to run (default: 100)
           --dimension, -d N    : Vector dimension (default: 384)
           --concurrent, -c N   : Concurrent query workers (default: 10)
+        
+        RAG pipeline benchmark options (embed -> Chroma query -> vLLM completion):
+          --queries, -q N      : Number of queries to run (default: 100)
+          --concurrent, -c N   : Queries in flight at once (default: 10)
+          --top-k, -k K        : Documents retrieved per query (default: 4)
+          --output-len L       : Completion tokens per query (default: 128)
+          --documents N        : Synthetic documents to seed the collection with (default: 1000)
+          --collection NAME    : Chroma collection (default: rag_benchmark_collection)
+          --embed-url URL      : OpenAI-compatible embeddings endpoint (default: vLLM's /v1/embeddings)
+          --embed-model MODEL  : Embedding model (default: the vLLM model)
         """
         if arg.lower().startswith('vllm'):
             if self.vllm_server.ip_address and self.vllm_server.ready:
@@ -258,6 +275,10 @@ class CLI(cmd.Cmd):
                 num_requests = 10
                 output_len = 128
                 max_concurrency = None
+                sweep = None
+                sweep_values = None
+                goodput = []
+                prometheus_port = None
                 
                 # Parse optional arguments
                 i = 1  # Skip 'vllm'
@@ -271,6 +292,24 @@ class CLI(cmd.Cmd):
                     elif args[i] == '--max-concurrency' and i + 1 < len(args):
                         max_concurrency = int(args[i + 1])
                         i += 2
+                    elif args[i] == '--sweep' and i + 1 < len(args):
+                        sweep = args[i + 1]
+                        if sweep not in ('request-rate', 'max-concurrency'):
+                            print(f"Error: Invalid sweep parameter: {sweep}. Use 'request-rate' or 'max-concurrency'.")
+                            return
+                        i += 2
+                    elif args[i] == '--sweep-values' and i + 1 < len(args):
+                        sweep_values = args[i + 1]
+                        i += 2
+                    elif args[i] == '--goodput':
+                        # Consumes all following metric:ms pairs
+                        i += 1
+                        while i < len(args) and ':' in args[i]:
+                            goodput.append(args[i])
+                            i += 1
+                    elif args[i] == '--prometheus-port' and i + 1 < len(args):
+                        prometheus_port = int(args[i + 1])
+                        i += 2
                     else:
                         i += 1
                 
@@ -279,13 +318,43 @@ class CLI(cmd.Cmd):
                 print(f"  Number of requests: {num_requests}")
                 print(f"  Output length: {output_len} tokens")
                 print(f"  Max concurrency: {max_concurrency if max_concurrency else 'unlimited'}")
+                if sweep:
+                    print(f"  Sweep: {sweep} {sweep_values or '(default values)'}")
+                if goodput:
+                    print(f"  Goodput SLOs: {' '.join(goodput)}")
+                if prometheus_port:
+                    print(f"  Client metrics port: {prometheus_port}")
                 print()
                 
-                self.vllm_server.benchmark_vllm(
-                    num_requests=num_requests,
-                    output_len=output_len,
-                    max_concurrency=max_concurrency
-                )
+                ip_map = None
+                if prometheus_port and self.monitor_server.ip_address:
+                    # Let Prometheus scrape the benchmark client next to the servers
+                    servers = {
+                        'vllm': self.vllm_server,
+                        'chroma': self.chroma_server,
+                        'lustre': self.lustre_server,
+                        'monitors': self.monitor_server
+                    }
+                    ip_map = SlurmServer.get_all_master_ips(servers)
+                    self.monitor_server.update_prometheus_targets(
+                        ip_map,
+                        extra_targets={'benchmark-client': [f"{socket.gethostname()}:{prometheus_port}"]}
+                    )
+                
+                try:
+                    self.vllm_server.benchmark_vllm(
+                        num_requests=num_requests,
+                        output_len=output_len,
+                        max_concurrency=max_concurrency,
+                        sweep=sweep,
+                        sweep_values=sweep_values,
+                        goodput=goodput or None,
+                        prometheus_port=prometheus_port
+                    )
+                finally:
+                    if ip_map is not None:
+                        # Stop scraping the client once the benchmark is over
+                        self.monitor_server.update_prometheus_targets(ip_map)
             else:
                 print("IP address is unknown or server is not ready. Please run 'check vllm' successfully first.")
         
@@ -356,6 +425,64 @@ class CLI(cmd.Cmd):
             else:
                 print("IP address is unknown or server is not ready. Please run 'check chroma' successfully first.")
         
+        elif arg.lower().startswith('rag'):
+            args = arg.split()
+            options = {
+                'num_queries': 100,
+                'concurrency': 10,
+                'top_k': 4,
+                'output_len': 128,
+                'num_documents': 1000,
+            }
+            int_flags = {
+                '--queries': 'num_queries', '-q': 'num_queries',
+                '--concurrent': 'concurrency', '-c': 'concurrency',
+                '--top-k': 'top_k', '-k': 'top_k',
+                '--output-len': 'output_len',
+                '--documents': 'num_documents',
+            }
+            collection_name = "rag_benchmark_collection"
+            embed_url = None
+            embed_model = None
+            
+            i = 1  # Skip 'rag'
+            while i < len(args):
+                if args[i] in int_flags and i + 1 < len(args):
+                    try:
+                        options[int_flags[args[i]]] = int(args[i + 1])
+                        i += 2
+                    except ValueError:
+                        print(f"Error: Invalid value for {args[i]}: {args[i + 1]}")
+                        return
+                elif args[i] == '--collection' and i + 1 < len(args):
+                    collection_name = args[i + 1]
+                    i += 2
+                elif args[i] == '--embed-url' and i + 1 < len(args):
+                    embed_url = args[i + 1]
+                    i += 2
+                elif args[i] == '--embed-model' and i + 1 < len(args):
+                    embed_model = args[i + 1]
+                    i += 2
+                else:
+                    i += 1
+            
+            if not (self.vllm_server.ip_address and self.vllm_server.ready):
+                print("vLLM IP address is unknown or server is not ready. Please run 'check vllm' successfully first.")
+                return
+            if not (self.chroma_server.ip_address and self.chroma_server.ready):
+                print("Chroma IP address is unknown or server is not ready. Please run 'check chroma' successfully first.")
+                return
+            
+            benchmark = RAGBenchmark(
+                chroma_ip=self.chroma_server.ip_address,
+                vllm_ip=self.vllm_server.ip_address,
+                model=self.vllm_server.current_model,
+                embed_url=embed_url,
+                embed_model=embed_model,
+                collection_name=collection_name
+            )
+            benchmark.run(**options)
+        
         elif arg.lower() == 'lustre':
             if self.lustre_server.ip_address and self.lustre_server.ready:
                 print("Starting Async IO500 benchmark on lustre server...")
@@ -364,7 +491,7 @@ class CLI(cmd.Cmd):
                 print("IP address is unknown or server is not ready. Please run 'check lustre' successfully first.")
         
         else:
-            print("Invalid command. Usage: bench [vllm|chroma|lustre]")
+            print("Invalid command. Usage: bench [vllm|chroma|rag|lustre]")
 
     def do_stop(self, arg):
         """
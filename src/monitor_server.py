@@ -4,13 +4,15 @@ import time
 from servers import SlurmServer
 
 class MonitorServer(SlurmServer):
-    def update_prometheus_targets(self, ip_map):
+    def update_prometheus_targets(self, ip_map, extra_targets=None):
         """
         Rebuild Prometheus scrape targets from scratch (dedupes). 
         For each running service:
           - <name> scrapes service metrics on port 8000
           - <name>-hw scrapes hardware exporter on port 8010
         ip_map: dict of job_name -> ip_address
+        extra_targets: dict of job_name -> list of 'host:port' targets that are
+          scraped as-is, e.g. the benchmark client's metrics endpoint
         """
         repo_source = os.getenv('REPO_SOURCE', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         prometheus_config_path = os.path.join(repo_source, "utils/prometheus_dir/prometheus.yaml")
@@ -44,10 +46,19 @@ class MonitorServer(SlurmServer):
                 new_lines.append("      - targets:\n")
                 new_lines.append(f"          - '{ip}:{hardware_port}'\n")
 
+            for name, targets in sorted((extra_targets or {}).items()):
+                new_lines.append(f"  - job_name: {name}\n")
+                new_lines.append("    static_configs:\n")
+                new_lines.append("      - targets:\n")
+                for target in targets:
+                    new_lines.append(f"          - '{target}'\n")
+
             with open(prometheus_config_path, 'w') as f:
                 f.writelines(new_lines)
 
             print(f"✓ Prometheus config rebuilt with master IPs: {ip_map}")
+            if extra_targets:
+                print(f"✓ Additional scrape targets: {extra_targets}")
             self._reload_prometheus()
         except Exception as e:
             print(f"Error updating Prometheus config: {e}")
@@ -0,0 +1,281 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import requests
+
+# Lazy import for chromadb (only imported when needed to speed up CLI startup)
+
+# Words the synthetic documents and questions are drawn from
+VOCABULARY = [
+    "cluster", "node", "gpu", "memory", "bandwidth", "latency", "scheduler", "job",
+    "storage", "lustre", "network", "model", "token", "cache", "batch", "queue",
+    "kernel", "tensor", "vector", "index", "throughput", "partition", "container",
+    "checkpoint", "dataset", "embedding", "inference", "request", "replica", "shard",
+]
+
+STAGES = ["embed", "retrieve", "ttft", "generate", "e2e"]
+
+
+def _synthetic_text(rng, num_words):
+    return " ".join(rng.choice(VOCABULARY, size=num_words))
+
+
+def build_prompt(question, documents):
+    """
+    Builds the generation prompt from the retrieved documents and the question.
+    """
+    context = "\n".join(f"- {doc}" for doc in documents)
+    return (
+        "Answer the question using only the context below.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question: {question}\n"
+        "Answer:"
+    )
+
+
+def _service_errors():
+    """
+    Returns the exception types raised when a service of the pipeline fails;
+    any other exception is a bug and is not reported as a failed query.
+    """
+    # Lazy import to speed up CLI startup; httpx is the HTTP client of chromadb
+    import chromadb.errors
+    import httpx
+    # ValueError covers malformed JSON and Chroma servers that cannot be reached
+    return (requests.RequestException, httpx.HTTPError, chromadb.errors.ChromaError,
+            ValueError)
+
+
+def latency_summary(latencies):
+    """
+    Returns the mean and percentiles of a list of latencies in seconds, in milliseconds.
+    """
+    if not latencies:
+        return None
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "mean": float(np.mean(latencies_ms)),
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p90": float(np.percentile(latencies_ms, 90)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+class RAGBenchmark:
+    """
+    End-to-end RAG pipeline benchmark: each query is embedded through an
+    OpenAI-compatible embeddings endpoint, the nearest documents are retrieved
+    from a Chroma collection, and a completion is streamed from vLLM with a
+    prompt built from those documents.
+
+    Args:
+        chroma_ip: IP address of the Chroma server
+        vllm_ip: IP address of the vLLM server
+        model: Model served by vLLM for the completions
+        embed_url: Embeddings endpoint (default: the vLLM server's /v1/embeddings)
+        embed_model: Model used for the embeddings (default: the completion model)
+        collection_name: Chroma collection holding the documents
+        chroma_port: Chroma server port (default: 8000)
+        vllm_port: vLLM server port (default: 8000)
+        timeout: Timeout in seconds of every HTTP request (default: 300)
+    """
+    def __init__(self, chroma_ip, vllm_ip, model, embed_url=None, embed_model=None,
+                 collection_name="rag_benchmark_collection", chroma_port=8000,
+                 vllm_port=8000, timeout=300):
+        self.chroma_ip = chroma_ip
+        self.chroma_port = chroma_port
+        self.model = model
+        self.completions_url = f"http://{vllm_ip}:{vllm_port}/v1/completions"
+        self.embed_url = embed_url or f"http://{vllm_ip}:{vllm_port}/v1/embeddings"
+        self.embed_model = embed_model or model
+        self.collection_name = collection_name
+        self.timeout = timeout
+        # Sessions and Chroma clients are not shared between worker threads
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _collection(self):
+        if not hasattr(self._local, "collection"):
+            # Lazy import to speed up CLI startup
+            import chromadb
+            client = chromadb.HttpClient(host=self.chroma_ip, port=self.chroma_port)
+            self._local.collection = client.get_or_create_collection(self.collection_name)
+        return self._local.collection
+
+    def embed(self, texts):
+        """
+        Embeds a list of texts through the embeddings endpoint.
+        """
+        response = self._session().post(
+            self.embed_url,
+            json={"model": self.embed_model, "input": texts},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def retrieve(self, embedding, top_k):
+        """
+        Returns the documents of the collection nearest to an embedding.
+        """
+        results = self._collection().query(query_embeddings=[embedding], n_results=top_k,
+                                           include=["documents"])
+        return results["documents"][0]
+
+    def generate(self, prompt, output_len):
+        """
+        Streams a completion and returns the time to the first token in seconds,
+        or None if no token was received.
+        """
+        start = time.perf_counter()
+        ttft = None
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "max_tokens": output_len,
+            "stream": True,
+        }
+        with self._session().post(self.completions_url, json=payload, stream=True,
+                                  timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[len(b"data: "):]
+                if data == b"[DONE]":
+                    break
+                choices = json.loads(data).get("choices")
+                if ttft is None and choices and choices[0].get("text"):
+                    ttft = time.perf_counter() - start
+        return ttft
+
+    def seed_collection(self, num_documents, words_per_document=64, batch_size=64, seed=0):
+        """
+        Fills the collection with synthetic documents, embedded through the
+        embeddings endpoint, if it holds fewer than num_documents documents.
+        """
+        collection = self._collection()
+        existing = collection.count()
+        if existing >= num_documents:
+            print(f"  Using existing collection {self.collection_name} ({existing} documents)")
+            return
+
+        rng = np.random.default_rng(seed)
+        print(f"  Adding {num_documents - existing} documents to {self.collection_name}...")
+        for i in range(existing, num_documents, batch_size):
+            batch_end = min(i + batch_size, num_documents)
+            documents = [_synthetic_text(rng, words_per_document) for _ in range(i, batch_end)]
+            collection.add(
+                ids=[f"doc_{j}" for j in range(i, batch_end)],
+                documents=documents,
+                embeddings=self.embed(documents)
+            )
+
+    def run_query(self, question, top_k, output_len):
+        """
+        Runs a question through the pipeline and returns the latency of every
+        stage in seconds, and the stage that failed (None on success).
+        """
+        latencies = {}
+        stage = "retrieve"
+        try:
+            # Connect this thread's client before timing the first query
+            self._collection()
+            stage = "embed"
+            start = time.perf_counter()
+            embedding = self.embed([question])[0]
+            latencies["embed"] = time.perf_counter() - start
+
+            stage = "retrieve"
+            stage_start = time.perf_counter()
+            documents = self.retrieve(embedding, top_k)
+            latencies["retrieve"] = time.perf_counter() - stage_start
+
+            stage = "generate"
+            stage_start = time.perf_counter()
+            ttft = self.generate(build_prompt(question, documents), output_len)
+            latencies["generate"] = time.perf_counter() - stage_start
+            if ttft is not None:
+                latencies["ttft"] = ttft
+            latencies["e2e"] = time.perf_counter() - start
+            return latencies, None
+        except _service_errors() as e:
+            print(f"  Query failed at the {stage} stage: {e}")
+            return latencies, stage
+
+    def run(self, num_queries=100, concurrency=10, top_k=4, output_len=128,
+            num_documents=1000, seed=0):
+        """
+        Runs num_queries synthetic questions through the pipeline with at most
+        concurrency of them in flight, and returns the latency summary of every
+        stage.
+        """
+        print("=" * 60)
+        print("Starting RAG Pipeline Benchmark")
+        print(f"Embeddings: {self.embed_url} ({self.embed_model})")
+        print(f"Chroma: {self.chroma_ip}:{self.chroma_port} ({self.collection_name})")
+        print(f"Completions: {self.completions_url} ({self.model})")
+        print(f"Queries: {num_queries}, Concurrency: {concurrency}, Top-k: {top_k}, "
+              f"Output length: {output_len}")
+        print("=" * 60)
+
+        print("\n[1/2] Preparing collection...")
+        try:
+            self.seed_collection(num_documents, seed=seed)
+        except _service_errors() as e:
+            print(f"\n✗ Could not prepare the collection: {e}")
+            return None
+
+        rng = np.random.default_rng(seed + 1)
+        questions = [f"What is known about {_synthetic_text(rng, 8)}?" for _ in range(num_queries)]
+
+        print(f"\n[2/2] Running {num_queries} queries ({concurrency} concurrent)...")
+        latencies = {stage: [] for stage in STAGES}
+        failures = {}
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(self.run_query, question, top_k, output_len)
+                       for question in questions]
+            for future in as_completed(futures):
+                query_latencies, failed_stage = future.result()
+                if failed_stage:
+                    failures[failed_stage] = failures.get(failed_stage, 0) + 1
+                    continue
+                for stage, latency in query_latencies.items():
+                    latencies[stage].append(latency)
+        duration = time.perf_counter() - start_time
+
+        successful = len(latencies["e2e"])
+        results = {
+            "num_queries": num_queries,
+            "successful": successful,
+            "failures": failures,
+            "duration": duration,
+            "qps": successful / duration if duration > 0 else 0,
+            "latency_ms": {stage: latency_summary(latencies[stage]) for stage in STAGES},
+        }
+
+        print("\n" + "=" * 60)
+        print("RAG BENCHMARK SUMMARY")
+        print("=" * 60)
+        print(f"Successful: {successful}/{num_queries}")
+        for stage, count in failures.items():
+            print(f"  - Failed at {stage}: {count}")
+        print(f"Total time: {duration:.2f}s")
+        print(f"QPS: {results['qps']:.2f} queries/sec")
+        print(f"\n{'Stage (ms)':<12} {'Mean':>10} {'P50':>10} {'P90':>10} {'P99':>10}")
+        for stage in STAGES:
+            summary = results["latency_ms"][stage]
+            if summary:
+                print(f"{stage:<12} {summary['mean']:>10.2f} {summary['p50']:>10.2f} "
+                      f"{summary['p90']:>10.2f} {summary['p99']:>10.2f}")
+        print("=" * 60)
+        return results
@@ -143,7 +143,8 @@ class VLLMServer(SlurmServer):
 
     def benchmark_vllm(self, port=8000, num_requests=10, model="meta-llama/Llama-3.1-8B-Instruct", 
                        dataset="json", output_len=128, request_rate=float("inf"),
-                       max_concurrency=None, structured_output_ratio=1.0):
+                       max_concurrency=None, structured_output_ratio=1.0,
+                       sweep=None, sweep_values=None, goodput=None, prometheus_port=None):
         """
         Runs the vLLM structured output benchmark script.
         
@@ -156,6 +157,10 @@ class VLLMServer(SlurmServer):
             request_rate: Requests per second (default: inf for all at once)
             max_concurrency: Maximum concurrent requests (default: None)
             structured_output_ratio: Ratio of structured output requests (default: 1.0)
+            sweep: Parameter to sweep - "request-rate" or "max-concurrency" (default: None for a single run)
+            sweep_values: Comma-separated sweep values, e.g. "1,2,4,8" (default: None for the script's default)
+            goodput: List of "metric:ms" SLOs, e.g. ["ttft:500", "tpot:50"] (default: None)
+            prometheus_port: Port on which the benchmark client serves its live metrics (default: None to disable)
         """
         if not self.ip_address:
             print("Cannot run benchmark without an IP address.")
@@ -178,6 +183,10 @@ class VLLMServer(SlurmServer):
         print(f"  Dataset: {dataset}")
         print(f"  Number of prompts: {num_requests}")
         print(f"  Output length: {output_len} tokens")
+        if sweep:
+            print(f"  Sweep: {sweep} {sweep_values or '(default values)'}")
+        if goodput:
+            print(f"  Goodput SLOs: {' '.join(goodput)}")
         
         if os.path.isabs(self.log_dir):
             results_dir = os.path.join(self.log_dir, "benchmark_results")
@@ -190,7 +199,8 @@ class VLLMServer(SlurmServer):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         model_short = model.replace("/", "_").replace("-", "_")
         max_conc_str = f"mc{max_concurrency}" if max_concurrency else "mcunlimited"
-        filename = f"benchmark_{model_short}_n{num_requests}_ol{output_len}_{max_conc_str}_ds{dataset}_{timestamp}.json"
+        sweep_str = f"sweep_{sweep}_" if sweep else ""
+        filename = f"benchmark_{sweep_str}{model_short}_n{num_requests}_ol{output_len}_{max_conc_str}_ds{dataset}_{timestamp}.json"
         
         cmd = [
             "python",
@@ -214,6 +224,17 @@ class VLLMServer(SlurmServer):
         if max_concurrency:
             cmd.extend(["--max-concurrency", str(max_concurrency)])
         
+        if sweep:
+            cmd.extend(["--sweep", sweep])
+            if sweep_values:
+                cmd.extend(["--sweep-values", sweep_values])
+        
+        if goodput:
+            cmd.extend(["--goodput", *goodput])
+        
+        if prometheus_port:
+            cmd.extend(["--prometheus-port", str(prometheus_port)])
+        
         cmd.extend(["--endpoint", "/v1/completions"])
         
         print(f"\nExecuting: {' '.join(cmd)}\n")
@@ -0,0 +1,78 @@
+import unittest
+import os
+import pickle
+import sys
+import tempfile
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from benchmark_serving_structured_output import (
+    TraceDataset,
+    sample_shared_prefix_requests,
+)
+
+VOCAB_SIZE = 16
+SPECIAL_IDS = {0, 1, 15}
+
+
+class TestSyntheticPrompts(unittest.TestCase):
+
+    def test_shared_prefix_requests_without_special_tokens(self):
+        """Test that shared-prefix prompts draw no special token ids"""
+        requests = sample_shared_prefix_requests(
+            50, VOCAB_SIZE, SPECIAL_IDS, 32, 4, 8, 16, {}, "json", 0
+        )
+
+        for request in requests:
+            self.assertEqual(len(request.prompt), 40)
+            self.assertFalse(SPECIAL_IDS & set(request.prompt))
+
+    def test_trace_prompt_len_without_special_tokens(self):
+        """Test that trace entries with only a prompt length get no special token ids"""
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write('{"timestamp": 0.0, "prompt_len": 100}\n')
+            f.write('{"timestamp": 0.5, "prompt_len": 7}\n')
+        self.addCleanup(os.remove, f.name)
+
+        with TraceDataset(f.name, lambda prompts: [], VOCAB_SIZE, SPECIAL_IDS,
+                          8) as dataset:
+            self.assertEqual([len(request.prompt) for request in dataset], [100, 7])
+            for request in dataset:
+                self.assertFalse(SPECIAL_IDS & set(request.prompt))
+            self.assertTrue(dataset.token_id_prompts)
+
+    def test_trace_text_prompts(self):
+        """Test that a trace of text prompts is not flagged as sending token ids"""
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            f.write('{"timestamp": 0.0, "prompt": "Hello world"}\n')
+        self.addCleanup(os.remove, f.name)
+
+        with TraceDataset(f.name, lambda prompts: [2] * len(prompts), VOCAB_SIZE,
+                          SPECIAL_IDS, 8) as dataset:
+            self.assertFalse(dataset.token_id_prompts)
+            self.assertEqual(dataset[0].prompt, "Hello world")
+
+    def test_trace_closed_with_slices(self):
+        """Test that closing a trace closes its slices, while pickled copies reopen it"""
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            for i in range(4):
+                f.write(f'{{"timestamp": {i}, "prompt_len": 3}}\n')
+        self.addCleanup(os.remove, f.name)
+
+        with TraceDataset(f.name, lambda prompts: [], VOCAB_SIZE, SPECIAL_IDS,
+                          8) as dataset:
+            shard = dataset[1::2]
+            self.assertEqual(len(shard[0].prompt), 3)
+        copied = pickle.loads(pickle.dumps(shard))
+
+        self.assertTrue(dataset._file.closed)
+        with self.assertRaises(ValueError):
+            shard[0]
+        with copied:
+            self.assertEqual(len(copied), 2)
+            self.assertEqual(len(copied[1].prompt), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
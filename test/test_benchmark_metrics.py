@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+
+import numpy as np
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from backend_request_func import RequestFuncOutput
+from benchmark_serving_structured_output import (
+    PartialMetrics,
+    accumulate_metrics,
+    calculate_metrics,
+    finalize_metrics,
+)
+
+PERCENTILES = [50, 99]
+
+
+def make_outputs(num_requests, seed=0):
+    """Outputs whose text was not kept, so that no tokenizer is needed."""
+    rng = np.random.default_rng(seed)
+    outputs = []
+    for i in range(num_requests):
+        ttft = rng.exponential(0.05)
+        outputs.append(RequestFuncOutput(
+            generated_text=None,
+            success=i % 10 != 0,
+            timed_out=i % 20 == 0,
+            ttft=ttft,
+            latency=ttft + rng.exponential(0.5),
+            output_tokens=int(rng.integers(2, 64)),
+            prompt_len=int(rng.integers(10, 100)),
+            request_idx=i,
+            send_time=0.01 * i,
+            scheduling_lag=rng.exponential(0.001),
+        ))
+    return outputs
+
+
+class TestBenchmarkMetrics(unittest.TestCase):
+
+    def test_merged_partial_metrics(self):
+        """Test that merging the partial metrics of two clients gives the metrics of all requests"""
+        outputs = make_outputs(200)
+        expected, _ = calculate_metrics(None, outputs, 2.0, None, [], PERCENTILES,
+                                        goodput_config_dict={"ttft": 50})
+
+        partial = PartialMetrics()
+        for client_outputs in (outputs[0::2], outputs[1::2]):
+            client_partial, _ = accumulate_metrics(client_outputs, None, {"ttft": 50})
+            partial.merge(client_partial)
+        metrics = finalize_metrics(partial, 2.0, PERCENTILES)
+
+        for name in ["completed", "timed_out", "failed", "total_input", "total_output",
+                     "request_goodput", "offered_request_rate",
+                     "max_scheduling_lag_ms"]:
+            self.assertEqual(getattr(metrics, name), getattr(expected, name), name)
+        for name in ["mean_ttft_ms", "mean_tpot_ms", "mean_e2el_ms",
+                     "mean_scheduling_lag_ms"]:
+            self.assertAlmostEqual(getattr(metrics, name), getattr(expected, name),
+                                   msg=name)
+        self.assertEqual(metrics.percentiles_e2el_ms, expected.percentiles_e2el_ms)
+
+    def test_offered_request_rate(self):
+        """Test that the offered rate counts the failed requests as well"""
+        metrics, _ = calculate_metrics(None, make_outputs(101), 1.0, None, [], PERCENTILES)
+
+        self.assertEqual(metrics.failed + metrics.timed_out + metrics.completed, 101)
+        self.assertAlmostEqual(metrics.offered_request_rate, 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
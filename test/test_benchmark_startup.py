@@ -0,0 +1,59 @@
+import unittest
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(__file__), '..', 'benchmarks')
+
+# Modules that are slow to import and are only needed on some paths of the
+# benchmark script, e.g. to load a tokenizer, download a dataset or write
+# request records.
+HEAVY_MODULES = ["transformers", "datasets", "pandas", "huggingface_hub", "vllm", "torch",
+                 "pyarrow", "aiohttp.web"]
+
+# Seconds the benchmark script may take to import. Importing all of the heavy
+# modules takes several seconds.
+IMPORT_TIME_BUDGET = 2.0
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import benchmark_serving_structured_output
+elapsed = time.perf_counter() - start
+heavy = [m for m in sys.argv[1:] if m in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def import_benchmark_script():
+    """Import the benchmark script in a fresh interpreter and return the
+    import time in seconds and the heavy modules it imported."""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT, *HEAVY_MODULES],
+        cwd=BENCHMARKS_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, _, heavy = result.stdout.strip().partition(" ")
+    return float(elapsed), [m for m in heavy.split(",") if m]
+
+
+class TestBenchmarkStartup(unittest.TestCase):
+
+    def test_no_heavy_imports(self):
+        """Test that importing the benchmark script does not import heavy modules"""
+        _, heavy = import_benchmark_script()
+
+        self.assertEqual(heavy, [])
+
+    def test_import_time(self):
+        """Test that the benchmark script imports within the time budget"""
+        # The fastest of a few imports, to not fail on a momentarily busy machine.
+        elapsed = min(import_benchmark_script()[0] for _ in range(3))
+
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, call
 import os
 import sys
 from io import StringIO
@@ -101,6 +101,116 @@ class TestCLI(unittest.TestCase):
         output = mock_stdout.getvalue()
         self.assertIn("IP address is unknown", output)
         print("[TEST] ✓ Failure scenario handled correctly")
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_vllm_sweep(self, mock_stdout):
+        """Test that sweep and goodput options are passed to the benchmark"""
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        
+        with patch.object(self.cli.vllm_server, 'benchmark_vllm') as mock_benchmark:
+            self.cli.do_bench("vllm --sweep max-concurrency --sweep-values 1,8,64 "
+                              "--goodput ttft:500 tpot:50 --output-len 64")
+        
+        mock_benchmark.assert_called_once_with(
+            num_requests=10,
+            output_len=64,
+            max_concurrency=None,
+            sweep="max-concurrency",
+            sweep_values="1,8,64",
+            goodput=["ttft:500", "tpot:50"],
+            prometheus_port=None
+        )
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_vllm_prometheus_port(self, mock_stdout):
+        """Test that the benchmark client is registered as a Prometheus target"""
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        self.cli.monitor_server.ip_address = "192.168.1.200"
+        
+        with patch.object(self.cli.vllm_server, 'benchmark_vllm') as mock_benchmark, \
+             patch.object(self.cli.monitor_server, 'update_prometheus_targets') as mock_update, \
+             patch('cli.socket.gethostname', return_value="login01"):
+            self.cli.do_bench("vllm --prometheus-port 9400")
+        
+        ip_map = {'vllm': "192.168.1.100", 'monitors': "192.168.1.200"}
+        self.assertEqual(mock_update.call_args_list, [
+            call(ip_map, extra_targets={'benchmark-client': ["login01:9400"]}),
+            call(ip_map),
+        ])
+        self.assertEqual(mock_benchmark.call_args.kwargs['prometheus_port'], 9400)
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_vllm_prometheus_port_failed_benchmark(self, mock_stdout):
+        """Test that the benchmark client is deregistered when the benchmark fails"""
+        print("\n[TEST] Testing FAILURE scenario: benchmark fails with a client metrics port")
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        self.cli.monitor_server.ip_address = "192.168.1.200"
+        
+        with patch.object(self.cli.vllm_server, 'benchmark_vllm',
+                          side_effect=KeyboardInterrupt), \
+             patch.object(self.cli.monitor_server, 'update_prometheus_targets') as mock_update:
+            with self.assertRaises(KeyboardInterrupt):
+                self.cli.do_bench("vllm --prometheus-port 9400")
+        
+        mock_update.assert_called_with({'vllm': "192.168.1.100", 'monitors': "192.168.1.200"})
+        print("[TEST] ✓ Failure scenario handled correctly")
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_vllm_invalid_sweep(self, mock_stdout):
+        """Test benchmark with an invalid sweep parameter"""
+        print("\n[TEST] Testing FAILURE scenario: invalid sweep parameter")
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        
+        with patch.object(self.cli.vllm_server, 'benchmark_vllm') as mock_benchmark:
+            self.cli.do_bench("vllm --sweep batch-size")
+        
+        mock_benchmark.assert_not_called()
+        self.assertIn("Invalid sweep parameter", mock_stdout.getvalue())
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_rag(self, mock_stdout):
+        """Test that RAG benchmark options are passed to the benchmark"""
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        self.cli.chroma_server.ip_address = "192.168.1.101"
+        self.cli.chroma_server.ready = True
+        
+        with patch('cli.RAGBenchmark') as mock_benchmark:
+            self.cli.do_bench("rag -q 50 --concurrent 8 --top-k 2 "
+                              "--embed-url http://192.168.1.102:8000/v1/embeddings")
+        
+        mock_benchmark.assert_called_once_with(
+            chroma_ip="192.168.1.101",
+            vllm_ip="192.168.1.100",
+            model=self.cli.vllm_server.current_model,
+            embed_url="http://192.168.1.102:8000/v1/embeddings",
+            embed_model=None,
+            collection_name="rag_benchmark_collection"
+        )
+        mock_benchmark.return_value.run.assert_called_once_with(
+            num_queries=50, concurrency=8, top_k=2, output_len=128, num_documents=1000
+        )
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_do_bench_rag_chroma_not_ready(self, mock_stdout):
+        """Test RAG benchmark when Chroma is not ready"""
+        print("\n[TEST] Testing FAILURE scenario: RAG benchmark when Chroma not ready")
+        self.cli.vllm_server.ip_address = "192.168.1.100"
+        self.cli.vllm_server.ready = True
+        self.cli.chroma_server.ip_address = None
+        
+        with patch('cli.RAGBenchmark') as mock_benchmark:
+            self.cli.do_bench("rag")
+        
+        mock_benchmark.assert_not_called()
+        self.assertIn("check chroma", mock_stdout.getvalue())
+        print("[TEST] ✓ Failure scenario handled correctly")
 
 
 if __name__ == '__main__':
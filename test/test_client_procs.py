@@ -0,0 +1,53 @@
+import unittest
+import os
+import sys
+import threading
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from backend_request_func import RequestFuncInput
+from benchmark_serving_structured_output import (
+    RequestFuncInputs,
+    SampleRequest,
+    run_client_procs,
+)
+
+# Seconds a failed run may take to report the failure of its workers.
+FAILURE_TIMEOUT = 60
+
+
+def make_request_inputs(num_requests):
+    requests = [SampleRequest(prompt="Hello", prompt_len=1, expected_output_len=4,
+                              schema=None, structure_type=None)] * num_requests
+    template = RequestFuncInput(prompt="", api_url="http://127.0.0.1:9/v1/completions",
+                                prompt_len=0, output_len=0, model="mock")
+    return RequestFuncInputs(requests, template, set())
+
+
+class TestClientProcs(unittest.TestCase):
+
+    def test_worker_failure(self):
+        """Test that a failing client process fails the run instead of hanging it"""
+        print("\n[TEST] Testing FAILURE scenario: client processes fail to start")
+        errors = []
+
+        def run():
+            try:
+                run_client_procs(2, "vllm", make_request_inputs(4), None, None, True,
+                                 record_prefix="/nonexistent_dir/x")
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(FAILURE_TIMEOUT)
+
+        self.assertFalse(thread.is_alive(), "run_client_procs hung")
+        self.assertEqual(len(errors), 1)
+        self.assertIn("FileNotFoundError", str(errors[0]))
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+
+if __name__ == '__main__':
+    unittest.main()
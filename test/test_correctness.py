@@ -0,0 +1,34 @@
+import unittest
+import os
+import sys
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from correctness import evaluate_outputs, merge_pass_rates
+
+SCHEMA = {"title": "point", "type": "object", "required": ["x"]}
+
+
+class TestMergePassRates(unittest.TestCase):
+
+    def test_merge_matches_whole_evaluation(self):
+        """Test that merged pass rates of two halves equal those of the whole evaluation"""
+        items = [
+            ("json", SCHEMA, '{"x": 1}'),
+            ("json", SCHEMA, "not json"),
+            ("choice", ["yes", "no"], "yes"),
+            ("json", SCHEMA, '{"x": 2}'),
+            ("choice", ["yes", "no"], "maybe"),
+            (None, SCHEMA, "unstructured"),
+        ]
+        _, expected = evaluate_outputs(items)
+
+        merged = merge_pass_rates(evaluate_outputs(items[:2])[1],
+                                  evaluate_outputs(items[2:])[1])
+
+        self.assertEqual(merged, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
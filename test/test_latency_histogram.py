@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+
+import numpy as np
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from latency_histogram import LatencyHistogram
+
+PERCENTILES = [0, 1, 25, 50, 75, 90, 99, 99.9, 100]
+
+
+def histogram_of(values):
+    histogram = LatencyHistogram()
+    histogram.record_many(values)
+    return histogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def assertPercentilesMatchNumpy(self, histogram, values):
+        for p in PERCENTILES:
+            expected = np.percentile(values, p)
+            self.assertAlmostEqual(histogram.percentile(p), expected,
+                                   delta=expected * histogram.relative_accuracy + 1e-12,
+                                   msg=f"P{p}")
+
+    def test_small_run_tail(self):
+        """Test that the tail of a small run is interpolated like np.percentile"""
+        values = [0.10, 0.11, 0.12, 0.13, 0.14, 0.15, 0.16, 0.17, 0.18, 1.5]
+        histogram = histogram_of(values)
+
+        self.assertPercentilesMatchNumpy(histogram, values)
+        self.assertAlmostEqual(histogram.percentile(99), 1.3812, places=3)
+
+    def test_two_values(self):
+        """Test that the median of two values is their mean"""
+        self.assertAlmostEqual(histogram_of([0.1, 0.2]).median(), 0.15, places=3)
+
+    def test_single_value(self):
+        """Test that every percentile of a single value is that value"""
+        histogram = histogram_of([0.25])
+
+        for p in PERCENTILES:
+            self.assertEqual(histogram.percentile(p), 0.25)
+
+    def test_random_values(self):
+        """Test percentiles of a large lognormal sample with zeros against np.percentile"""
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.lognormal(-3, 1, 5000), np.zeros(200)])
+
+        self.assertPercentilesMatchNumpy(histogram_of(values), values)
+
+    def test_merge(self):
+        """Test that merged histograms report the percentiles of all values"""
+        rng = np.random.default_rng(1)
+        first, second = rng.exponential(0.05, 300), rng.exponential(0.5, 30)
+        histogram = histogram_of(first)
+        histogram.merge(histogram_of(second))
+
+        values = np.concatenate([first, second])
+        self.assertEqual(histogram.count, len(values))
+        self.assertAlmostEqual(histogram.mean, values.mean())
+        self.assertPercentilesMatchNumpy(histogram, values)
+
+    def test_empty(self):
+        """Test that an empty histogram reports 0"""
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
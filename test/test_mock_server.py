@@ -0,0 +1,69 @@
+import unittest
+import asyncio
+import os
+import sys
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from backend_request_func import (
+    RequestFuncInput,
+    async_request_openai_chat_completions,
+    async_request_openai_completions,
+)
+from length_distributions import LengthDistribution
+from mock_server import running_mock_server
+
+
+def send(request_func, url, **kwargs):
+    request = RequestFuncInput(prompt="Hello", api_url=url, prompt_len=1,
+                               output_len=kwargs.pop("output_len", 8), model="mock", **kwargs)
+    return asyncio.run(request_func(request))
+
+
+class TestMockServer(unittest.TestCase):
+
+    def test_completions(self):
+        """Test that the benchmark client reads the mock server's completions"""
+        with running_mock_server(["--ttft", "20", "--itl", "2"]) as base_url:
+            output = send(async_request_openai_completions, f"{base_url}/v1/completions")
+
+        self.assertTrue(output.success, output.error)
+        self.assertEqual(output.output_tokens, 8)
+        self.assertEqual(output.generated_text, " token" * 8)
+        self.assertEqual(len(output.itl), 7)
+        self.assertGreaterEqual(output.ttft, 0.02)
+
+    def test_fractional_latencies(self):
+        """Test that sub-millisecond and fractional latencies are not rounded"""
+        self.assertEqual(LengthDistribution("2.5", integer=False).sample(None, 2).tolist(),
+                         [2.5, 2.5])
+        with running_mock_server(["--itl", "0.4"]) as base_url:
+            output = send(async_request_openai_completions, f"{base_url}/v1/completions")
+
+        self.assertTrue(output.success, output.error)
+        self.assertGreaterEqual(sum(output.itl), 7 * 0.0004)
+
+    def test_chat_completions_output_len(self):
+        """Test that the output length distribution ends responses early unless ignore_eos is set"""
+        with running_mock_server(["--output-len", "3"]) as base_url:
+            url = f"{base_url}/v1/chat/completions"
+            early = send(async_request_openai_chat_completions, url)
+            full = send(async_request_openai_chat_completions, url, ignore_eos=True)
+
+        self.assertTrue(early.success, early.error)
+        self.assertEqual(early.output_tokens, 3)
+        self.assertEqual(full.output_tokens, 8)
+
+    def test_error_rate(self):
+        """Test that requests fail at the configured error rate"""
+        print("\n[TEST] Testing FAILURE scenario: mock server error rate")
+        with running_mock_server(["--error-rate", "1"]) as base_url:
+            output = send(async_request_openai_completions, f"{base_url}/v1/completions")
+
+        self.assertFalse(output.success)
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -71,6 +71,25 @@ class TestMonitorServer(unittest.TestCase):
         # File should still be opened
         mock_file.assert_called()
         print("[TEST] ✓ Failure scenario handled correctly")
+    
+    @patch.object(MonitorServer, '_reload_prometheus')
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('os.path.exists')
+    def test_update_prometheus_targets_extra_targets(self, mock_exists, mock_file, mock_reload):
+        """Test that extra targets are added as their own scrape jobs"""
+        mock_exists.return_value = True
+        
+        self.server.update_prometheus_targets(
+            {'vllm': "192.168.1.100"},
+            extra_targets={'benchmark-client': ["login01:9400", "login01:9401"]}
+        )
+        
+        written = "".join(mock_file().writelines.call_args.args[0])
+        self.assertIn("  - job_name: vllm\n", written)
+        self.assertIn("          - '192.168.1.100:8000'\n", written)
+        self.assertIn("  - job_name: benchmark-client\n", written)
+        self.assertIn("          - 'login01:9400'\n          - 'login01:9401'\n", written)
+        mock_reload.assert_called_once()
 
 
 if __name__ == '__main__':
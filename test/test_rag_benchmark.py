@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import os
+import sys
+from io import StringIO
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from rag_benchmark import RAGBenchmark, build_prompt, latency_summary
+
+
+def embeddings_response(num_inputs):
+    response = MagicMock()
+    response.json.return_value = {
+        "data": [{"index": i, "embedding": [0.1 * i, 0.2]} for i in reversed(range(num_inputs))]
+    }
+    return response
+
+
+def completion_response(texts):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    lines = [b"data: " + json.dumps({"choices": [{"text": text}]}).encode() for text in texts]
+    response.iter_lines.return_value = [*lines, b"", b"data: [DONE]"]
+    return response
+
+
+class TestRAGBenchmark(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.benchmark = RAGBenchmark(chroma_ip="192.168.1.101", vllm_ip="192.168.1.100",
+                                      model="test-model")
+        self.session = MagicMock()
+        self.collection = MagicMock()
+        self.collection.count.return_value = 10
+        self.collection.query.return_value = {"documents": [["doc one", "doc two"]]}
+        patch.object(self.benchmark, '_session', return_value=self.session).start()
+        patch.object(self.benchmark, '_collection', return_value=self.collection).start()
+        self.addCleanup(patch.stopall)
+    
+    def post(self, url, json=None, **kwargs):
+        if url.endswith("/v1/embeddings"):
+            return embeddings_response(len(json["input"]))
+        return completion_response(["Hello", " world"])
+    
+    def test_initialization(self):
+        """Test that the endpoints default to the vLLM server"""
+        self.assertEqual(self.benchmark.completions_url, "http://192.168.1.100:8000/v1/completions")
+        self.assertEqual(self.benchmark.embed_url, "http://192.168.1.100:8000/v1/embeddings")
+        self.assertEqual(self.benchmark.embed_model, "test-model")
+    
+    def test_embed_orders_by_index(self):
+        """Test that embeddings are returned in input order"""
+        self.session.post.return_value = embeddings_response(3)
+        
+        embeddings = self.benchmark.embed(["a", "b", "c"])
+        
+        self.assertEqual([embedding[0] for embedding in embeddings], [0.0, 0.1, 0.2])
+    
+    def test_build_prompt(self):
+        """Test that the retrieved documents end up in the prompt"""
+        prompt = build_prompt("Why?", ["doc one", "doc two"])
+        
+        self.assertIn("- doc one\n- doc two", prompt)
+        self.assertTrue(prompt.endswith("Question: Why?\nAnswer:"))
+    
+    def test_latency_summary(self):
+        """Test that latencies are summarized in milliseconds"""
+        summary = latency_summary([0.1, 0.2, 0.3])
+        
+        self.assertAlmostEqual(summary["mean"], 200.0)
+        self.assertAlmostEqual(summary["p50"], 200.0)
+        self.assertIsNone(latency_summary([]))
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_run(self, mock_stdout):
+        """Test that every query goes through all stages"""
+        self.session.post.side_effect = self.post
+        
+        results = self.benchmark.run(num_queries=5, concurrency=2, top_k=2, num_documents=10)
+        
+        self.assertEqual(results["successful"], 5)
+        self.assertEqual(results["failures"], {})
+        for stage in ["embed", "retrieve", "ttft", "generate", "e2e"]:
+            self.assertIsNotNone(results["latency_ms"][stage])
+        self.collection.add.assert_not_called()
+        self.assertEqual(self.collection.query.call_args.kwargs["n_results"], 2)
+        prompt = self.session.post.call_args_list[-1].kwargs["json"]["prompt"]
+        self.assertIn("- doc one", prompt)
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_run_seeds_collection(self, mock_stdout):
+        """Test that a collection with too few documents is filled up"""
+        self.session.post.side_effect = self.post
+        
+        self.benchmark.run(num_queries=1, concurrency=1, num_documents=100)
+        
+        added = sum(len(call.kwargs["ids"]) for call in self.collection.add.call_args_list)
+        self.assertEqual(added, 90)
+        self.assertEqual(self.collection.add.call_args_list[0].kwargs["ids"][0], "doc_10")
+    
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_run_counts_failed_stage(self, mock_stdout):
+        """Test that failed queries are counted by the stage that failed"""
+        print("\n[TEST] Testing FAILURE scenario: Chroma query fails")
+        self.session.post.side_effect = self.post
+        self.collection.query.side_effect = ValueError("Could not connect to a Chroma server")
+        
+        results = self.benchmark.run(num_queries=3, concurrency=1, num_documents=10)
+        
+        self.assertEqual(results["successful"], 0)
+        self.assertEqual(results["failures"], {"retrieve": 3})
+        self.assertIsNone(results["latency_ms"]["e2e"])
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+    def test_run_query_raises_bugs(self):
+        """Test that errors other than service failures are not counted as failed queries"""
+        print("\n[TEST] Testing FAILURE scenario: bug in the pipeline")
+        self.session.post.side_effect = self.post
+        self.collection.query.side_effect = TypeError("unexpected argument")
+
+        with self.assertRaises(TypeError):
+            self.benchmark.run_query("What?", top_k=2, output_len=8)
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+
+if __name__ == '__main__':
+    unittest.main()
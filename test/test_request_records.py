@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+import json
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import request_records
+from request_records import RequestRecordWriter
+
+
+def record(request_idx, **fields):
+    return {
+        "request_idx": request_idx,
+        "measured": True,
+        "success": True,
+        "prompt_len": 10,
+        "output_tokens": 4,
+        "ttft": 0.05,
+        "latency": 0.2,
+        "send_time": 0.01 * request_idx,
+        "scheduling_lag": 0.0,
+        "turn": 0,
+        "timed_out": False,
+        "itl": [0.05, 0.05, 0.05],
+        "generated_text": "text",
+        "error": "",
+        **fields,
+    }
+
+
+class TestRequestRecordWriter(unittest.TestCase):
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.prefix = os.path.join(self.tmpdir.name, "run.requests")
+
+    def write_records(self, records):
+        writer = RequestRecordWriter(self.prefix)
+        for r in records:
+            writer.write(r)
+        writer.close()
+        with open(writer.jsonl_path) as f:
+            return writer, [json.loads(line) for line in f]
+
+    def test_missing_output_tokens(self):
+        """Test that a record without output tokens is written with -1"""
+        pa = request_records._pyarrow()
+        if pa is None:
+            self.skipTest("pyarrow is not installed")
+        writer, lines = self.write_records(
+            [record(0), record(1, output_tokens=None, success=False, ttft=None)]
+        )
+
+        self.assertIsNone(lines[1]["output_tokens"])
+        table = pa.ipc.open_stream(writer.columnar_path).read_all()
+        self.assertEqual(table.column("output_tokens").to_pylist(), [4, -1])
+        self.assertTrue(math.isnan(table.column("ttft").to_pylist()[1]))
+
+    def test_missing_output_tokens_without_pyarrow(self):
+        """Test that a record without output tokens is written with -1 to the npz file"""
+        with patch.object(request_records, '_pyarrow', lambda: None):
+            self.prefix += "_npz"
+            writer, _ = self.write_records([record(0, output_tokens=None)])
+
+        columns = np.load(writer.columnar_path)
+        self.assertEqual(columns["output_tokens"].tolist(), [-1])
+        self.assertEqual(columns["request_idx"].tolist(), [0])
+
+    def test_close_after_failed_batch(self):
+        """Test that the JSONL file is complete when writing the last batch fails"""
+        print("\n[TEST] Testing FAILURE scenario: last batch cannot be written")
+        writer = RequestRecordWriter(self.prefix)
+        for i in range(3):
+            writer.write(record(i))
+
+        with patch.object(writer, '_write_batch', side_effect=OSError("disk full")):
+            with patch.object(request_records, '_pyarrow', lambda: object()):
+                with self.assertRaises(OSError):
+                    writer.close()
+
+        with open(writer.jsonl_path) as f:
+            self.assertEqual([json.loads(line)["request_idx"] for line in f], [0, 1, 2])
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+
+if __name__ == '__main__':
+    unittest.main()
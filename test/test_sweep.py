@@ -0,0 +1,53 @@
+import unittest
+import os
+import sys
+
+# Add the benchmarks directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from benchmark_serving_structured_output import concurrency_share, search_load
+
+
+def probed_values(values, passes, **kwargs):
+    probed = []
+
+    def run_step(value):
+        probed.append(value)
+        return passes(value)
+
+    search_load(values, run_step, 4, **kwargs)
+    return probed
+
+
+class TestSearchLoad(unittest.TestCase):
+
+    def test_binary_search(self):
+        """Test that the highest passing value is narrowed down between the steps"""
+        probed = probed_values([2, 4, 8], lambda value: value <= 5, integer=True)
+
+        self.assertEqual(probed, [2, 4, 8, 6, 5])
+
+    def test_integer_search_minimum(self):
+        """Test that an integer search never probes below its minimum"""
+        probed = probed_values([8], lambda value: False, integer=True, minimum=3)
+
+        self.assertEqual(probed, [8, 5, 3])
+
+
+class TestConcurrencyShare(unittest.TestCase):
+
+    def test_shares(self):
+        """Test that the concurrency is split evenly across the clients"""
+        self.assertEqual([concurrency_share(5, 2, i) for i in range(2)], [3, 2])
+        self.assertIsNone(concurrency_share(None, 2, 0))
+
+    def test_share_of_zero(self):
+        """Test that a concurrency lower than the number of clients is rejected"""
+        print("\n[TEST] Testing FAILURE scenario: concurrency below the number of clients")
+        with self.assertRaises(ValueError):
+            concurrency_share(1, 2, 1)
+        print("[TEST] ✓ Failure scenario handled correctly")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -90,6 +90,23 @@ class TestVLLMServer(unittest.TestCase):
         
         mock_post.assert_called_once()
         print("[TEST] ✓ Failure scenario handled correctly")
+    
+    @patch('os.makedirs')
+    @patch('subprocess.run')
+    def test_benchmark_vllm_sweep(self, mock_run, mock_makedirs):
+        """Test that a sweep is passed on to the benchmark script"""
+        self.server.ip_address = "192.168.1.100"
+        mock_run.return_value = MagicMock(returncode=0)
+        
+        self.server.benchmark_vllm(sweep="request-rate", sweep_values="1,2,4",
+                                   goodput=["ttft:500", "e2el:2000"])
+        
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[cmd.index("--sweep") + 1], "request-rate")
+        self.assertEqual(cmd[cmd.index("--sweep-values") + 1], "1,2,4")
+        goodput_index = cmd.index("--goodput")
+        self.assertEqual(cmd[goodput_index + 1:goodput_index + 3], ["ttft:500", "e2el:2000"])
+        self.assertIn("sweep_request-rate", cmd[cmd.index("--result-filename") + 1])
 
 
 if __name__ == '__main__':